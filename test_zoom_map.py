@@ -0,0 +1,923 @@
+#regression tests for the zoom_map library, run with python -m pytest or python -m unittest
+
+import unittest
+import math
+import random
+import sqlite3
+import os
+import tempfile
+import threading
+import tkinter as tk
+import zoom_map
+
+#create a hidden tk window for the maps, or None if there is no display to create it on
+def create_window():
+    try:
+        window = tk.Tk()
+    except tk.TclError:
+        return None
+    window.withdraw()
+    return window
+
+class TestViewTransform(unittest.TestCase):
+    #a large negative delta, such as one windows wheel notch with the default gain, zooms out rather than flipping the zoom negative
+    def test_large_negative_zoom_delta(self):
+        view = zoom_map.ViewTransform()
+        view.zoom_about(-1.2,100,50)
+        self.assertGreater(view.zoom,0)
+        for position,centre in zip(view.invert(100,50),(100,50)): #the centre of the zoom stays in place
+            self.assertAlmostEqual(position,centre)
+
+    #a step in followed by the same step out returns to the starting view
+    def test_zoom_steps_cancel(self):
+        view = zoom_map.ViewTransform(2,30,-40)
+        view.zoom_about(1.2,100,50)
+        self.assertAlmostEqual(view.zoom,2*math.exp(1.2))
+        view.zoom_about(-1.2,100,50)
+        for value,start in zip((view.zoom,view.offset_x,view.offset_y),(2,30,-40)):
+            self.assertAlmostEqual(value,start)
+
+    #screen positions are unzoomed positions scaled by the zoom and moved by the offset, and invert undoes apply
+    def test_apply_and_invert(self):
+        view = zoom_map.ViewTransform()
+        view.zoom_about(0.5,0,0)
+        view.pan(10,-5)
+        screen_x,screen_y = view.apply(20,40)
+        self.assertAlmostEqual(screen_x,20*math.exp(0.5)+10)
+        self.assertAlmostEqual(screen_y,40*math.exp(0.5)-5)
+        for position,start in zip(view.invert(screen_x,screen_y),(20,40)):
+            self.assertAlmostEqual(position,start)
+
+    #a transition zooms by the same factor in each step, about the point which stays at the same place on the screen
+    def test_interpolate(self):
+        start = zoom_map.ViewTransform(1,10,20)
+        end = start.copy()
+        end.zoom_about(2,100,50)
+        halfway = start.interpolate(end,0.5)
+        self.assertAlmostEqual(halfway.zoom,math.exp(1))
+        for position,centre in zip(halfway.apply(*start.invert(100,50)),(100,50)):
+            self.assertAlmostEqual(position,centre)
+        for fraction,expected in ((0,start),(1,end)):
+            view = start.interpolate(end,fraction)
+            for value,expected_value in zip((view.zoom,view.offset_x,view.offset_y),(expected.zoom,expected.offset_x,expected.offset_y)):
+                self.assertAlmostEqual(value,expected_value)
+        panned = start.interpolate(zoom_map.ViewTransform(1,30,-20),0.25) #without a change of zoom the view pans steadily
+        self.assertEqual((panned.zoom,panned.offset_x,panned.offset_y),(1,15,10))
+
+class TestViewAnimation(unittest.TestCase):
+    #'in_out' transitions start and end gently, 'out' transitions start at full speed, and both end at the end view
+    def test_progress(self):
+        start,end = zoom_map.ViewTransform(),zoom_map.ViewTransform(4,-30,-60)
+        for easing,quarter in (('in_out',0.15625),('out',0.4375)):
+            animation = zoom_map.ViewAnimation(start,end,2,easing)
+            self.assertEqual(animation.get_progress(animation.start_time),0)
+            self.assertAlmostEqual(animation.get_progress(animation.start_time+0.5),quarter)
+            self.assertEqual(animation.get_progress(animation.start_time+5),1)
+            self.assertFalse(animation.finished(animation.start_time+1.9))
+            self.assertTrue(animation.finished(animation.start_time+2))
+            view = animation.get_view(animation.start_time+2)
+            self.assertEqual((view.zoom,view.offset_x,view.offset_y),(4,-30,-60))
+        self.assertEqual(zoom_map.ViewAnimation(start,end,0).get_progress(0),1) #a transition of no length is already at its end
+
+class TestSpatialGrid(unittest.TestCase):
+    #random boxes, a few of them large enough to be kept out of the cells
+    def create_boxes(self,num_boxes):
+        generator = random.Random(4)
+        boxes = []
+        for i in range(num_boxes):
+            x,y = generator.uniform(0,100),generator.uniform(0,100)
+            size = 60 if i%50==0 else generator.uniform(0,3)
+            boxes.append((x,y,x+size,y+size))
+        return [list(column) for column in zip(*boxes)]
+
+    #a query finds exactly the boxes overlapping it, as checking every box would
+    def test_query_matches_every_box(self):
+        boxes_min_x,boxes_min_y,boxes_max_x,boxes_max_y = boxes = self.create_boxes(500)
+        grid = zoom_map.SpatialGrid(*boxes,max_cells_per_item=4)
+        self.assertGreater(len(grid.large_items),0)
+        for min_x,min_y,max_x,max_y in ((10,10,30,25),(-5,-5,2,2),(99,0,200,100),(-10,-10,200,200),(150,150,160,160)):
+            expected = [i for i in range(500) if boxes_min_x[i]<=max_x and boxes_max_x[i]>=min_x and boxes_min_y[i]<=max_y and boxes_max_y[i]>=min_y]
+            self.assertEqual(grid.query(min_x,min_y,max_x,max_y),expected)
+
+    #an empty grid and a grid of identical points answer queries without dividing by zero sized cells
+    def test_degenerate_grids(self):
+        self.assertEqual(zoom_map.SpatialGrid([],[],[],[]).query(0,0,1,1),[])
+        grid = zoom_map.SpatialGrid([1]*3,[1]*3,[1]*3,[1]*3)
+        self.assertEqual(grid.query(0.5,0.5,1.5,1.5),[0,1,2])
+        self.assertEqual(grid.query(2,2,3,3),[])
+
+    #a grid filled from the cells found for consecutive ranges of boxes, as worker processes do, answers queries as one built directly
+    def test_grid_from_parts(self):
+        boxes = self.create_boxes(500)
+        grid = zoom_map.SpatialGrid(*boxes,max_cells_per_item=4)
+        parts_grid = zoom_map.SpatialGrid(*boxes,max_cells_per_item=4,insert_items=False)
+        parts_grid.set_cell_entries([zoom_map.grid_cell_entries(parts_grid.get_layout(),*[values[start:start+120] for values in boxes],start) for start in range(0,500,120)])
+        for query in ((10,10,30,25),(-5,-5,2,2),(99,0,200,100),(-10,-10,200,200)):
+            self.assertEqual(parts_grid.query(*query),grid.query(*query))
+
+    #items appended beyond the extent of the cells and items deleted from the grid are found, or not, as checking every box would
+    def test_appended_and_deleted_items(self):
+        boxes = self.create_boxes(300)
+        grid = zoom_map.SpatialGrid(*boxes,max_cells_per_item=4)
+        generator = random.Random(8)
+        for i in range(150):
+            x,y = generator.uniform(-50,150),generator.uniform(-50,150)
+            self.assertEqual(grid.append_item(x,y,x+2,y+2),300+i)
+            for values,value in zip(boxes,(x,y,x+2,y+2)):
+                values.append(value)
+        deleted = set(range(0,450,7))
+        for i in deleted:
+            grid.delete_item(i)
+        boxes_min_x,boxes_min_y,boxes_max_x,boxes_max_y = boxes
+        for min_x,min_y,max_x,max_y in ((10,10,30,25),(-60,-60,0,0),(99,0,200,100),(-100,-100,200,200)):
+            expected = [i for i in range(450) if i not in deleted and boxes_min_x[i]<=max_x and boxes_max_x[i]>=min_x and boxes_min_y[i]<=max_y and boxes_max_y[i]>=min_y]
+            self.assertEqual(grid.query(min_x,min_y,max_x,max_y),expected)
+        self.assertFalse(grid.needs_rebuild(600))
+        self.assertTrue(grid.needs_rebuild(601))
+
+class TestNodeClusters(unittest.TestCase):
+    #clusters of every level found directly from the cells the points fall in, as sorted (count, centroid x, centroid y, first point)
+    def get_expected_clusters(self,clusters,points_x,points_y,level):
+        cells_per_axis = 2**level
+        cells = {}
+        for i,(x,y) in enumerate(zip(points_x,points_y)):
+            column = min(max(int((x-clusters.min_x)/clusters.size*cells_per_axis),0),cells_per_axis-1)
+            row = min(max(int((y-clusters.min_y)/clusters.size*cells_per_axis),0),cells_per_axis-1)
+            cells.setdefault((column,row),[]).append(i)
+        return sorted((len(members),round(sum(points_x[i] for i in members)/len(members),9),round(sum(points_y[i] for i in members)/len(members),9),members[0]) for members in cells.values())
+
+    #every level holds each point once, merged with the other points in its cell, for list and array coordinates alike
+    def test_levels_match_cells(self):
+        generator = random.Random(5)
+        points_x = [generator.uniform(-3,7) for i in range(300)]
+        points_y = [generator.uniform(10,12) for i in range(300)]
+        inputs = [(points_x,points_y)]
+        if zoom_map.np is not None:
+            inputs.append((zoom_map.np.array(points_x),zoom_map.np.array(points_y)))
+        for coords_x,coords_y in inputs:
+            clusters = zoom_map.NodeClusters(coords_x,coords_y)
+            self.assertEqual(len(clusters.levels[0][0]),1) #the coarsest level is one cluster of every point
+            for level in range(clusters.num_levels):
+                clusters_x,clusters_y,clusters_count,clusters_first = clusters.levels[level]
+                found = sorted((count,round(x,9),round(y,9),first) for x,y,count,first in zip(clusters_x,clusters_y,clusters_count,clusters_first) if count>0)
+                self.assertEqual(found,self.get_expected_clusters(clusters,points_x,points_y,level))
+
+    #moving points within the extent leaves the same clusters as clustering the moved points directly
+    def test_moved_points_match_cells(self):
+        generator = random.Random(6)
+        points_x = [generator.uniform(0,10) for i in range(200)]
+        points_y = [generator.uniform(0,10) for i in range(200)]
+        clusters = zoom_map.NodeClusters(points_x,points_y)
+        for i in range(0,200,3):
+            x,y = generator.uniform(0,10),generator.uniform(0,10)
+            clusters.move_point(i,points_x[i],points_y[i],x,y,points_x,points_y)
+            points_x[i],points_y[i] = x,y
+        for level in range(clusters.num_levels):
+            clusters_x,clusters_y,clusters_count,clusters_first = clusters.levels[level]
+            found = sorted((count,round(x,6),round(y,6)) for x,y,count in zip(clusters_x,clusters_y,clusters_count) if count>0)
+            expected = [(count,round(x,6),round(y,6)) for count,x,y,first in self.get_expected_clusters(clusters,points_x,points_y,level)]
+            self.assertEqual(found,sorted(expected))
+
+    #adding and removing points leaves the same clusters as clustering the remaining points directly
+    def test_added_and_removed_points_match_cells(self):
+        generator = random.Random(9)
+        points_x = [generator.uniform(0,10) for i in range(200)]
+        points_y = [generator.uniform(0,10) for i in range(200)]
+        clusters = zoom_map.NodeClusters(points_x,points_y)
+        for i in range(200,300):
+            points_x.append(generator.uniform(0,10))
+            points_y.append(generator.uniform(0,10))
+            clusters.add_point(i,points_x[i],points_y[i],points_x,points_y)
+        removed = set(range(0,300,5))
+        for i in removed:
+            clusters.remove_point(i,points_x[i],points_y[i],points_x,points_y)
+        self.assertEqual(clusters.num_points,240)
+        live_x = [x for i,x in enumerate(points_x) if i not in removed]
+        live_y = [y for i,y in enumerate(points_y) if i not in removed]
+        for level in range(clusters.num_levels):
+            clusters_x,clusters_y,clusters_count,clusters_first = clusters.levels[level]
+            found = sorted((count,round(x,6),round(y,6)) for x,y,count in zip(clusters_x,clusters_y,clusters_count) if count>0)
+            expected = [(count,round(x,6),round(y,6)) for count,x,y,first in self.get_expected_clusters(clusters,live_x,live_y,level)]
+            self.assertEqual(found,sorted(expected))
+        self.assertFalse(clusters.needs_rebuild(400))
+        self.assertTrue(clusters.needs_rebuild(401))
+
+    #clusters whose finest level is binned in consecutive ranges of points, as worker processes do, are the same as clusters built directly
+    def test_clusters_from_parts(self):
+        generator = random.Random(7)
+        points_x = [generator.uniform(0,10) for i in range(300)]
+        points_y = [generator.uniform(0,10) for i in range(300)]
+        def bin_finest_level(min_x,min_y,size,cells_per_axis):
+            parts = [zoom_map.bin_points_entries(points_x[start:start+70],points_y[start:start+70],start,min_x,min_y,size,cells_per_axis) for start in range(0,300,70)]
+            return zoom_map.merge_binned_points(parts,cells_per_axis)
+        clusters = zoom_map.NodeClusters(points_x,points_y)
+        parts_clusters = zoom_map.NodeClusters(points_x,points_y,bin_finest_level=bin_finest_level)
+        for level in range(clusters.num_levels):
+            for values,parts_values in zip(clusters.levels[level],parts_clusters.levels[level]):
+                for value,parts_value in zip(values,parts_values):
+                    self.assertAlmostEqual(value,parts_value)
+
+    #the finest level with cells at least the minimum size on screen is chosen, or None once single points should be drawn
+    def test_select_level(self):
+        clusters = zoom_map.NodeClusters([0,1],[0,1],num_levels=4)
+        self.assertEqual(clusters.select_level(20,30),0)
+        self.assertEqual(clusters.select_level(120,30),2)
+        self.assertEqual(clusters.select_level(239,30),2)
+        self.assertIsNone(clusters.select_level(480,30))
+
+#reference Douglas-Peucker simplification, returning the indices of the points kept at a tolerance
+def simplify_points(points_x,points_y,tolerance,start=0,end=None):
+    if end is None:
+        end = len(points_x)-1
+    furthest,distance = start,-1
+    length = math.hypot(points_x[end]-points_x[start],points_y[end]-points_y[start])
+    for j in range(start+1,end):
+        between_x,between_y = points_x[j]-points_x[start],points_y[j]-points_y[start]
+        point_distance = abs(between_x*(points_y[end]-points_y[start])-between_y*(points_x[end]-points_x[start]))/length if length>0 else math.hypot(between_x,between_y)
+        if point_distance>distance:
+            furthest,distance = j,point_distance
+    if distance<=tolerance:
+        return [start,end]
+    return simplify_points(points_x,points_y,tolerance,start,furthest)[:-1]+simplify_points(points_x,points_y,tolerance,furthest,end)
+
+class TestDouglasPeucker(unittest.TestCase):
+    #the end points are always kept, points on the chord between them never are, and a peak is as important as its height
+    def test_simple_shapes(self):
+        self.assertEqual(zoom_map.douglas_peucker_importance([0,1,2],[0,0,0]),[math.inf,0,math.inf])
+        self.assertEqual(zoom_map.douglas_peucker_importance([0,1,2],[0,3,0]),[math.inf,3,math.inf])
+        self.assertEqual(zoom_map.douglas_peucker_importance([5],[5]),[math.inf])
+        self.assertEqual(zoom_map.douglas_peucker_importance([],[]),[])
+
+    #keeping the points more important than a tolerance gives the same points as simplifying to that tolerance, for short and long lines
+    def test_matches_simplification(self):
+        generator = random.Random(6)
+        for num_points in (12,200):
+            points_x = [i+generator.uniform(-0.4,0.4) for i in range(num_points)]
+            points_y = [generator.uniform(-3,3) for i in range(num_points)]
+            inputs = [(points_x,points_y)]
+            if zoom_map.np is not None: #long spans of arrays are measured at once
+                inputs.append((zoom_map.np.array(points_x),zoom_map.np.array(points_y)))
+            for coords_x,coords_y in inputs:
+                importance = zoom_map.douglas_peucker_importance(coords_x,coords_y)
+                for tolerance in (0.1,0.5,1,2,5):
+                    kept = [i for i in range(num_points) if importance[i]>tolerance]
+                    self.assertEqual(kept,simplify_points(points_x,points_y,tolerance))
+
+    #the importances of a range of lines are stored one line after another, with the offset of each line's first point
+    def test_importance_entries(self):
+        lines_x = [[0,1,2],[0,1,2,3],[5]]
+        lines_y = [[0,3,0],[0,1,1,0],[5]]
+        importance,offsets = zoom_map.douglas_peucker_importance_entries(lines_x,lines_y)
+        self.assertEqual(list(offsets),[0,3,7,8])
+        for i in range(3):
+            self.assertEqual(list(importance[offsets[i]:offsets[i+1]]),zoom_map.douglas_peucker_importance(lines_x[i],lines_y[i]))
+
+class TestParseLocations(unittest.TestCase):
+    #locations in the format 'latitude, longitude' are split into latitudes and longitudes, as lists or arrays
+    def test_parse_locations(self):
+        locations = ['-33.6, 151.1','10,-20.5',' 0 , 1e2']
+        self.assertEqual(zoom_map.parse_location_strings(locations),([-33.6,10,0],[151.1,-20.5,100]))
+        if zoom_map.np is not None:
+            latitudes,longitudes = zoom_map.parse_location_strings(locations,use_arrays=True)
+            self.assertEqual(latitudes.tolist(),[-33.6,10,0])
+            self.assertEqual(longitudes.tolist(),[151.1,-20.5,100])
+        self.assertEqual(zoom_map.parse_location_strings([]),([],[]))
+
+    #a location without exactly one comma is rejected
+    def test_malformed_locations(self):
+        for locations in (['1, 2','3'],['1, 2, 3']):
+            with self.assertRaises(ValueError):
+                zoom_map.parse_location_strings(locations)
+
+class TestMapDataLoader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    #write a csv file into the test directory and return its path
+    def write_csv(self,name,text):
+        path = os.path.join(self.directory.name,name)
+        with open(path,'w',newline='',encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    #line endpoints are resolved by name to the first node with that name, lines with an unknown node are skipped
+    def test_read_csv(self):
+        nodes_path = self.write_csv('nodes.csv','Name,Location\na,"1, 2"\nb,"3, 4"\na,"5, 6"\nc,"7, 8"\n')
+        lines_path = self.write_csv('lines.csv','Start,End\na,b\nb,missing\nc,a\n')
+        storage_modes = ['list'] if zoom_map.np is None else ['list','array']
+        for storage_mode in storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                loader = zoom_map.MapDataLoader(print_warnings=False,storage_mode=storage_mode)
+                loader.read_nodes_csv(nodes_path)
+                loader.read_lines_csv(lines_path)
+                self.assertEqual(loader.nodes_names,['a','b','a','c'])
+                self.assertEqual(list(loader.nodes_x_coords),[2,4,6,8]) #longitude
+                self.assertEqual(list(loader.nodes_y_coords),[1,3,5,7]) #latitude
+                self.assertEqual(loader.num_lines,2)
+                self.assertEqual(list(loader.lines_start_node_index),[0,3])
+                self.assertEqual(list(loader.lines_end_node_index),[1,0])
+                self.assertEqual(loader.get_node_index('c'),3)
+                self.assertEqual(loader.get_node_index('missing'),-1)
+
+    #a csv file without one of the requested columns is rejected
+    def test_missing_column(self):
+        nodes_path = self.write_csv('nodes.csv','Name,Place\na,"1, 2"\n')
+        loader = zoom_map.MapDataLoader(print_warnings=False)
+        with self.assertRaises(ValueError):
+            loader.read_nodes_csv(nodes_path)
+
+class TestRenderStats(unittest.TestCase):
+    #a frame counts the calls of each counted function, and time in a nested timed function belongs only to its own stage
+    def test_frame_stages_and_calls(self):
+        stats = zoom_map.RenderStats()
+        frames = []
+        inner = stats.timed('canvas',lambda: None,'create_line')
+        outer = stats.timed('culling',lambda: [inner() for i in range(3)])
+        stats.framed(outer,frames.append)()
+        self.assertEqual(frames,[stats])
+        self.assertEqual(stats.num_frames,1)
+        last_frame = stats.last_frame
+        self.assertEqual(last_frame['calls'],{'create_line':3})
+        self.assertEqual(set(last_frame['stages']),{'canvas','culling','other'})
+        self.assertAlmostEqual(sum(last_frame['stages'].values()),last_frame['total'])
+
+    #a framed function called within a frame is part of that frame
+    def test_nested_frames(self):
+        stats = zoom_map.RenderStats()
+        inner = stats.framed(lambda: None,lambda stats: None)
+        stats.framed(lambda: inner(),lambda stats: None)()
+        self.assertEqual(stats.num_frames,1)
+
+    #frame times fall in the first bin whose bound they do not exceed, slower frames in the final bin
+    def test_histogram(self):
+        stats = zoom_map.RenderStats(history=4)
+        for frame_time in (0.5,1,1.5,500,3):
+            stats.end_frame(frame_time/1000)
+        counts = dict(stats.get_histogram())
+        self.assertEqual((counts[1],counts[2],counts[4],counts[None]),(1,1,1,1)) #only the 4 most recent frames are kept
+        summary = stats.get_summary()
+        self.assertEqual(summary['frames'],5)
+        self.assertAlmostEqual(summary['max_frame_time'],500)
+
+class TestUpdateQueue(unittest.TestCase):
+    #updates of an object still pending are overwritten by later ones, and taking the updates empties the queue
+    def test_updates_coalesced(self):
+        queue = zoom_map.UpdateQueue()
+        queue.push('colours',[0,1],[['red','blue']])
+        queue.push('colours',[1,2],[['green','grey']])
+        queue.push('positions',[0],[[5],[6]])
+        self.assertEqual(queue.num_pending,4)
+        self.assertEqual(queue.take_all(),{'colours':{0:('red',),1:('green',),2:('grey',)},'positions':{0:(5,6)}})
+        self.assertEqual((queue.take_all(),queue.num_pending),({},0))
+
+    #a full queue refuses new objects without blocking, while updates of objects already pending still fit
+    def test_full_queue(self):
+        queue = zoom_map.UpdateQueue(max_pending=2)
+        self.assertTrue(queue.push('colours',[0,1],[['red','blue']],block=False))
+        self.assertFalse(queue.push('colours',[2],[['green']],block=False))
+        self.assertTrue(queue.push('colours',[1],[['grey']],block=False))
+        self.assertFalse(queue.push('colours',[2],[['green']],timeout=0.01))
+
+    #a blocked producer continues once the queue is drained
+    def test_blocked_push_waits_for_drain(self):
+        queue = zoom_map.UpdateQueue(max_pending=1)
+        queue.push('colours',[0],[['red']])
+        results = []
+        producer = threading.Thread(target=lambda: results.append(queue.push('colours',[1],[['blue']],timeout=5)))
+        producer.start()
+        producer.join(0.05)
+        self.assertEqual(results,[]) #still waiting for space
+        self.assertEqual(queue.take_all(),{'colours':{0:('red',)}})
+        producer.join()
+        self.assertEqual(results,[True])
+        self.assertEqual(queue.take_all(),{'colours':{1:('blue',)}})
+
+@unittest.skipIf(zoom_map.Image is None,'the tile cache holds Pillow images')
+class TestTileCache(unittest.TestCase):
+    #the least recently used tiles are removed once the memory budget is exceeded
+    def test_least_recently_used_removed(self):
+        cache = zoom_map.TileCache(memory_budget=3*16*16*4)
+        for key in range(3):
+            cache.put(key,zoom_map.Image.new('RGBA',(16,16)))
+        self.assertIsNotNone(cache.get(0)) #tile 1 is now the least recently used
+        cache.put(3,zoom_map.Image.new('RGBA',(16,16)))
+        self.assertEqual(list(cache.tiles),[2,0,3])
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.memory_used,3*16*16*4)
+
+    #a tile larger than the whole budget is still kept, as the only tile
+    def test_tile_over_budget(self):
+        cache = zoom_map.TileCache(memory_budget=100)
+        cache.put('a',zoom_map.Image.new('RGB',(8,8)))
+        cache.put('b',zoom_map.Image.new('RGB',(8,8)))
+        self.assertEqual(list(cache.tiles),['b'])
+        cache.put('b',zoom_map.Image.new('L',(2,2))) #replacing a tile replaces its memory
+        self.assertEqual(cache.memory_used,4)
+        cache.clear()
+        self.assertEqual((len(cache.tiles),cache.memory_used),(0,0))
+
+class TestTileMaths(unittest.TestCase):
+    #the equator and the prime meridian meet at the corner of the four tiles of zoom 1, and the conversions invert each other
+    def test_tile_coordinates(self):
+        self.assertAlmostEqual(zoom_map.longitude_to_tile_x(0,1),1)
+        self.assertAlmostEqual(zoom_map.latitude_to_tile_y(0,1),1)
+        self.assertAlmostEqual(zoom_map.longitude_to_tile_x(-180,3),0)
+        for longitude,latitude,zoom in ((151.15,-33.62,12),(-0.1,51.5,0),(179.9,85,5)):
+            self.assertAlmostEqual(zoom_map.tile_x_to_longitude(zoom_map.longitude_to_tile_x(longitude,zoom),zoom),longitude)
+            self.assertAlmostEqual(zoom_map.tile_y_to_latitude(zoom_map.latitude_to_tile_y(latitude,zoom),zoom),latitude)
+
+    #latitudes beyond the reach of web mercator are held at the top and bottom edges of the tiles
+    def test_poles_clamped(self):
+        self.assertAlmostEqual(zoom_map.latitude_to_tile_y(90,2),0,places=6)
+        self.assertAlmostEqual(zoom_map.latitude_to_tile_y(-90,2),4,places=6)
+
+class TestBasemapTiles(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    #tiles are read from a directory of {z}/{x}/{y}.png files, missing tiles are None
+    def test_read_directory(self):
+        os.makedirs(os.path.join(self.directory.name,'3','2'))
+        with open(os.path.join(self.directory.name,'3','2','5.png'),'wb') as file:
+            file.write(b'tile')
+        basemap = zoom_map.BasemapTiles(self.directory.name)
+        self.assertEqual(basemap.read_tile(3,2,5),b'tile')
+        self.assertIsNone(basemap.read_tile(3,2,6))
+
+    #MBTiles rows count up from the south, and the file records the zoom levels it holds
+    def test_read_mbtiles(self):
+        path = os.path.join(self.directory.name,'tiles.mbtiles')
+        connection = sqlite3.connect(path)
+        connection.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+        connection.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+        connection.executemany("INSERT INTO metadata VALUES (?,?)",[('minzoom','2'),('maxzoom','9')])
+        connection.execute("INSERT INTO tiles VALUES (3,2,2,?)",(b'tile',))
+        connection.commit()
+        connection.close()
+        basemap = zoom_map.BasemapTiles(path)
+        self.assertEqual((basemap.min_zoom,basemap.max_zoom),(2,9))
+        self.assertEqual(basemap.read_tile(3,2,5),b'tile')
+        self.assertIsNone(basemap.read_tile(3,2,2))
+        basemap.get_connection().close()
+
+class TestWebMercatorProjection(unittest.TestCase):
+    #projected latitudes are in degrees at the equator, matching the rows of slippy map tiles, and unproject inverts project
+    def test_project_and_unproject(self):
+        projection = zoom_map.WebMercatorProjection()
+        for latitude in (-60,-33.62,0,12.5,51.5):
+            x,y = projection.project(151.15,latitude)
+            self.assertEqual(x,151.15)
+            self.assertAlmostEqual((1-y/180)/2*2**4,zoom_map.latitude_to_tile_y(latitude,4))
+            self.assertAlmostEqual(projection.unproject(x,y)[1],latitude)
+        self.assertAlmostEqual(projection.project(0,90)[1],180,places=6) #latitudes beyond the reach of web mercator are clamped
+        self.assertAlmostEqual(projection.project(0,-90)[1],-180,places=6)
+
+    #lists and arrays are projected value by value as scalars are
+    def test_sequences(self):
+        projection = zoom_map.WebMercatorProjection()
+        latitudes = [-89,-45,0,30,85]
+        expected = [projection.project(0,latitude)[1] for latitude in latitudes]
+        projected = projection.project([0]*5,latitudes)[1]
+        for value,expected_value in zip(projected,expected):
+            self.assertAlmostEqual(value,expected_value)
+        for value,latitude in zip(projection.unproject([0]*5,projected)[1],[-85.0511287798]+latitudes[1:]):
+            self.assertAlmostEqual(value,latitude)
+        if zoom_map.np is not None:
+            array_x,array_y = projection.project(zoom_map.np.zeros(5),zoom_map.np.array(latitudes,dtype=float))
+            for value,expected_value in zip(array_y.tolist(),expected):
+                self.assertAlmostEqual(value,expected_value)
+            for value,start in zip(projection.unproject(array_x,array_y)[1].tolist(),projection.unproject([0]*5,projected)[1]):
+                self.assertAlmostEqual(value,start)
+
+class TestGroupByIndex(unittest.TestCase):
+    #each group holds its values in their original order, and groups without values are empty
+    def test_groups(self):
+        indices = [2,0,2,3,0,2]
+        values = [10,11,12,13,14,15]
+        use_arrays = [False] if zoom_map.np is None else [False,True]
+        for arrays in use_arrays:
+            with self.subTest(use_arrays=arrays):
+                offsets,grouped = zoom_map.group_by_index(indices,values,5,arrays)
+                self.assertEqual(list(offsets),[0,2,2,5,6,6])
+                self.assertEqual(list(grouped),[11,14,10,12,15,13])
+                offsets,grouped = zoom_map.group_by_index([],[],2,arrays)
+                self.assertEqual((list(offsets),list(grouped)),([0,0,0],[]))
+
+class TestColumnsFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name,'columns.bin')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    #float, integer and text columns read back as they were written, empty columns included
+    def test_round_trip(self):
+        columns = {'x':[0.5,-2.25,1e300],'count':[3,-7,2**40],'name':['a','','b c'],'empty':[]}
+        zoom_map.write_columns(self.path,columns)
+        self.assertEqual(zoom_map.read_columns(self.path),columns)
+
+    #numeric columns can be read as arrays, copied or memory mapped, and changing them leaves the file unchanged
+    @unittest.skipIf(zoom_map.np is None,'arrays require numpy')
+    def test_arrays(self):
+        zoom_map.write_columns(self.path,{'x':zoom_map.np.array([1.5,2.5]),'count':zoom_map.np.array([4,5]),'name':['a','b']})
+        for memory_map in (False,True):
+            columns = zoom_map.read_columns(self.path,use_arrays=True,memory_map=memory_map)
+            self.assertEqual((columns['x'].tolist(),columns['count'].tolist(),columns['name']),([1.5,2.5],[4,5],['a','b']))
+            columns['x'][0] = 9
+            del columns
+        self.assertEqual(zoom_map.read_columns(self.path)['x'],[1.5,2.5])
+
+    #a file which was not written by write_columns is rejected
+    def test_not_columns_file(self):
+        with open(self.path,'wb') as file:
+            file.write(b'not a columns file')
+        with self.assertRaises(ValueError):
+            zoom_map.read_columns(self.path)
+
+class TestPointSegmentDistance(unittest.TestCase):
+    #points beside a segment are measured to the segment, points beyond its ends to the nearest end
+    def test_distances(self):
+        self.assertAlmostEqual(zoom_map.point_segment_distance(5,3,0,0,10,0),3)
+        self.assertAlmostEqual(zoom_map.point_segment_distance(-3,4,0,0,10,0),5)
+        self.assertAlmostEqual(zoom_map.point_segment_distance(13,-4,0,0,10,0),5)
+        self.assertAlmostEqual(zoom_map.point_segment_distance(4,4,1,1,1,1),math.hypot(3,3)) #a segment of zero length
+
+@unittest.skipIf(zoom_map.np is None,'the density pyramid requires numpy')
+class TestDensityPyramid(unittest.TestCase):
+    def create_points(self,num_points,seed):
+        generator = random.Random(seed)
+        return [generator.uniform(0,50) for i in range(num_points)],[generator.uniform(10,30) for i in range(num_points)],[generator.uniform(0,3) for i in range(num_points)]
+
+    #each cell holds the weights of the points falling in it, and each coarser cell the sum of the four cells below it
+    def test_levels_sum_cells(self):
+        np = zoom_map.np
+        points_x,points_y,weights = self.create_points(400,10)
+        pyramid = zoom_map.DensityPyramid(points_x,points_y,weights,num_levels=5)
+        for level in range(pyramid.num_levels):
+            cells_per_axis = 2**level
+            expected = np.zeros((cells_per_axis,cells_per_axis))
+            for x,y,weight in zip(points_x,points_y,weights):
+                column = min(int((x-pyramid.min_x)/pyramid.size*cells_per_axis),cells_per_axis-1)
+                row = min(int((y-pyramid.min_y)/pyramid.size*cells_per_axis),cells_per_axis-1)
+                expected[row,column] += weight
+            self.assertTrue(np.allclose(pyramid.levels[level],expected))
+            self.assertAlmostEqual(pyramid.levels_max[level],float(expected.max()))
+
+    #moving points by taking their weights away and adding them at their new positions leaves the weights of the cells the moved points fall in
+    def test_moved_points_match_built(self):
+        np = zoom_map.np
+        points_x,points_y,weights = self.create_points(300,11)
+        pyramid = zoom_map.DensityPyramid(points_x,points_y,weights,num_levels=6)
+        moved = list(range(0,300,4))
+        pyramid.add_points([points_x[i] for i in moved],[points_y[i] for i in moved],-np.array([weights[i] for i in moved]))
+        generator = random.Random(12)
+        for i in moved:
+            points_x[i],points_y[i] = generator.uniform(0,50),generator.uniform(10,30)
+        pyramid.add_points([points_x[i] for i in moved],[points_y[i] for i in moved],np.array([weights[i] for i in moved]))
+        columns,rows = pyramid.get_finest_cells(points_x,points_y) #points moved beyond the extent are held by the edge cells
+        for level in range(pyramid.num_levels):
+            cells_per_axis = 2**level
+            shift = pyramid.num_levels-1-level
+            expected = np.zeros((cells_per_axis,cells_per_axis))
+            np.add.at(expected,(rows>>shift,columns>>shift),weights)
+            self.assertTrue(np.allclose(pyramid.levels[level],expected))
+        self.assertFalse(pyramid.needs_rebuild(600))
+        self.assertTrue(pyramid.needs_rebuild(601))
+
+    #windows reaching beyond the grid are padded with empty cells, and the level chosen has cells at least the size asked for
+    def test_window_and_level(self):
+        np = zoom_map.np
+        pyramid = zoom_map.DensityPyramid([0,4,4],[0,0,4],[1,2,3],num_levels=3)
+        self.assertTrue(np.array_equal(pyramid.get_window(1,-1,-1,3,3),np.array([[0,0,0],[0,1,2],[0,0,3]])))
+        self.assertEqual(pyramid.get_cell_size(2),1)
+        self.assertEqual(pyramid.get_level(5),0)
+        self.assertEqual(pyramid.get_level(1.5),1)
+        self.assertEqual(pyramid.get_level(1),2)
+        self.assertIsNone(pyramid.get_level(0.5))
+
+    #blurring spreads the weight of a cell over its neighbours without changing the total, when none of it falls off the grid
+    def test_blur_grid(self):
+        np = zoom_map.np
+        weights = np.zeros((9,9))
+        weights[4,4] = 5
+        blurred = zoom_map.blur_grid(weights,2)
+        self.assertAlmostEqual(float(blurred.sum()),5)
+        self.assertTrue(np.allclose(blurred,blurred.T)) #the same along rows and columns
+        self.assertEqual(float(blurred[0,0]),0)
+        self.assertGreater(float(blurred[4,4]),float(blurred[4,5]))
+        self.assertIs(zoom_map.blur_grid(weights,0),weights)
+
+class MapTestCase(unittest.TestCase):
+    storage_modes = ('list','array') if zoom_map.np is not None else ('list',)
+
+    def setUp(self):
+        self.window = create_window()
+        if self.window is None:
+            self.skipTest('no display available for tkinter')
+
+    def tearDown(self):
+        self.window.destroy()
+
+    #create a map with three nodes along a diagonal
+    def create_map(self,storage_mode):
+        test_map = zoom_map.ZoomMap(400,300,self.window,storage_mode=storage_mode)
+        test_map.create_nodes([0,1,2],[0,1,2],[5]*3,['black']*3,['a','b','c'])
+        return test_map
+
+    #ids of the canvas lines drawn for the plain lines of the map
+    def get_line_items(self,test_map):
+        return test_map.map.find_withtag(test_map.lines_tag)
+
+class TestLines(MapTestCase):
+    #lines given only by their coordinates keep the default 'none' node types
+    def test_coordinates_only_lines(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = self.create_map(storage_mode)
+                test_map.create_lines([3,3],['grey']*2,['x','y'],'none','none',[],lines_start_x_coord=[0,1],lines_start_y_coord=[0,1],lines_end_x_coord=[1,2],lines_end_y_coord=[1,2])
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.render_lines()
+                self.assertEqual(len([id for id in test_map.lines_canvas_ids if id!='blank']),2)
+                self.assertEqual(list(test_map.lines_start_node_type),['none','none'])
+                self.assertEqual([float(coord) for coord in test_map.lines_end_x_coord],[1,2])
+
+class TestCanvasReuse(MapTestCase):
+    #replacing the lines moves and restyles the existing canvas items, only the items of lines no longer needed are deleted
+    def test_recreated_lines_reuse_items(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = self.create_map(storage_mode)
+                test_map.create_lines([1]*3,['grey']*3,['x','y','z'],'none','none',[],lines_start_node_type=['node']*3,lines_start_node_index=[0,1,2],lines_end_node_type=['node']*3,lines_end_node_index=[1,2,0])
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.render_lines()
+                items = list(test_map.lines_canvas_ids)
+                test_map.create_lines([2]*2,['red']*2,['x','y'],'none','none',[],lines_start_node_type=['node']*2,lines_start_node_index=[0,1],lines_end_node_type=['node']*2,lines_end_node_index=[2,2])
+                test_map.calculate_pixel_coordinates()
+                test_map.render_lines()
+                self.assertEqual(list(test_map.lines_canvas_ids),items[:2])
+                self.assertEqual(sorted(self.get_line_items(test_map)),sorted(items[:2]))
+                self.assertEqual(test_map.map.itemcget(items[0],'fill'),'red')
+
+class TestZoom(MapTestCase):
+    #one windows wheel notch zooming out with the default gain, labels and heatmaps use the logarithm of the zoom
+    def test_wheel_notch_zooming_out(self):
+        test_map = self.create_map('list')
+        test_map.set_labels(['nodes'])
+        test_map.determine_scale()
+        test_map.calculate_pixel_coordinates()
+        test_map.render_all()
+        event = tk.Event()
+        event.x,event.y,event.delta = 200,150,-120
+        test_map.zoom_map(event)
+        test_map.render_all()
+        self.assertGreater(test_map.view.zoom,0)
+
+@unittest.skipIf(zoom_map.Image is None,'raster tiles require Pillow')
+class TestRasterTiles(MapTestCase):
+    #wheel steps in and out which do not return to exactly the same zoom still return to the same tile level, so cached tiles are reused
+    def test_wheel_steps_return_to_tile_level(self):
+        test_map = self.create_map('list')
+        test_map.set_raster_layers(['nodes'])
+        test_map.determine_scale()
+        test_map.calculate_pixel_coordinates()
+        test_map.render_all()
+        key = test_map.get_tile_key(0,0)
+        event = tk.Event()
+        event.x,event.y = 200,150
+        for delta in (30,-20):
+            event.delta = delta
+            test_map.zoom_map(event)
+        self.assertNotAlmostEqual(test_map.view.zoom,1)
+        self.assertEqual(test_map.get_tile_key(0,0),key)
+
+class TestLevelOfDetail(MapTestCase):
+    #moving a node moves it between the clusters of its old and new cells rather than building the clusters again
+    def test_move_node_between_clusters(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = zoom_map.ZoomMap(400,300,self.window,storage_mode=storage_mode,level_of_detail=True)
+                test_map.create_nodes([0,0.1,2,2.1],[0,0.1,2,2.1],[5]*4,['black']*4,['a','b','c','d'])
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.render_all()
+                clusters = test_map.nodes_clusters
+                test_map.update_nodes_positions([0],[2.05],[2.05])
+                test_map.render_dirty_objects()
+                self.assertIs(test_map.nodes_clusters,clusters)
+                clusters_x,clusters_y,clusters_count,clusters_first = clusters.levels[1]
+                self.assertEqual(sorted(count for count in clusters_count if count>0),[1,3])
+
+class TestPicking(MapTestCase):
+    #the node under a screen position is picked in preference to a line through it, and nothing is picked far from every object
+    def test_pick_nearest_object(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = self.create_map(storage_mode)
+                test_map.create_lines([3],['grey'],['x'],'none','none',[],lines_start_node_type=['node'],lines_start_node_index=[0],lines_end_node_type=['node'],lines_end_node_index=[2])
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.render_all()
+                node_x,node_y = test_map.view.apply(test_map.nodes_x[1],test_map.nodes_y[1])
+                self.assertEqual(test_map.pick(node_x+3,node_y)[:2],('node',1))
+                line_x,line_y = test_map.view.apply((test_map.nodes_x[1]+test_map.nodes_x[2])/2,(test_map.nodes_y[1]+test_map.nodes_y[2])/2)
+                self.assertEqual(test_map.pick(line_x,line_y)[:2],('line',0))
+                self.assertIsNone(test_map.pick(line_x+50,line_y+50))
+
+class TestPieNodes(MapTestCase):
+    #changing the lengths of the colour sections re-angles the existing arcs, starting from the top of the pie node
+    def test_update_slices_reuses_arcs(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = zoom_map.ZoomMap(400,300,self.window,storage_mode=storage_mode)
+                test_map.create_pie_nodes([0,1],[0,1],[10,10],[['red','blue'],['green']],[[1,3],[1]],['a','b'])
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.render_all()
+                self.assertEqual(test_map.pie_nodes_slice_starts[0],[90,180])
+                self.assertEqual(test_map.pie_nodes_slice_extents[1],[359.999]) #a whole pie is drawn just short of a full circle
+                arcs = list(test_map.pie_node_canvas_ids[0])
+                test_map.update_pie_nodes_slices([0],[[1,1]])
+                test_map.render_dirty_objects()
+                self.assertEqual(test_map.pie_node_canvas_ids[0],arcs)
+                self.assertEqual([float(test_map.map.itemcget(arc,'start')) for arc in arcs],[90,270])
+                self.assertEqual([float(test_map.map.itemcget(arc,'extent')) for arc in arcs],[180,180])
+
+class TestCompoundLines(MapTestCase):
+    #compound lines with a single point cannot be drawn by tk, so they are turned away before they reach the canvas
+    def test_single_point_compound_lines_rejected(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = self.create_map(storage_mode)
+                test_map.create_compound_lines([2,2],['blue']*2,['route','stop'],'none','none',[],compound_lines_x_coords=[[0,1,2],[1]],compound_lines_y_coords=[[0,2,1],[1]])
+                self.assertEqual(test_map.num_compound_lines,0)
+                test_map.create_compound_lines([2],['blue'],['route'],'none','none',[],compound_lines_x_coords=[[0,1,2]],compound_lines_y_coords=[[0,2,1]])
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.render_all()
+                self.assertEqual(test_map.append_compound_lines([2],['red'],['stop'],[[1]],[[1]]),[])
+                test_map.render_dirty_objects()
+                self.assertEqual(test_map.num_compound_lines,1)
+                self.assertEqual(len(test_map.map.find_withtag(test_map.compound_lines_tag)),1)
+
+class TestLabels(MapTestCase):
+    #compound line midpoints are stored as lists even when the map uses arrays
+    def test_compound_lines_labels(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = self.create_map(storage_mode)
+                test_map.create_compound_lines([2],['blue'],['route'],'none','none',[],compound_lines_x_coords=[[0,1,2]],compound_lines_y_coords=[[0,2,1]])
+                test_map.set_labels(['nodes','compound_lines'])
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.render_all()
+                labels = [key for key,x,y,offset,width,coord_x,coord_y in test_map.get_labels_order()]
+                self.assertIn(('compound_lines',0),labels)
+
+class TestLineIncidence(MapTestCase):
+    #moving a node moves the ends of the lines attached to it, lines placed by given coordinates stay where they are
+    def test_moved_node_drags_attached_lines(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = self.create_map(storage_mode)
+                test_map.create_lines([1]*3,['grey']*3,['x','y','z'],'none','none',[],lines_start_node_type=['node']*3,lines_start_node_index=[0,1,1],lines_end_node_type=['node']*3,lines_end_node_index=[1,2,2],
+                                      lines_start_x_coord=['none','none',5],lines_start_y_coord=['none','none',5],line_coords_prefer=True)
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.render_all()
+                self.assertEqual(test_map.get_node_lines(1),[0,1])
+                self.assertEqual(test_map.get_node_lines(2),[1,2])
+                test_map.update_nodes_positions([1],[3],[4])
+                self.assertEqual((float(test_map.lines_end_x_coord[0]),float(test_map.lines_end_y_coord[0])),(3,4))
+                self.assertEqual((float(test_map.lines_start_x_coord[1]),float(test_map.lines_start_y_coord[1])),(3,4))
+                self.assertEqual((float(test_map.lines_start_x_coord[2]),float(test_map.lines_start_y_coord[2])),(5,5))
+
+class TestGroups(MapTestCase):
+    #a group style overrides the colours of its objects, even after they are restyled, and hiding the group hides only its objects
+    def test_style_and_hide_group(self):
+        test_map = self.create_map('list')
+        test_map.determine_scale()
+        test_map.calculate_pixel_coordinates()
+        test_map.render_all()
+        test_map.add_to_group('highlight','nodes',[0,2])
+        test_map.style_group('highlight',fill='red')
+        test_map.update_nodes_colours([0,1],['blue','blue'])
+        test_map.render_dirty_objects()
+        ids = test_map.node_canvas_ids
+        self.assertEqual([test_map.map.itemcget(ids[i],'fill') for i in range(3)],['red','blue','red'])
+        test_map.hide_group('highlight')
+        self.assertEqual([test_map.map.itemcget(ids[i],'state') for i in range(3)],['hidden','','hidden'])
+
+class TestSnapshots(MapTestCase):
+    #a loaded snapshot keeps its clusters, and once the first point of a cluster leaves its cell the clusters are built again when next loaded
+    def test_clusters_saved_until_first_point_moves(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory,'snapshot.bin')
+            for storage_mode in self.storage_modes:
+                with self.subTest(storage_mode=storage_mode):
+                    test_map = zoom_map.ZoomMap(400,300,self.window,storage_mode=storage_mode,level_of_detail=True)
+                    test_map.create_nodes([0,0.1,2,2.1],[0,0.1,2,2.1],[5]*4,['black']*4,['a','b','c','d'])
+                    test_map.determine_scale()
+                    test_map.calculate_pixel_coordinates()
+                    test_map.save_snapshot(path)
+                    loaded_map = zoom_map.ZoomMap(400,300,self.window,storage_mode=storage_mode,level_of_detail=True)
+                    loaded_map.load_snapshot(path,memory_map=False)
+                    loaded_map.update_nodes_positions([1],[0.05],[0.05]) #stays in its cell on every level
+                    loaded_map.save_snapshot(path)
+                    self.assertIn('nodes_clusters_shape',zoom_map.read_columns(path))
+                    loaded_map.update_nodes_positions([0],[2.05],[2.05]) #the first point of its cluster
+                    clusters_x,clusters_y,clusters_count,clusters_first = loaded_map.nodes_clusters.levels[1]
+                    self.assertEqual(sorted(count for count in clusters_count if count>0),[1,3])
+                    loaded_map.save_snapshot(path)
+                    self.assertNotIn('nodes_clusters_shape',zoom_map.read_columns(path))
+
+class TestRenderScheduling(MapTestCase):
+    #a burst of wheel and drag events is drawn by one frame, which brings the items to their positions in the final view
+    def test_input_events_coalesced(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = self.create_map(storage_mode)
+                test_map.create_lines([1],['grey'],['x'],'none','none',[],lines_start_node_type=['node'],lines_start_node_index=[0],lines_end_node_type=['node'],lines_end_node_index=[2])
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.render_all()
+                event = tk.Event()
+                event.x,event.y = 200,150
+                for delta in (30,30,-20):
+                    event.delta = delta
+                    test_map.zoom_map(event)
+                scheduled = test_map.render_scheduled
+                self.assertIsNotNone(scheduled)
+                test_map.drag_start(event)
+                event.x,event.y = 220,140
+                test_map.drag_end(event)
+                self.assertEqual(test_map.render_scheduled,scheduled) #still the one pending frame
+                test_map.flush_render()
+                self.assertIsNone(test_map.render_scheduled)
+                start_x,start_y = test_map.view.apply(test_map.lines_start_x[0],test_map.lines_start_y[0])
+                end_x,end_y = test_map.view.apply(test_map.lines_end_x[0],test_map.lines_end_y[0])
+                for coord,expected in zip(test_map.map.coords(test_map.lines_canvas_ids[0]),(start_x,start_y,end_x,end_y)):
+                    self.assertAlmostEqual(coord,expected,places=3)
+                node_x1,node_y1,node_x2,node_y2 = test_map.map.coords(test_map.node_canvas_ids[1])
+                node_x,node_y = test_map.view.apply(test_map.nodes_x[1],test_map.nodes_y[1])
+                self.assertAlmostEqual((node_x1+node_x2)/2,node_x,places=3)
+                self.assertAlmostEqual((node_y1+node_y2)/2,node_y,places=3)
+
+class TestSharedModel(MapTestCase):
+    #two maps drawing the same objects side by side, objects appended, changed and removed through one map are drawn by both
+    def test_side_by_side_maps(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                first_map = self.create_map(storage_mode)
+                first_map.create_lines([1],['grey'],['x'],'none','none',[],lines_start_node_type=['node'],lines_start_node_index=[0],lines_end_node_type=['node'],lines_end_node_index=[1])
+                second_map = zoom_map.ZoomMap(400,300,self.window,model=first_map.model)
+                first_map.determine_scale()
+                first_map.calculate_pixel_coordinates()
+                second_map.view.zoom_about(-0.5,200,150) #the second map shows the same objects zoomed out
+                for test_map in (first_map,second_map):
+                    test_map.render_all()
+                    self.assertEqual(len(test_map.map.find_withtag(test_map.nodes_tag)),3)
+                self.assertEqual(first_map.append_nodes([1.5],[0.5],[5],['black'],['d']),[3])
+                first_map.update_nodes_colours([0],['red'])
+                first_map.update_nodes_positions([1],[0.5],[1.5]) #the line attached to the node follows it in both maps
+                first_map.remove_nodes([2])
+                for test_map in (first_map,second_map):
+                    test_map.render_dirty_objects()
+                    self.assertEqual(len(test_map.map.find_withtag(test_map.nodes_tag)),3)
+                    self.assertEqual(test_map.map.itemcget(test_map.node_canvas_ids[0],'fill'),'red')
+                    line_coords = test_map.map.coords(test_map.lines_canvas_ids[0])
+                    node_x1,node_y1,node_x2,node_y2 = test_map.map.coords(test_map.node_canvas_ids[1])
+                    self.assertAlmostEqual(line_coords[2],(node_x1+node_x2)/2)
+                    self.assertAlmostEqual(line_coords[3],(node_y1+node_y2)/2)
+                self.assertNotEqual(first_map.map.coords(first_map.node_canvas_ids[3]),second_map.map.coords(second_map.node_canvas_ids[3])) #each map keeps its own view
+
+@unittest.skipIf(zoom_map.np is None or zoom_map.Image is None,'the heatmap requires numpy and Pillow')
+class TestHeatmap(MapTestCase):
+    #moving and recolouring nodes changes the cells of the heatmap pyramid rather than building it again
+    def test_move_node_updates_pyramid(self):
+        for storage_mode in self.storage_modes:
+            with self.subTest(storage_mode=storage_mode):
+                test_map = self.create_map(storage_mode)
+                test_map.determine_scale()
+                test_map.calculate_pixel_coordinates()
+                test_map.set_heatmap(weights=[1,2,3])
+                test_map.render_all()
+                pyramid = test_map.heatmap_pyramid
+                test_map.update_nodes_colours([0],['red'])
+                test_map.update_nodes_positions([1],[1.5],[0.5])
+                test_map.render_dirty_objects()
+                self.assertIs(test_map.heatmap_pyramid,pyramid)
+                built = zoom_map.DensityPyramid(test_map.nodes_x,test_map.nodes_y,[1,2,3],pyramid.num_levels)
+                for level,weights in enumerate(pyramid.levels):
+                    self.assertTrue(zoom_map.np.allclose(weights,built.levels[level]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,12 +3,1419 @@
 
 #dependencies
 import tkinter as tk
+from tkinter import font as tkfont
+import math
+import time
+import csv
+import struct
+import sys
+from array import array
+from collections import deque
+import threading
+import os
+import io
+import sqlite3
+import mmap
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor,ProcessPoolExecutor,as_completed
+#optional dependencies
+try:
+    import numpy as np #used for array-backed storage of very large maps
+except ImportError:
+    np = None
+try:
+    from PIL import Image,ImageDraw,ImageTk #used to draw static layers offscreen as raster tiles
+except ImportError:
+    Image = None
+
+
+#the view transform maps unzoomed pixel coordinates onto the screen
+#screen position = unzoomed pixel position * zoom + offset, this covers both zooming and dragging the map
+class ViewTransform:
+    def __init__(self,zoom=1,offset_x=0,offset_y=0):
+        self.zoom = zoom #how far are we zoomed in
+        self.offset_x = offset_x #offset (in pixels) of the unzoomed origin from the screen origin, horizontal
+        self.offset_y = offset_y #offset (in pixels) of the unzoomed origin from the screen origin, vertical
+
+    #return to the unzoomed view, where the whole map fits on the screen
+    def reset(self):
+        self.zoom = 1
+        self.offset_x = 0
+        self.offset_y = 0
+
+    #return an independent copy of this view, used to save and restore views
+    def copy(self):
+        return ViewTransform(self.zoom,self.offset_x,self.offset_y)
+
+    #zoom by a factor of e**zoom_delta, keeping the screen position centre_x,centre_y in the same place
+    #steps of the same size in and out cancel, and however far a step zooms out the zoom stays positive
+    def zoom_about(self,zoom_delta,centre_x,centre_y):
+        factor = math.exp(zoom_delta)
+        self.zoom = self.zoom*factor
+        self.offset_x = self.offset_x*factor - centre_x*(factor-1)
+        self.offset_y = self.offset_y*factor - centre_y*(factor-1)
+
+    #move the view by a number of screen pixels
+    def pan(self,delta_x,delta_y):
+        self.offset_x = self.offset_x + delta_x
+        self.offset_y = self.offset_y + delta_y
+
+    #convert unzoomed pixel coordinates to screen coordinates, works on single values and numpy arrays
+    def apply(self,x,y):
+        return x*self.zoom+self.offset_x,y*self.zoom+self.offset_y
+
+    #convert screen coordinates back to unzoomed pixel coordinates, works on single values and numpy arrays
+    def invert(self,screen_x,screen_y):
+        return (screen_x-self.offset_x)/self.zoom,(screen_y-self.offset_y)/self.zoom
+
+    #get the view a fraction (0 to 1) of the way through a smooth transition from this view to another
+    #the zoom changes by the same factor in each step, about the point which is at the same place on the screen in both views, so zooming looks steady
+    def interpolate(self,other,fraction):
+        if fraction>=1:
+            return other.copy()
+        zoom = self.zoom*(other.zoom/self.zoom)**fraction
+        if abs(other.zoom-self.zoom)<=1e-12*self.zoom: #no change of zoom, only panning
+            return ViewTransform(zoom,self.offset_x+(other.offset_x-self.offset_x)*fraction,self.offset_y+(other.offset_y-self.offset_y)*fraction)
+        #the unzoomed point which is at the same screen position in both views
+        fixed_x = (other.offset_x-self.offset_x)/(self.zoom-other.zoom)
+        fixed_y = (other.offset_y-self.offset_y)/(self.zoom-other.zoom)
+        screen_x,screen_y = self.apply(fixed_x,fixed_y)
+        return ViewTransform(zoom,screen_x-fixed_x*zoom,screen_y-fixed_y*zoom)
+
+
+#a transition of the view from one view to another over a period of time
+#easing 'in_out' starts and ends gently, 'out' starts at full speed and slows down, which suits a transition continuing an earlier one
+class ViewAnimation:
+    def __init__(self,start_view,end_view,duration,easing='in_out',callback=None):
+        self.start_view = start_view.copy() #view at the start of the transition
+        self.end_view = end_view.copy() #view at the end of the transition
+        self.duration = duration #length of the transition, seconds
+        self.easing = easing #how the speed of the transition changes over time
+        self.callback = callback #function called once the end view is reached, or None
+        self.start_time = time.perf_counter()
+
+    #get the fraction of the transition done at a time.perf_counter() time, after easing
+    def get_progress(self,now):
+        if self.duration<=0:
+            return 1
+        fraction = min(max((now-self.start_time)/self.duration,0),1)
+        if self.easing=='out':
+            return 1-(1-fraction)**2
+        return fraction*fraction*(3-2*fraction)
+
+    #get the view at a time.perf_counter() time
+    def get_view(self,now):
+        return self.start_view.interpolate(self.end_view,self.get_progress(now))
+
+    #has the end view been reached by a time.perf_counter() time
+    def finished(self,now):
+        return now-self.start_time>=self.duration
+
+
+#projections convert global coordinates (longitude x, latitude y in degrees) to a flat projected space, which is then scaled to pixels
+#each projection works on single values, python lists and numpy arrays, converting a whole list or array at once
+#x and y are projected independently and in order, so boxes in global coordinates stay boxes in projected space
+
+#plate carree, longitude and latitude are used directly as a flat plane
+class EquirectangularProjection:
+    name = 'equirectangular'
+
+    def project(self,x,y):
+        return x,y
+
+    def unproject(self,x,y):
+        return x,y
+
+#web mercator, as used by slippy map tiles, y is scaled to degrees at the equator so both axes share units
+class WebMercatorProjection:
+    name = 'web_mercator'
+    max_latitude = 85.0511287798 #web mercator does not reach the poles
+
+    def project(self,x,y):
+        limit = self.max_latitude
+        if np is not None and isinstance(y,np.ndarray):
+            return x,np.degrees(np.arcsinh(np.tan(np.radians(np.clip(y,-limit,limit)))))
+        if isinstance(y,list):
+            return x,[math.degrees(math.asinh(math.tan(math.radians(max(min(value,limit),-limit))))) for value in y]
+        return x,math.degrees(math.asinh(math.tan(math.radians(max(min(y,limit),-limit)))))
+
+    def unproject(self,x,y):
+        if np is not None and isinstance(y,np.ndarray):
+            return x,np.degrees(np.arctan(np.sinh(np.radians(y))))
+        if isinstance(y,list):
+            return x,[math.degrees(math.atan(math.sinh(math.radians(value)))) for value in y]
+        return x,math.degrees(math.atan(math.sinh(math.radians(y))))
+
+#projections which can be selected by name
+projections = {'equirectangular':EquirectangularProjection,'web_mercator':WebMercatorProjection}
+
+
+#uniform grid spatial index over axis aligned bounding boxes, used to find which objects are in view without checking every object
+class SpatialGrid:
+    #insert_items=False leaves the cells empty, for them to be filled by set_cell_entries
+    def __init__(self,boxes_min_x,boxes_min_y,boxes_max_x,boxes_max_y,items_per_cell=8,max_cells_per_item=64,insert_items=True):
+        #bounding boxes of every item, as python lists
+        self.boxes_min_x = list(boxes_min_x)
+        self.boxes_min_y = list(boxes_min_y)
+        self.boxes_max_x = list(boxes_max_x)
+        self.boxes_max_y = list(boxes_max_y)
+        self.num_items = len(self.boxes_min_x)
+        self.max_cells_per_item = max_cells_per_item #items covering more cells than this are stored as large items
+        self.cells = {} #list of items overlapping each non-empty cell, keyed by (column,row)
+        self.large_items = [] #items covering too many cells to store in each one, always checked directly
+        self.packed_cells = None #cells of a grid loaded from a snapshot, (sorted cell keys, offsets, items), unpacked into cells when first used
+        self.removed_items = set() #items deleted from the grid, whose boxes are kept so the other items keep their indices
+        self.num_items_built = self.num_items #number of items when the cells were laid out, see needs_rebuild
+        if self.num_items==0: #nothing to index
+            self.min_x = self.min_y = self.max_x = self.max_y = 0
+            self.origin_x = self.origin_y = 0
+            self.num_columns = self.num_rows = 1
+            self.cell_width = self.cell_height = 1
+            return
+        #extent of the grid covers every item
+        self.min_x = min(self.boxes_min_x)
+        self.min_y = min(self.boxes_min_y)
+        self.max_x = max(self.boxes_max_x)
+        self.max_y = max(self.boxes_max_y)
+        #the cells stay fixed even if the extent later grows, items beyond the edge are stored in the edge cells
+        self.origin_x = self.min_x
+        self.origin_y = self.min_y
+        #choose the number of cells so that on average each cell holds a few items
+        cells_per_axis = min(max(int((self.num_items/items_per_cell)**0.5),1),1024)
+        self.num_columns = cells_per_axis
+        self.num_rows = cells_per_axis
+        self.cell_width = (self.max_x-self.min_x)/self.num_columns or 1 #avoid zero sized cells when all items line up
+        self.cell_height = (self.max_y-self.min_y)/self.num_rows or 1
+        if insert_items:
+            for i in range(self.num_items):
+                self.insert_item(i)
+
+    #get what is needed to find the cells covered by a bounding box, see grid_cell_entries
+    def get_layout(self):
+        return self.origin_x,self.origin_y,self.cell_width,self.cell_height,self.num_columns,self.num_rows,self.max_cells_per_item
+
+    #fill the cells from the (cell keys, items, large items) found by grid_cell_entries for consecutive ranges of items
+    def set_cell_entries(self,parts):
+        keys = array('q')
+        items = array('q')
+        for part_keys,part_items,part_large_items in parts:
+            keys.extend(part_keys)
+            items.extend(part_items)
+            self.large_items.extend(part_large_items)
+        if np is not None: #sort the entries into packed cells, which are unpacked when first used
+            keys = np.frombuffer(keys,dtype=np.int64)
+            items = np.frombuffer(items,dtype=np.int64)
+            order = np.argsort(keys,kind='stable') #items stay in order within each cell
+            cell_keys,starts = np.unique(keys[order],return_index=True)
+            self.packed_cells = (cell_keys,np.append(starts,len(keys)),items[order])
+            return
+        for key,i in zip(keys,items):
+            cell = self.cells.get((key//self.num_rows,key%self.num_rows))
+            if cell is None:
+                cell = self.cells[(key//self.num_rows,key%self.num_rows)] = []
+            cell.append(i)
+
+    #get the range of cells (clipped to the grid) covered by a bounding box
+    def get_cell_range(self,min_x,min_y,max_x,max_y):
+        column_start = min(max(int((min_x-self.origin_x)/self.cell_width),0),self.num_columns-1)
+        column_end = min(max(int((max_x-self.origin_x)/self.cell_width),0),self.num_columns-1)
+        row_start = min(max(int((min_y-self.origin_y)/self.cell_height),0),self.num_rows-1)
+        row_end = min(max(int((max_y-self.origin_y)/self.cell_height),0),self.num_rows-1)
+        return column_start,row_start,column_end,row_end
+
+    #add item i to the cells its bounding box covers
+    def insert_item(self,i):
+        column_start,row_start,column_end,row_end = self.get_cell_range(self.boxes_min_x[i],self.boxes_min_y[i],self.boxes_max_x[i],self.boxes_max_y[i])
+        if (column_end-column_start+1)*(row_end-row_start+1)>self.max_cells_per_item:
+            self.large_items.append(i)
+            return
+        for column in range(column_start,column_end+1):
+            for row in range(row_start,row_end+1):
+                cell = self.get_cell(column,row)
+                if cell is None:
+                    cell = self.cells[(column,row)] = []
+                cell.append(i)
+
+    #remove item i from the cells its bounding box covers
+    def remove_item(self,i):
+        column_start,row_start,column_end,row_end = self.get_cell_range(self.boxes_min_x[i],self.boxes_min_y[i],self.boxes_max_x[i],self.boxes_max_y[i])
+        if (column_end-column_start+1)*(row_end-row_start+1)>self.max_cells_per_item:
+            self.large_items.remove(i)
+            return
+        for column in range(column_start,column_end+1):
+            for row in range(row_start,row_end+1):
+                self.get_cell(column,row).remove(i)
+
+    #add an item with the next index, the cells stay fixed so items beyond the extent are stored in the edge cells
+    def append_item(self,min_x,min_y,max_x,max_y):
+        if not isinstance(self.boxes_min_x,list): #the boxes of a loaded grid are arrays, which cannot grow
+            self.boxes_min_x,self.boxes_min_y,self.boxes_max_x,self.boxes_max_y = [[float(value) for value in boxes] for boxes in (self.boxes_min_x,self.boxes_min_y,self.boxes_max_x,self.boxes_max_y)]
+        i = self.num_items
+        self.boxes_min_x.append(min_x)
+        self.boxes_min_y.append(min_y)
+        self.boxes_max_x.append(max_x)
+        self.boxes_max_y.append(max_y)
+        self.num_items += 1
+        self.insert_item(i)
+        if i==0 or i==len(self.removed_items): #the first item which has not been deleted sets the extent
+            self.min_x,self.min_y,self.max_x,self.max_y = min_x,min_y,max_x,max_y
+        else: #grow the extent if needed, so queries near the new item still find it
+            self.min_x = min(self.min_x,min_x)
+            self.min_y = min(self.min_y,min_y)
+            self.max_x = max(self.max_x,max_x)
+            self.max_y = max(self.max_y,max_y)
+        return i
+
+    #delete item i from the grid, the indices of the other items do not change
+    def delete_item(self,i):
+        self.remove_item(i)
+        self.removed_items.add(i)
+
+    #should the grid be built again before it holds num_items items, which is once it has doubled in size since its cells were laid out
+    #rebuilding then takes time proportional to the items added since the last rebuild, so adding items costs amortized O(1) each
+    def needs_rebuild(self,num_items):
+        return num_items>2*max(self.num_items_built,8)
+
+    #move item i to a new bounding box, only the cells it leaves and enters are changed
+    def update_item(self,i,min_x,min_y,max_x,max_y):
+        self.remove_item(i)
+        self.boxes_min_x[i] = min_x
+        self.boxes_min_y[i] = min_y
+        self.boxes_max_x[i] = max_x
+        self.boxes_max_y[i] = max_y
+        self.insert_item(i)
+        #grow the extent if needed, so queries near the new position still find the item
+        self.min_x = min(self.min_x,min_x)
+        self.min_y = min(self.min_y,min_y)
+        self.max_x = max(self.max_x,max_x)
+        self.max_y = max(self.max_y,max_y)
+
+    #get the list of items in a cell, or None if the cell is empty
+    #cells of a loaded grid are unpacked when first used, so loading does not depend on the number of items
+    def get_cell(self,column,row):
+        cell = self.cells.get((column,row))
+        if cell is None and self.packed_cells is not None:
+            keys,offsets,items = self.packed_cells
+            key = column*self.num_rows+row
+            position = bisect_left(keys,key)
+            if position<len(keys) and keys[position]==key:
+                cell = self.cells[(column,row)] = [int(i) for i in items[offsets[position]:offsets[position+1]]]
+        return cell
+
+    #get the grid as columns which can be saved, see from_packed
+    def pack(self,prefix):
+        if self.packed_cells is not None: #unpack every cell first
+            for key in self.packed_cells[0]:
+                self.get_cell(int(key)//self.num_rows,int(key)%self.num_rows)
+        keys = sorted(column*self.num_rows+row for (column,row),cell in self.cells.items() if len(cell)>0)
+        offsets = [0]
+        items = []
+        for key in keys:
+            items.extend(self.cells[(key//self.num_rows,key%self.num_rows)])
+            offsets.append(len(items))
+        return {prefix+'_extent':[float(self.min_x),float(self.min_y),float(self.max_x),float(self.max_y),float(self.origin_x),float(self.origin_y),float(self.cell_width),float(self.cell_height)],
+                prefix+'_shape':[self.num_items,self.num_columns,self.num_rows,self.max_cells_per_item],
+                prefix+'_min_x':array('d',self.boxes_min_x),prefix+'_min_y':array('d',self.boxes_min_y),prefix+'_max_x':array('d',self.boxes_max_x),prefix+'_max_y':array('d',self.boxes_max_y),
+                prefix+'_cell_keys':array('q',keys),prefix+'_cell_offsets':array('q',offsets),prefix+'_cell_items':array('q',items),prefix+'_large_items':array('q',self.large_items),
+                prefix+'_removed_items':array('q',sorted(self.removed_items))}
+
+    #recreate a grid from columns returned by pack, the boxes and cells are used as they are rather than copied
+    @classmethod
+    def from_packed(cls,columns,prefix):
+        grid = cls.__new__(cls)
+        grid.min_x,grid.min_y,grid.max_x,grid.max_y,grid.origin_x,grid.origin_y,grid.cell_width,grid.cell_height = [float(value) for value in columns[prefix+'_extent']]
+        grid.num_items,grid.num_columns,grid.num_rows,grid.max_cells_per_item = [int(value) for value in columns[prefix+'_shape']]
+        grid.boxes_min_x = columns[prefix+'_min_x']
+        grid.boxes_min_y = columns[prefix+'_min_y']
+        grid.boxes_max_x = columns[prefix+'_max_x']
+        grid.boxes_max_y = columns[prefix+'_max_y']
+        grid.cells = {}
+        grid.large_items = [int(i) for i in columns[prefix+'_large_items']]
+        grid.packed_cells = (columns[prefix+'_cell_keys'],columns[prefix+'_cell_offsets'],columns[prefix+'_cell_items'])
+        grid.removed_items = set(int(i) for i in columns.get(prefix+'_removed_items',()))
+        grid.num_items_built = grid.num_items
+        return grid
+
+    #does item i's bounding box overlap the query box
+    def overlaps(self,i,min_x,min_y,max_x,max_y):
+        return self.boxes_min_x[i]<=max_x and self.boxes_max_x[i]>=min_x and self.boxes_min_y[i]<=max_y and self.boxes_max_y[i]>=min_y
+
+    #return a sorted list of the items whose bounding boxes overlap the query box
+    def query(self,min_x,min_y,max_x,max_y):
+        if self.num_items==0 or min_x>self.max_x or max_x<self.min_x or min_y>self.max_y or max_y<self.min_y:
+            return [] #query box is outside the grid
+        if min_x<=self.min_x and max_x>=self.max_x and min_y<=self.min_y and max_y>=self.max_y: #query box covers the whole grid, so every item overlaps it
+            if len(self.removed_items)>0:
+                return [i for i in range(self.num_items) if i not in self.removed_items]
+            return list(range(self.num_items))
+        column_start,row_start,column_end,row_end = self.get_cell_range(min_x,min_y,max_x,max_y)
+        candidates = set(self.large_items)
+        for column in range(column_start,column_end+1):
+            for row in range(row_start,row_end+1):
+                cell = self.cells.get((column,row))
+                if cell is None and self.packed_cells is not None:
+                    cell = self.get_cell(column,row)
+                if cell is not None:
+                    candidates.update(cell)
+        return sorted(i for i in candidates if self.overlaps(i,min_x,min_y,max_x,max_y))
+
+
+#hierarchical clustering of points on a quadtree, used to draw many nearby nodes as one marker when zoomed out
+#level L divides the square extent of the points into 2^L by 2^L cells, and each non-empty cell is one cluster
+#bin_finest_level(min_x,min_y,size,cells_per_axis) can replace how the finest level is found, it must return the same cells as cluster_finest_level
+class NodeClusters:
+    def __init__(self,points_x,points_y,num_levels=None,bin_finest_level=None):
+        self.num_points = len(points_x)
+        if num_levels is None: #enough levels that the finest cells hold a few points on average
+            num_levels = min(max(int(math.log2(max(self.num_points,1))/2)+3,1),20)
+        self.num_levels = num_levels
+        self.levels = [None]*num_levels #for each level, the centroid x, centroid y, number of points and first point of each cluster
+        self.level_indices = {} #spatial index of the cluster centroids of each level, built when the level is first drawn
+        self.level_cells = {} #cell -> cluster of each level, found when points are first added to, moved within or removed from the level
+        self.num_points_built = self.num_points #number of points when the quadtree extent was chosen, see needs_rebuild
+        self.first_moved = False #has the first point of a cluster moved out of its cell, see move_point
+        if self.num_points==0:
+            self.min_x = self.min_y = 0
+            self.size = 1
+            for level in range(num_levels):
+                self.levels[level] = ([],[],[],[])
+            return
+        #the quadtree covers a square extent around all the points
+        if np is not None and not isinstance(points_x,list):
+            self.min_x,self.min_y = float(np.min(points_x)),float(np.min(points_y))
+            self.size = max(float(np.max(points_x))-self.min_x,float(np.max(points_y))-self.min_y) or 1
+        else:
+            self.min_x,self.min_y = min(points_x),min(points_y)
+            self.size = max(max(points_x)-self.min_x,max(points_y)-self.min_y) or 1
+        #cluster the points on the finest level, then merge neighbouring clusters to form each coarser level
+        finest = num_levels-1
+        if bin_finest_level is None:
+            cells = self.cluster_finest_level(points_x,points_y,2**finest)
+        else:
+            cells = bin_finest_level(self.min_x,self.min_y,self.size,2**finest)
+        self.levels[finest] = self.cells_to_clusters(cells)
+        for level in range(finest-1,-1,-1):
+            parent_cells = {}
+            for (column,row),(count,sum_x,sum_y,first) in cells.items():
+                key = (column>>1,row>>1) #the parent cell in the next coarsest level
+                parent = parent_cells.get(key)
+                if parent is None:
+                    parent_cells[key] = (count,sum_x,sum_y,first)
+                else:
+                    parent_cells[key] = (parent[0]+count,parent[1]+sum_x,parent[2]+sum_y,min(parent[3],first))
+            cells = parent_cells
+            self.levels[level] = self.cells_to_clusters(cells)
+
+    #group points into the cells of the finest level, returning the number, coordinate sums and first point of each cell
+    def cluster_finest_level(self,points_x,points_y,cells_per_axis):
+        return bin_points(points_x,points_y,self.min_x,self.min_y,self.size,cells_per_axis)
+
+    #convert cells into lists of cluster centroids, sizes and first points
+    def cells_to_clusters(self,cells):
+        clusters_x = []
+        clusters_y = []
+        clusters_count = []
+        clusters_first = []
+        for count,sum_x,sum_y,first in cells.values():
+            clusters_x.append(sum_x/count)
+            clusters_y.append(sum_y/count)
+            clusters_count.append(count)
+            clusters_first.append(first)
+        return clusters_x,clusters_y,clusters_count,clusters_first
+
+    #get the cell of the finest level holding a point, points beyond the extent are held by the edge cells as in bin_points
+    def get_finest_cell(self,x,y):
+        cells_per_axis = 2**(self.num_levels-1)
+        column = min(max(int((x-self.min_x)/self.size*cells_per_axis),0),cells_per_axis-1)
+        row = min(max(int((y-self.min_y)/self.size*cells_per_axis),0),cells_per_axis-1)
+        return column,row
+
+    #get the cluster of each cell of a level, found from the position of the first point of each cluster
+    #the levels of clusters loaded from a snapshot are arrays, which are turned into lists here so clusters can be changed
+    def get_level_cells(self,level,points_x,points_y):
+        if level not in self.level_cells:
+            clusters_x,clusters_y,clusters_count,clusters_first = self.levels[level]
+            if not isinstance(clusters_x,list):
+                self.levels[level] = ([float(x) for x in clusters_x],[float(y) for y in clusters_y],[int(count) for count in clusters_count],[int(first) for first in clusters_first])
+            shift = self.num_levels-1-level #each level halves the number of cells along each axis
+            if np is not None: #find the cells of all the first points at once, as in get_finest_cell
+                firsts = np.asarray(self.levels[level][3],dtype=np.intp)
+                cells_per_axis = 2**(self.num_levels-1)
+                columns = np.clip(((np.asarray(points_x)[firsts]-self.min_x)/self.size*cells_per_axis).astype(np.int64),0,cells_per_axis-1)>>shift
+                rows = np.clip(((np.asarray(points_y)[firsts]-self.min_y)/self.size*cells_per_axis).astype(np.int64),0,cells_per_axis-1)>>shift
+                self.level_cells[level] = dict(zip(zip(columns.tolist(),rows.tolist()),range(len(firsts))))
+            else:
+                cells = {}
+                for cluster,first in enumerate(self.levels[level][3]):
+                    column,row = self.get_finest_cell(points_x[first],points_y[first])
+                    cells[(column>>shift,row>>shift)] = cluster
+                self.level_cells[level] = cells
+        return self.level_cells[level]
+
+    #add point i, at (x,y), to the cluster of its cell on every level, points_x and points_y hold the position of every point
+    #an empty cell gains a new cluster, whose index follows those of the existing clusters of its level
+    def add_point(self,i,x,y,points_x,points_y):
+        column,row = self.get_finest_cell(x,y)
+        for level in range(self.num_levels):
+            cells = self.get_level_cells(level,points_x,points_y)
+            clusters_x,clusters_y,clusters_count,clusters_first = self.levels[level]
+            shift = self.num_levels-1-level
+            cluster = cells.get((column>>shift,row>>shift))
+            if cluster is None:
+                cluster = cells[(column>>shift,row>>shift)] = len(clusters_x)
+                clusters_x.append(x)
+                clusters_y.append(y)
+                clusters_count.append(1)
+                clusters_first.append(i)
+                if level in self.level_indices:
+                    if self.level_indices[level].needs_rebuild(len(clusters_x)):
+                        del self.level_indices[level] #built again when the level is next drawn
+                    else:
+                        self.level_indices[level].append_item(x,y,x,y)
+                continue
+            count = clusters_count[cluster]
+            clusters_x[cluster] = (clusters_x[cluster]*count+x)/(count+1)
+            clusters_y[cluster] = (clusters_y[cluster]*count+y)/(count+1)
+            clusters_count[cluster] = count+1
+            if count==0 or i<clusters_first[cluster]:
+                clusters_first[cluster] = i
+            if level in self.level_indices:
+                self.level_indices[level].update_item(cluster,clusters_x[cluster],clusters_y[cluster],clusters_x[cluster],clusters_y[cluster])
+        self.num_points += 1
+
+    #remove point i, at (x,y), from the cluster of its cell on every level
+    #a cluster left empty keeps its index with a count of 0 and is not drawn, a cluster keeps the colour of its first point even if that point is removed
+    def remove_point(self,i,x,y,points_x,points_y):
+        column,row = self.get_finest_cell(x,y)
+        for level in range(self.num_levels):
+            cells = self.get_level_cells(level,points_x,points_y)
+            clusters_x,clusters_y,clusters_count,clusters_first = self.levels[level]
+            shift = self.num_levels-1-level
+            cluster = cells[(column>>shift,row>>shift)]
+            count = clusters_count[cluster]
+            clusters_count[cluster] = count-1
+            if count>1: #the centroid of the remaining points
+                clusters_x[cluster] = (clusters_x[cluster]*count-x)/(count-1)
+                clusters_y[cluster] = (clusters_y[cluster]*count-y)/(count-1)
+                if level in self.level_indices:
+                    self.level_indices[level].update_item(cluster,clusters_x[cluster],clusters_y[cluster],clusters_x[cluster],clusters_y[cluster])
+        self.num_points -= 1
+
+    #move point i from (old_x,old_y) to (x,y), updating only the clusters of its old and new cells on every level
+    #call this before the new position is stored in points_x and points_y, as the cells of the clusters may be found from the stored positions
+    #loaded clusters find their cells from the positions of their first points, so once such a point leaves its cell the clusters are not packed again
+    def move_point(self,i,old_x,old_y,x,y,points_x,points_y):
+        self.remove_point(i,old_x,old_y,points_x,points_y)
+        old_column,old_row = self.get_finest_cell(old_x,old_y)
+        column,row = self.get_finest_cell(x,y)
+        for level in range(self.num_levels):
+            shift = self.num_levels-1-level
+            old_cell = (old_column>>shift,old_row>>shift)
+            if old_cell!=(column>>shift,row>>shift) and self.levels[level][3][self.level_cells[level][old_cell]]==i:
+                self.first_moved = True
+                break
+        self.add_point(i,x,y,points_x,points_y)
+
+    #should the clusters be built again before they hold num_points points, which is once the points have doubled since the quadtree extent was chosen
+    #points beyond the extent are clustered in the edge cells, so rebuilding from time to time keeps the clusters even at amortized O(1) cost per point
+    def needs_rebuild(self,num_points):
+        return num_points>2*max(self.num_points_built,8)
+
+    #get the spatial index of the cluster centroids of a level
+    def get_level_index(self,level):
+        if level not in self.level_indices:
+            clusters_x,clusters_y,clusters_count,clusters_first = self.levels[level]
+            self.level_indices[level] = SpatialGrid(clusters_x,clusters_y,clusters_x,clusters_y)
+        return self.level_indices[level]
+
+    #get the clusters as columns which can be saved, see from_packed
+    def pack(self,prefix):
+        columns = {prefix+'_shape':[self.num_points,self.num_levels],prefix+'_extent':[float(self.min_x),float(self.min_y),float(self.size)]}
+        for level,(clusters_x,clusters_y,clusters_count,clusters_first) in enumerate(self.levels):
+            columns[prefix+'_%d_x'%level] = array('d',clusters_x)
+            columns[prefix+'_%d_y'%level] = array('d',clusters_y)
+            columns[prefix+'_%d_count'%level] = array('q',clusters_count)
+            columns[prefix+'_%d_first'%level] = array('q',clusters_first)
+        return columns
+
+    #recreate clusters from columns returned by pack
+    @classmethod
+    def from_packed(cls,columns,prefix):
+        clusters = cls.__new__(cls)
+        clusters.num_points,clusters.num_levels = [int(value) for value in columns[prefix+'_shape']]
+        clusters.min_x,clusters.min_y,clusters.size = [float(value) for value in columns[prefix+'_extent']]
+        clusters.levels = [tuple(columns[prefix+'_%d_%s'%(level,name)] for name in ('x','y','count','first')) for level in range(clusters.num_levels)]
+        clusters.level_indices = {}
+        clusters.level_cells = {}
+        clusters.num_points_built = clusters.num_points
+        clusters.first_moved = False
+        return clusters
+
+    #select the finest level whose cells are still at least min_cell_size pixels across, given the side length of the whole quadtree in screen pixels
+    #returns None when the finest level is already larger than this, in which case individual points should be drawn
+    def select_level(self,extent_pixels,min_cell_size):
+        if extent_pixels<=min_cell_size:
+            return 0
+        level = int(math.log2(extent_pixels/min_cell_size))
+        if level>=self.num_levels:
+            return None
+        return level
+
+
+#pyramid of the summed weight of points in the cells of square grids, used to draw density heatmaps at any zoom without binning every point again, requires numpy
+#the finest level bins the points into a grid of 2^(num_levels-1) cells along each axis covering every point, and each coarser level sums 2x2 blocks of the level below
+#points can be added, moved and removed afterwards by changing the weights of the cells holding them on every level
+class DensityPyramid:
+    def __init__(self,points_x,points_y,weights=None,num_levels=11):
+        self.num_levels = num_levels
+        points_x = np.asarray(points_x,dtype=np.float64)
+        points_y = np.asarray(points_y,dtype=np.float64)
+        self.num_points_built = len(points_x) #number of points when the extent was chosen, see needs_rebuild
+        if len(points_x)==0:
+            self.min_x = self.min_y = 0
+            self.size = 1
+        else: #the grid covers a square extent around all the points
+            self.min_x,self.min_y = float(np.min(points_x)),float(np.min(points_y))
+            self.size = max(float(np.max(points_x))-self.min_x,float(np.max(points_y))-self.min_y) or 1
+        cells_per_axis = 2**(num_levels-1)
+        columns,rows = self.get_finest_cells(points_x,points_y)
+        finest = np.bincount(rows*cells_per_axis+columns,weights=weights,minlength=cells_per_axis*cells_per_axis).astype(np.float64).reshape(cells_per_axis,cells_per_axis)
+        self.levels = [None]*num_levels #weight of each cell of each level, indexed [row,column]
+        self.levels[-1] = finest
+        for level in range(num_levels-2,-1,-1):
+            below = self.levels[level+1]
+            half = below.shape[0]//2
+            self.levels[level] = below.reshape(half,2,half,2).sum(axis=(1,3))
+        self.levels_max = None #largest weight of a cell of each level
+        self.find_levels_max()
+
+    #get the column and row of the cell of the finest level holding each point, points beyond the extent are held by the edge cells
+    def get_finest_cells(self,points_x,points_y):
+        cells_per_axis = 2**(self.num_levels-1)
+        columns = np.clip(((np.asarray(points_x,dtype=np.float64)-self.min_x)/self.size*cells_per_axis).astype(np.int64),0,cells_per_axis-1)
+        rows = np.clip(((np.asarray(points_y,dtype=np.float64)-self.min_y)/self.size*cells_per_axis).astype(np.int64),0,cells_per_axis-1)
+        return columns,rows
+
+    #find the largest weight of a cell of each level
+    def find_levels_max(self):
+        self.levels_max = [float(np.max(weights)) if weights.size>0 else 0.0 for weights in self.levels]
+
+    #add the weights of points to the cells holding them on every level, negative weights take points away
+    #moving a point takes its weight away at its old position and adds it at its new one, so this takes time proportional to the number of points and levels
+    def add_points(self,points_x,points_y,weights):
+        columns,rows = self.get_finest_cells(points_x,points_y)
+        for level in range(self.num_levels-1,-1,-1):
+            np.add.at(self.levels[level],(rows,columns),weights)
+            columns = columns>>1 #the cell holding the point on the next coarsest level
+            rows = rows>>1
+        self.find_levels_max()
+
+    #should the pyramid be built again before it holds num_points points, which is once the points have doubled since the extent was chosen
+    #points beyond the extent are held by the edge cells, so rebuilding from time to time keeps the cells even at amortized O(1) cost per point
+    def needs_rebuild(self,num_points):
+        return num_points>2*max(self.num_points_built,8)
+
+    #get the side length of the cells of a level
+    def get_cell_size(self,level):
+        return self.size/2**level
+
+    #select the finest level whose cells are at least min_cell_size across, None if even the finest cells are smaller
+    def get_level(self,min_cell_size):
+        if min_cell_size>self.size:
+            return 0
+        level = int(math.floor(math.log2(self.size/min_cell_size)))
+        if level>=self.num_levels:
+            return None
+        return level
+
+    #get the weights of the cells of a level in a block of rows and columns, cells beyond the grid are empty
+    def get_window(self,level,column_start,row_start,num_columns,num_rows):
+        weights = self.levels[level]
+        cells_per_axis = weights.shape[0]
+        window = np.zeros((num_rows,num_columns))
+        #the part of the block inside the grid
+        column_from,column_to = max(column_start,0),min(column_start+num_columns,cells_per_axis)
+        row_from,row_to = max(row_start,0),min(row_start+num_rows,cells_per_axis)
+        if column_from<column_to and row_from<row_to:
+            window[row_from-row_start:row_to-row_start,column_from-column_start:column_to-column_start] = weights[row_from:row_to,column_from:column_to]
+        return window
+
+
+#blur a grid of weights with a gaussian kernel of a radius in cells, as two passes along the rows and columns each made of a few whole array additions
+#cells beyond the grid count as empty
+def blur_grid(weights,radius):
+    if radius<=0:
+        return weights
+    offsets = np.arange(-radius,radius+1)
+    kernel = np.exp(-offsets**2/(2*(radius/2)**2))
+    kernel = kernel/kernel.sum()
+    for axis in (0,1):
+        padded = np.pad(weights,[(radius,radius) if axis==i else (0,0) for i in (0,1)])
+        length = weights.shape[axis]
+        blurred = np.zeros(weights.shape)
+        for j,factor in enumerate(kernel):
+            blurred += factor*(padded[j:j+length] if axis==0 else padded[:,j:j+length])
+        weights = blurred
+    return weights
+
+
+#group points into the cells of a square grid, returning the number, coordinate sums and first point of each cell keyed by (column,row)
+def bin_points(points_x,points_y,min_x,min_y,size,cells_per_axis):
+    cells = {}
+    if np is not None and not isinstance(points_x,list): #do the binning on whole arrays at once
+        points_x = np.asarray(points_x,dtype=np.float64)
+        points_y = np.asarray(points_y,dtype=np.float64)
+        columns = np.clip(((points_x-min_x)/size*cells_per_axis).astype(np.int64),0,cells_per_axis-1)
+        rows = np.clip(((points_y-min_y)/size*cells_per_axis).astype(np.int64),0,cells_per_axis-1)
+        keys,first,inverse = np.unique(rows*cells_per_axis+columns,return_index=True,return_inverse=True)
+        counts = np.bincount(inverse)
+        sums_x = np.bincount(inverse,weights=points_x)
+        sums_y = np.bincount(inverse,weights=points_y)
+        for key,count,sum_x,sum_y,first_point in zip(keys.tolist(),counts.tolist(),sums_x.tolist(),sums_y.tolist(),first.tolist()):
+            cells[(key%cells_per_axis,key//cells_per_axis)] = (count,sum_x,sum_y,first_point)
+        return cells
+    for i in range(len(points_x)):
+        x = points_x[i]
+        y = points_y[i]
+        column = min(max(int((x-min_x)/size*cells_per_axis),0),cells_per_axis-1)
+        row = min(max(int((y-min_y)/size*cells_per_axis),0),cells_per_axis-1)
+        cell = cells.get((column,row))
+        if cell is None:
+            cells[(column,row)] = (1,x,y,i)
+        else:
+            cells[(column,row)] = (cell[0]+1,cell[1]+x,cell[2]+y,cell[3])
+    return cells
+
+
+#calculate how important each point of a polyline is to its shape using the Douglas-Peucker algorithm
+#the importance of a point is the largest tolerance at which Douglas-Peucker simplification still keeps it, so simplifying to any
+#tolerance is the same as keeping the points whose importance is greater than that tolerance. The end points are always kept
+def douglas_peucker_importance(points_x,points_y):
+    num_points = len(points_x)
+    importance = [0.0]*num_points
+    if num_points==0:
+        return importance
+    importance[0] = math.inf
+    importance[-1] = math.inf
+    use_arrays = np is not None and not isinstance(points_x,list)
+    if use_arrays: #short spans are faster to measure one point at a time, which is much faster on lists than arrays
+        list_x = points_x.tolist()
+        list_y = points_y.tolist()
+    else:
+        list_x = points_x
+        list_y = points_y
+    stack = [(0,num_points-1,math.inf)] #spans of points still to split, with the importance of the point which created them
+    while stack:
+        start,end,parent_importance = stack.pop()
+        if end-start<2: #no points between the ends of this span
+            continue
+        start_x = list_x[start]
+        start_y = list_y[start]
+        delta_x = list_x[end]-start_x
+        delta_y = list_y[end]-start_y
+        length = math.hypot(delta_x,delta_y)
+        if use_arrays and end-start>64: #measure the distance of every point in a long span from the chord at once
+            between_x = points_x[start+1:end]-start_x
+            between_y = points_y[start+1:end]-start_y
+            if length>0:
+                distances = np.abs(between_x*delta_y-between_y*delta_x)/length
+            else:
+                distances = np.hypot(between_x,between_y)
+            furthest = int(np.argmax(distances))
+            distance = float(distances[furthest])
+            furthest = furthest+start+1
+        else:
+            distance = -1
+            furthest = start+1
+            for j in range(start+1,end):
+                between_x = list_x[j]-start_x
+                between_y = list_y[j]-start_y
+                if length>0:
+                    point_distance = abs(between_x*delta_y-between_y*delta_x)/length #distance from the chord between the ends
+                else:
+                    point_distance = math.hypot(between_x,between_y) #the ends are the same point
+                if point_distance>distance:
+                    distance = point_distance
+                    furthest = j
+        point_importance = min(distance,parent_importance) #a point can not be kept once the point that split its span is dropped
+        importance[furthest] = point_importance
+        stack.append((start,furthest,point_importance))
+        stack.append((furthest,end,point_importance))
+    return importance
+
+
+#parts of the preprocessing of objects which can run in worker processes, each works on a range of objects and returns compact arrays
+#they are module level functions so they can be sent to the workers, and must not use tk
+
+#get the cells of a grid covered by a range of bounding boxes, layout is SpatialGrid.get_layout() and first_item is the index of the first box
+#returns the cell key (column*num_rows+row) and item of each cell covered, and the items covering too many cells to store in each one
+def grid_cell_entries(layout,boxes_min_x,boxes_min_y,boxes_max_x,boxes_max_y,first_item):
+    origin_x,origin_y,cell_width,cell_height,num_columns,num_rows,max_cells_per_item = layout
+    keys = array('q')
+    items = array('q')
+    large_items = array('q')
+    for i in range(len(boxes_min_x)):
+        column_start = min(max(int((boxes_min_x[i]-origin_x)/cell_width),0),num_columns-1)
+        column_end = min(max(int((boxes_max_x[i]-origin_x)/cell_width),0),num_columns-1)
+        row_start = min(max(int((boxes_min_y[i]-origin_y)/cell_height),0),num_rows-1)
+        row_end = min(max(int((boxes_max_y[i]-origin_y)/cell_height),0),num_rows-1)
+        if (column_end-column_start+1)*(row_end-row_start+1)>max_cells_per_item:
+            large_items.append(first_item+i)
+            continue
+        for column in range(column_start,column_end+1):
+            for row in range(row_start,row_end+1):
+                keys.append(column*num_rows+row)
+                items.append(first_item+i)
+    return keys,items,large_items
+
+#bin a range of points into the cells of a square grid, see bin_points, first_point is the index of the first point
+#returns the cell key (row*cells_per_axis+column), number of points, coordinate sums and first point of each cell
+def bin_points_entries(points_x,points_y,first_point,min_x,min_y,size,cells_per_axis):
+    cells = bin_points(points_x,points_y,min_x,min_y,size,cells_per_axis)
+    keys = array('q',[row*cells_per_axis+column for column,row in cells])
+    counts = array('q',[cell[0] for cell in cells.values()])
+    sums_x = array('d',[cell[1] for cell in cells.values()])
+    sums_y = array('d',[cell[2] for cell in cells.values()])
+    first = array('q',[first_point+cell[3] for cell in cells.values()])
+    return keys,counts,sums_x,sums_y,first
+
+#merge the cells binned from consecutive ranges of points by bin_points_entries, returning the same cells as bin_points would for all the points
+def merge_binned_points(parts,cells_per_axis):
+    cells = {}
+    for keys,counts,sums_x,sums_y,first in parts:
+        for key,count,sum_x,sum_y,first_point in zip(keys,counts,sums_x,sums_y,first):
+            column_row = (key%cells_per_axis,key//cells_per_axis)
+            cell = cells.get(column_row)
+            if cell is None:
+                cells[column_row] = (count,sum_x,sum_y,first_point)
+            else: #earlier ranges hold the earlier points, so the first point is already known
+                cells[column_row] = (cell[0]+count,cell[1]+sum_x,cell[2]+sum_y,cell[3])
+    return cells
+
+#calculate the importance of each point of a range of polylines, see douglas_peucker_importance
+#returns the importances of every line one after another, with the offset of each line's first point
+def douglas_peucker_importance_entries(lines_x,lines_y):
+    importance = array('d')
+    offsets = array('q',[0])
+    for points_x,points_y in zip(lines_x,lines_y):
+        importance.extend(douglas_peucker_importance(points_x,points_y))
+        offsets.append(len(importance))
+    return importance,offsets
+
+
+#collects timings and canvas call counts of each redraw of the map
+#functions are wrapped only while instrumentation is enabled, so there is no cost when it is disabled
+#times are in milliseconds, the time of a stage excludes time spent in other timed functions it calls
+class RenderStats:
+    histogram_bounds = (1,2,4,8,16,33,66,133) #upper bounds of the frame time histogram bins, milliseconds, slower frames fall in a final bin
+
+    def __init__(self,history=300):
+        self.frame_times = deque(maxlen=history) #total time of the most recent frames
+        self.num_frames = 0 #number of frames recorded since the stats were created
+        self.in_frame = False #is a frame being recorded
+        self.stage_times = {} #time spent in each stage during the current frame
+        self.call_counts = {} #number of calls of each counted function during the current frame
+        self.nested_time = 0.0 #time spent in timed functions called by the function currently being timed, seconds
+        self.last_frame = None #summary of the most recent frame
+
+    #wrap a function so the time spent in it is added to a stage, and optionally each call is counted
+    def timed(self,stage,function,count_name=None):
+        def timed_function(*args,**kwargs):
+            outer_nested_time = self.nested_time
+            self.nested_time = 0.0
+            start = time.perf_counter()
+            try:
+                return function(*args,**kwargs)
+            finally:
+                elapsed = time.perf_counter()-start
+                self.stage_times[stage] = self.stage_times.get(stage,0.0)+elapsed-self.nested_time
+                self.nested_time = outer_nested_time+elapsed
+                if count_name is not None:
+                    self.call_counts[count_name] = self.call_counts.get(count_name,0)+1
+        return timed_function
+
+    #wrap a function so each outermost call is recorded as a frame, end_callback is called with the stats after each frame
+    def framed(self,function,end_callback):
+        def framed_function(*args,**kwargs):
+            if self.in_frame: #already inside a frame, this call is part of it
+                return function(*args,**kwargs)
+            self.in_frame = True
+            self.stage_times = {}
+            self.call_counts = {}
+            self.nested_time = 0.0
+            start = time.perf_counter()
+            try:
+                return function(*args,**kwargs)
+            finally:
+                total = time.perf_counter()-start
+                self.in_frame = False
+                self.end_frame(total)
+                end_callback(self)
+        return framed_function
+
+    #store the timings of the frame which has just finished
+    def end_frame(self,total):
+        stages = {stage:elapsed*1000 for stage,elapsed in self.stage_times.items()}
+        stages['other'] = max(total*1000-sum(stages.values()),0.0) #python logic not in any timed stage
+        self.last_frame = {'total':total*1000,'stages':stages,'calls':dict(self.call_counts)}
+        self.frame_times.append(total*1000)
+        self.num_frames += 1
+
+    #count the recent frames falling in each bin of the histogram, as a list of (upper bound, count) with None as the bound of the final bin
+    def get_histogram(self):
+        counts = [0]*(len(self.histogram_bounds)+1)
+        for frame_time in self.frame_times:
+            bin = 0
+            while bin<len(self.histogram_bounds) and frame_time>self.histogram_bounds[bin]:
+                bin += 1
+            counts[bin] += 1
+        return list(zip(self.histogram_bounds+(None,),counts))
+
+    #summarise the recent frames
+    def get_summary(self):
+        recent = sorted(self.frame_times)
+        summary = {'frames':self.num_frames,'last_frame':self.last_frame,'histogram':self.get_histogram()}
+        if len(recent)>0:
+            summary['mean_frame_time'] = sum(recent)/len(recent)
+            summary['p95_frame_time'] = recent[min(int(len(recent)*0.95),len(recent)-1)]
+            summary['max_frame_time'] = recent[-1]
+        return summary
+
+
+#bounded thread-safe store of pending attribute updates, filled by producer threads and drained by the tk main loop
+#updates are merged per object, so only the latest values pushed for each object are applied (last write wins)
+class UpdateQueue:
+    def __init__(self,max_pending=100000):
+        self.max_pending = max_pending #most objects which can have pending updates at once
+        self.pending = {} #name of the update -> {object index: values}
+        self.num_pending = 0 #number of objects with pending updates, summed over the updates
+        self.condition = threading.Condition() #guards the pending updates and wakes producers waiting for space
+
+    #add updates for a batch of objects, values holds one sequence per argument of the update each with one entry per object
+    #if the queue is full, waits until it is drained if block is True (up to timeout seconds), returns False if the updates could not be added
+    def push(self,update,indices,values,block=True,timeout=None):
+        with self.condition:
+            updates = self.pending.setdefault(update,{})
+            new_objects = sum(1 for i in set(indices) if i not in updates) #objects with pending updates are only overwritten
+            if self.num_pending+new_objects>self.max_pending:
+                if block==False or not self.condition.wait_for(lambda:self.num_pending+new_objects<=self.max_pending or self.num_pending==0,timeout):
+                    return False
+                updates = self.pending.setdefault(update,{}) #the queue has been drained while waiting
+                new_objects = sum(1 for i in set(indices) if i not in updates)
+            for j,i in enumerate(indices):
+                updates[i] = tuple(value[j] for value in values)
+            self.num_pending += new_objects
+            return True
+
+    #remove and return all pending updates
+    def take_all(self):
+        with self.condition:
+            pending = self.pending
+            self.pending = {}
+            self.num_pending = 0
+            self.condition.notify_all() #producers waiting for space can continue
+        return pending
+
+
+#least recently used cache of raster tile images, bounded by the memory their pixels use
+class TileCache:
+    def __init__(self,memory_budget=64*1024*1024):
+        self.memory_budget = memory_budget #most bytes of tile pixels kept, least recently used tiles are removed beyond this
+        self.memory_used = 0 #bytes of tile pixels currently kept
+        self.tiles = OrderedDict() #key -> image, ordered from least to most recently used
+
+    #get the image of a tile, or None if it is not cached
+    def get(self,key):
+        image = self.tiles.get(key)
+        if image is not None:
+            self.tiles.move_to_end(key) #the tile is now the most recently used
+        return image
+
+    #add the image of a tile, removing the least recently used tiles if the memory budget is exceeded
+    def put(self,key,image):
+        if key in self.tiles:
+            self.memory_used -= self.get_image_memory(self.tiles.pop(key))
+        self.tiles[key] = image
+        self.memory_used += self.get_image_memory(image)
+        while self.memory_used>self.memory_budget and len(self.tiles)>1:
+            key,removed = self.tiles.popitem(last=False)
+            self.memory_used -= self.get_image_memory(removed)
+
+    #remove every tile
+    def clear(self):
+        self.tiles = OrderedDict()
+        self.memory_used = 0
+
+    #bytes used by the pixels of an image
+    def get_image_memory(self,image):
+        return image.width*image.height*len(image.getbands())
+
+
+#convert longitude and latitude (degrees) to fractional slippy map (web mercator) tile coordinates at a zoom level, and back
+def longitude_to_tile_x(longitude,zoom):
+    return (longitude+180)/360*2**zoom
+
+def latitude_to_tile_y(latitude,zoom):
+    latitude = max(min(latitude,85.0511287798),-85.0511287798) #web mercator does not reach the poles
+    return (1-math.asinh(math.tan(math.radians(latitude)))/math.pi)/2*2**zoom
+
+def tile_x_to_longitude(tile_x,zoom):
+    return tile_x/2**zoom*360-180
+
+def tile_y_to_latitude(tile_y,zoom):
+    return math.degrees(math.atan(math.sinh(math.pi*(1-2*tile_y/2**zoom))))
+
+
+#reads slippy map tile images from a directory ({z}/{x}/{y}.png by default) or an MBTiles (sqlite) file
+#reading is thread safe, each thread opens its own connection to an MBTiles file
+class BasemapTiles:
+    def __init__(self,path,tile_template='{z}/{x}/{y}.png',min_zoom=None,max_zoom=None):
+        self.path = path
+        self.tile_template = tile_template #path of each tile within the directory
+        self.is_mbtiles = os.path.isfile(path) #a directory of tiles, or a single MBTiles file
+        self.connections = threading.local() #sqlite connection of each thread
+        self.min_zoom = 0
+        self.max_zoom = 19
+        if self.is_mbtiles: #the file records which zoom levels it holds
+            metadata = dict(self.get_connection().execute("SELECT name,value FROM metadata").fetchall())
+            self.min_zoom = int(metadata.get('minzoom',self.min_zoom))
+            self.max_zoom = int(metadata.get('maxzoom',self.max_zoom))
+        if min_zoom is not None:
+            self.min_zoom = min_zoom
+        if max_zoom is not None:
+            self.max_zoom = max_zoom
+
+    #get the connection of the current thread to the MBTiles file
+    def get_connection(self):
+        connection = getattr(self.connections,'connection',None)
+        if connection is None:
+            connection = sqlite3.connect('file:'+self.path+'?mode=ro',uri=True)
+            self.connections.connection = connection
+        return connection
+
+    #read the encoded image of a tile, None if there is no such tile
+    def read_tile(self,zoom,x,y):
+        if self.is_mbtiles:
+            row = self.get_connection().execute("SELECT tile_data FROM tiles WHERE zoom_level=? AND tile_column=? AND tile_row=?",(zoom,x,2**zoom-1-y)).fetchone() #MBTiles rows count up from the south
+            return None if row is None else row[0]
+        tile_path = os.path.join(self.path,self.tile_template.format(z=zoom,x=x,y=y))
+        if not os.path.isfile(tile_path):
+            return None
+        with open(tile_path,'rb') as file:
+            return file.read()
+
+    #read and decode a tile, None if there is no such tile
+    def load_tile(self,zoom,x,y):
+        data = self.read_tile(zoom,x,y)
+        if data is None:
+            return None
+        image = Image.open(io.BytesIO(data))
+        return image.convert('RGBA')
+
+
+#distance from a point to the line segment between two points
+def point_segment_distance(x,y,start_x,start_y,end_x,end_y):
+    delta_x = end_x-start_x
+    delta_y = end_y-start_y
+    length_squared = delta_x*delta_x+delta_y*delta_y
+    if length_squared==0: #the segment is a single point
+        return math.hypot(x-start_x,y-start_y)
+    fraction = max(0,min(1,((x-start_x)*delta_x+(y-start_y)*delta_y)/length_squared)) #position of the closest point along the segment
+    return math.hypot(x-start_x-fraction*delta_x,y-start_y-fraction*delta_y)
+
+
+#small overview of the whole of a map in its own canvas, with a rectangle marking the part of the map in view
+#the overview has its own view transform but reads the objects of the map it belongs to rather than copying them. It is drawn from a coarse summary
+#of the objects: nodes and pie nodes are merged into the overview cells they fall in, and lines and the segments of compound lines into the pairs
+#of cells their ends fall in, so objects close together share a canvas item and a dense map does not need an item for every object
+#the summary is drawn again at most every refresh_interval milliseconds when the objects change, following the view of the map only moves the rectangle
+#for a full second view of the same objects, such as a comparison map beside the main map, create a ZoomMap sharing the model of the map instead
+class OverviewMap:
+    def __init__(self,zoom_map,width,height,window,background='white',cell_size=3,rectangle_colour='red',refresh_interval=1000,navigate=True):
+        self.zoom_map = zoom_map #map whose objects and view are shown
+        self.width = width #width of the overview in pixels
+        self.height = height #height of the overview in pixels
+        self.cell_size = cell_size #side length (in overview pixels) of the cells objects are merged into
+        self.rectangle_colour = rectangle_colour #colour of the rectangle marking the part of the map in view
+        self.refresh_interval = refresh_interval #shortest time between redrawing the summary of changed objects, milliseconds
+        self.view = ViewTransform() #maps the unzoomed pixel coordinates of the map to the overview, set when the summary is drawn
+        self.summary_generation = None #objects generation of the map when the summary was drawn, None if it has not been drawn
+        self.summary_scheduled = None #id of the pending tk callback which will draw the summary again
+        self.rectangle_id = None #canvas id of the rectangle marking the part of the map in view
+        self.summary_tag = 'zoom_map_overview_summary'
+        self.map = tk.Canvas(window,bg=background,width=width,height=height,highlightthickness=1)
+        if navigate: #clicking or dragging on the overview centres the map on that point
+            self.map.bind('<ButtonPress-1>',self.navigate)
+            self.map.bind('<B1-Motion>',self.navigate)
+
+    #fit the unzoomed map into the overview, keeping its shape
+    def fit_view(self):
+        zoom_map = self.zoom_map
+        zoom = min(self.width/zoom_map.map_width,self.height/zoom_map.map_height)
+        self.view = ViewTransform(zoom,(self.width-zoom_map.map_width*zoom)/2,(self.height-zoom_map.map_height*zoom)/2)
+
+    #bring the overview up to date, called by the map after each redraw
+    #the rectangle follows the view straight away, while changed objects are summarised again once refresh_interval has passed since the last summary
+    def update(self):
+        zoom_map = self.zoom_map
+        if not zoom_map.pixels_per_unit_calculated():
+            return
+        if self.summary_generation is None:
+            self.render_summary()
+        elif self.summary_generation!=zoom_map.objects_generation and self.summary_scheduled is None:
+            self.summary_scheduled = self.map.after(self.refresh_interval,self.render_summary)
+        self.render_rectangle()
+
+    #move the rectangle to the part of the map in view
+    def render_rectangle(self):
+        zoom_map = self.zoom_map
+        left,top = self.view.apply(*zoom_map.view.invert(0,0))
+        right,bottom = self.view.apply(*zoom_map.view.invert(zoom_map.map_width,zoom_map.map_height))
+        if self.rectangle_id is None:
+            self.rectangle_id = self.map.create_rectangle(left,top,right,bottom,outline=self.rectangle_colour,width=2)
+        else:
+            self.map.coords(self.rectangle_id,left,top,right,bottom)
+
+    #draw the summary of the objects of the map in place of the previous one
+    def render_summary(self):
+        self.summary_scheduled = None
+        zoom_map = self.zoom_map
+        self.summary_generation = zoom_map.objects_generation
+        self.fit_view()
+        self.map.delete(self.summary_tag)
+        cell = self.cell_size/self.view.zoom #side length of the cells in unzoomed pixels
+        segments = {} #(start column, start row, end column, end row) -> colour of the first line or segment between the cells
+        if zoom_map.lines_assigned_flag and zoom_map.pixel_coordinates_calculated(zoom_map.lines_start_x,zoom_map.num_lines):
+            live = self.get_live_indices(zoom_map.num_lines,zoom_map.lines_removed)
+            for j,key in self.get_first_in_cells(live,cell,zoom_map.lines_start_x,zoom_map.lines_start_y,zoom_map.lines_end_x,zoom_map.lines_end_y):
+                segments.setdefault(key,zoom_map.lines_colour[j])
+        if zoom_map.compound_lines_assigned_flag and zoom_map.pixel_coordinates_calculated(zoom_map.compound_line_points_x,zoom_map.num_compound_lines):
+            band = zoom_map.get_compound_lines_band(self.view.zoom) #only the detail which can be seen in the overview
+            for i in range(zoom_map.num_compound_lines):
+                if i in zoom_map.compound_lines_removed:
+                    continue
+                points = zoom_map.get_compound_line_band_points(i,band)
+                cells = [(int(points[j]//cell),int(points[j+1]//cell)) for j in range(0,len(points),2)]
+                for start,end in zip(cells[:-1],cells[1:]):
+                    if start!=end:
+                        segments.setdefault(min(start,end)+max(start,end),zoom_map.compound_lines_colour[i])
+        for (start_column,start_row,end_column,end_row),colour in segments.items():
+            self.map.create_line(self.get_cell_centre(start_column,start_row,cell)+self.get_cell_centre(end_column,end_row,cell),fill=colour,tags=self.summary_tag)
+        for pixel_x,pixel_y,num_objects,removed,colours in ((zoom_map.nodes_x,zoom_map.nodes_y,zoom_map.num_nodes,zoom_map.nodes_removed,zoom_map.nodes_colours),
+                                                             (zoom_map.pie_nodes_x,zoom_map.pie_nodes_y,zoom_map.num_pie_nodes,zoom_map.pie_nodes_removed,zoom_map.pie_nodes_colours)):
+            if not zoom_map.pixel_coordinates_calculated(pixel_x,num_objects):
+                continue
+            live = self.get_live_indices(num_objects,removed)
+            for i,(column,row) in self.get_first_in_cells(live,cell,pixel_x,pixel_y):
+                colour = colours[i] if isinstance(colours[i],str) else colours[i][0] #pie nodes take the colour of their first slice
+                left,top = self.view.apply(column*cell,row*cell)
+                self.map.create_rectangle(left,top,left+self.cell_size,top+self.cell_size,fill=colour,outline='',tags=self.summary_tag)
+        if self.rectangle_id is not None:
+            self.map.tag_raise(self.rectangle_id)
+
+    #get the indices of the objects of a type which have not been removed
+    def get_live_indices(self,num_objects,removed):
+        if self.zoom_map.storage_mode=='array':
+            return self.zoom_map.get_live_storage(np.arange(num_objects),removed)
+        return [i for i in range(num_objects) if i not in removed]
+
+    #merge objects by the cells their positions fall in, given one or more pairs of unzoomed pixel coordinates of each object
+    #returns (index, cells) of the first live object in each distinct combination of cells, combinations of a single repeated cell are dropped
+    #when more than one position is given, as a line within one cell is too short to see
+    def get_first_in_cells(self,live,cell,*positions):
+        if len(live)==0:
+            return []
+        if not isinstance(live,list): #merge the objects on whole arrays at once
+            columns = [np.floor(np.asarray(values)[live]/cell).astype(np.int64) for values in positions]
+            keys = np.stack(columns,axis=1)
+            if len(positions)==4: #lines are merged whichever way round they run
+                forward = (keys[:,0]<keys[:,2])|((keys[:,0]==keys[:,2])&(keys[:,1]<=keys[:,3]))
+                keys = np.where(forward[:,None],keys,keys[:,[2,3,0,1]])
+                visible = (keys[:,0]!=keys[:,2])|(keys[:,1]!=keys[:,3])
+                keys = keys[visible]
+                live = live[visible]
+            keys,first = np.unique(keys,axis=0,return_index=True)
+            return zip(live[first].tolist(),[tuple(key) for key in keys.tolist()])
+        first = {}
+        for i in live:
+            key = tuple(int(values[i]//cell) for values in positions)
+            if len(key)==4:
+                if key[:2]==key[2:]:
+                    continue
+                key = min(key[:2],key[2:])+max(key[:2],key[2:])
+            first.setdefault(key,i)
+        return [(i,key) for key,i in first.items()]
+
+    #get the overview position of the centre of a cell
+    def get_cell_centre(self,column,row,cell):
+        return self.view.apply((column+0.5)*cell,(row+0.5)*cell)
+
+    #centre the map on the point of the overview under the mouse
+    def navigate(self,event):
+        zoom_map = self.zoom_map
+        if not zoom_map.pixels_per_unit_calculated():
+            return
+        zoom_map.stop_animation()
+        x,y = zoom_map.view.apply(*self.view.invert(event.x,event.y)) #current screen position on the map of the point
+        zoom_map.view.pan(zoom_map.map_center_x-x,zoom_map.map_center_y-y)
+        zoom_map.schedule_render()
+
+
+#group values by an index from 0 to num_groups-1, in compressed sparse row form
+#returns offsets and grouped values, the values of group g being grouped[offsets[g]:offsets[g+1]] in their original order
+#this is a counting sort, so takes time proportional to the number of values and groups
+def group_by_index(indices,values,num_groups,use_arrays=False):
+    if use_arrays:
+        indices = np.asarray(indices,dtype=np.intp)
+        offsets = np.zeros(num_groups+1,dtype=np.intp)
+        np.cumsum(np.bincount(indices,minlength=num_groups),out=offsets[1:])
+        return offsets,np.asarray(values,dtype=np.intp)[np.argsort(indices,kind='stable')]
+    offsets = [0]*(num_groups+1)
+    for index in indices:
+        offsets[index+1] += 1
+    for group in range(num_groups): #the running total of the counts gives the start of each group
+        offsets[group+1] += offsets[group]
+    position = offsets[:-1] #next free place in each group
+    grouped = [0]*len(values)
+    for index,value in zip(indices,values):
+        grouped[position[index]] = value
+        position[index] += 1
+    return offsets,grouped
+
+
+#the objects of a map and everything derived from them: their storage, the scale converting their coordinates to pixels, their spatial indices,
+#clusters and simplification pyramids, and the incidence of nodes and lines
+#one model can back several maps, such as a main map with a second map beside it comparing another part or zoom of the same objects: maps created
+#with model=other_map.model share its objects rather than copying them. Objects created, appended, updated or removed through any of the maps are
+#drawn by every one of them on its next render, while each map keeps its own canvas, view, canvas items, labels, groups, raster tiles and heatmap
+#the attributes of the model are reached through each of its maps as if they were the map's own, see the properties added to ZoomMap after it
+class MapModel:
+    def __init__(self):
+        self.views = [] #maps drawing the objects, each brings its canvas items up to date when the objects change
+        #how the objects are stored and prepared, set by the map which creates the model, see ZoomMap
+        self.storage_mode = 'list' #how are coordinates and other numeric object properties stored
+        self.projection = projections['equirectangular']() #how global coordinates are flattened before being scaled to pixels
+        self.level_of_detail = False #are the nodes and pie nodes clustered, so they can be drawn as single markers when zoomed out
+        self.simplify_tolerance = 0.5 #largest change (in pixels) allowed when simplifying compound lines for display
+        self.simplify_bands = 24 #number of levels in the compound line simplification pyramid
+        self.precompute_workers = 0 #number of processes building spatial indices, clusters and simplification pyramids
+        self.precompute_part_size = 50000 #number of objects in each part of the preprocessing sent to a worker
+        self.precompute_pool = None #processes doing the preprocessing, created when first needed
+        self.progress_callback = None #function called with the stage, number of parts done and total number of parts as preprocessing runs
+        self.storage_buffers = weakref.WeakValueDictionary() #id -> buffer of each array in numeric storage which can grow in place, see ZoomMap.append_storage
+        self.storage_buffers_used = {} #id -> number of values in use of each buffer
+        #scale, found by determine_scale
+        self.pixels_per_unit = None #unzoomed pixels per unit of projected coordinates, None until the scale has been determined
+        self.start_x = None #global coordinates of the upper left corner of the unzoomed map
+        self.start_y = None
+        self.projected_start_x = None #projected coordinates of the upper left corner of the unzoomed map
+        self.projected_start_y = None
+        self.objects_generation = 0 #increases whenever the objects or their pixel coordinates change, so overviews know to summarise them again
+        self.nodes_pixels_generation = 0 #increases whenever the pixel coordinates of every node are replaced, so heatmap pyramids are built again
+        self.init_objects()
+
+    #create empty containers to store objects in
+    def init_objects(self):
+        self.init_nodes() #containers to store nodes
+        self.init_pie_nodes() #containers to store pie nodes
+        self.init_lines() #containers to store lines
+        self.init_compound_lines() #containers to store compound lines
+
+    #create containers to store nodes
+    def init_nodes(self):
+        #nodes, these are filled circles created using the tk oval object
+        self.num_nodes = 0 #number of nodes stored
+        self.node_info_type = 'none' #type of info stored
+        self.node_info_name = 'none' #name of info stored
+        #arrays of node properties
+        self.nodes_x_coords = [] #horizontal position in global coordinates of the centre of the node
+        self.nodes_y_coords = [] #vertical position in global coordinates of the centre of the node
+        self.nodes_x = [] #horizontal position in unzoomed pixel coordinates of the centre of the node
+        self.nodes_y = [] #vertical position in unzoomed pixel coordinates of the centre of the node
+        self.nodes_x_projected = [] #horizontal position in projected space of the centre of the node, calculated once when the nodes are assigned
+        self.nodes_y_projected = [] #vertical position in projected space of the centre of the node
+        self.nodes_radii = []  #radius of the node, pixels
+        self.nodes_colours = [] #colour of the nodes
+        self.nodes_names = [] #name of the each node
+        self.nodes_info = [] #additional info about each node
+        self.nodes_index = None #spatial index of the nodes in global coordinates
+        self.nodes_max_radius = 0 #largest radius of any node, pixels
+        self.nodes_clusters = None #hierarchical clusters of the nodes, used for level of detail rendering
+        #flags
+        self.nodes_assigned_flag = False #have nodes been stored yet
+        self.nodes_removed = set() #indices of removed nodes, indices are never reused so the other nodes keep theirs
+        self.nodes_bounding_box = None #extremes (north, south, east, west) of the nodes in global coordinates, None until needed
+
+    #create containers to store pie chart nodes
+    def init_pie_nodes(self):
+        #pie nodes, these are filled circles representing a pie chart, created using tk arc objects
+        self.num_pie_nodes = 0 #number of pie nodes stored
+        self.pie_node_info_type = 'none' #type of info stored
+        self.pie_node_info_name = 'none' #name of info stored
+        self.pie_node_info_subtypes_names = [] #list of all types of info displayed, in order
+        #arrays of pie_node properties
+        self.pie_nodes_x_coords = [] #horizontal position in global coordinates of the centre of the pie node
+        self.pie_nodes_y_coords = [] #vertical position in global coordinates of the centre of the pie node
+        self.pie_nodes_x = [] #horizontal position in unzoomed pixel coordinates of the centre of the pie node
+        self.pie_nodes_y = [] #vertical position in unzoomed pixel coordinates of the centre of the pie node
+        self.pie_nodes_x_projected = [] #horizontal position in projected space of the centre of the pie node, calculated once when the pie nodes are assigned
+        self.pie_nodes_y_projected = [] #vertical position in projected space of the centre of the pie node
+        self.pie_nodes_radii = []  #radius of the pie_node, pixels
+        self.pie_nodes_colours = [] #colour of the pie_nodes, list of lists
+        self.pie_nodes_colours_lengths = [] #length of each of the pie_nodes colour section, list of lists
+        self.pie_nodes_names = [] #name of the each node
+        self.pie_node_infos = [] #additional info about each pie_node, list of lists with one subentry for each pie slice
+        self.pie_nodes_slice_starts = [] #start angle of each slice of each pie node in degrees, list of lists calculated from the colour lengths
+        self.pie_nodes_slice_extents = [] #angle covered by each slice of each pie node in degrees, list of lists
+        self.pie_nodes_index = None #spatial index of the pie nodes in global coordinates
+        self.pie_nodes_max_radius = 0 #largest radius of any pie node, pixels
+        self.pie_nodes_clusters = None #hierarchical clusters of the pie nodes, used for level of detail rendering
+        #flags
+        self.pie_nodes_assigned_flag = False #have pie nodes been stored yet
+        self.pie_nodes_removed = set() #indices of removed pie nodes, indices are never reused so the other pie nodes keep theirs
+        self.pie_nodes_bounding_box = None #extremes (north, south, east, west) of the pie nodes in global coordinates, None until needed
+
+    #create containers to store lines
+    def init_lines(self):
+        #lines, these are well, lines
+        self.num_lines = 0 #number of lines stored
+        self.line_info_name = 'none' #name of the info stored with the lines
+        self.line_info_type = 'none' #type of the info stored with the lines
+        #arrays of line properties
+        #relating to nodes
+        self.lines_start_node_type = [] #what type of node is at the start of the line (valid are 'none','node' and 'pie')
+        self.lines_start_node_index = [] #index of the starting node, if it exists
+        self.lines_end_node_type = [] #what type of node is at the end of the line (valid are 'none','node' and 'pie')
+        self.lines_end_node_index= [] #index of the ending node, if it exists
+        #incidence of nodes and lines, in compressed sparse row form, so the lines attached to a node can be found without searching every line
+        #the line ends attached to node i are nodes_lines_ends[nodes_lines_offsets[i]:nodes_lines_offsets[i+1]], each stored as 2*line index, plus 1 for the end of the line
+        self.nodes_lines_offsets = [] #start of each node's line ends in nodes_lines_ends, with one extra entry marking the end of the last node's
+        self.nodes_lines_ends = [] #line ends attached to nodes, grouped by node
+        self.nodes_lines_appended_ends = {} #node -> line ends attached to the node by appended lines, merged into the compressed form when a snapshot is saved
+        #global coordinate arrays
+        self.lines_start_x_coord = [] #horizontal position in global coordinates of the start of the line
+        self.lines_start_y_coord = [] #vertical position in global coordinates of the start of the line
+        self.lines_end_x_coord = [] #horizontal position in global coordinates of the end of the line
+        self.lines_end_y_coord = [] #vertical position in global coordinates of the end of the line
+        self.lines_midpoint_x_coord = [] #horizontal midpoint in global coordinates of the line, used for text display
+        self.lines_midpoint_y_coord = [] #vertical midpoint in global coordinates of the line, used for text display
+        #projected coordinate arrays, calculated once when the lines are assigned
+        self.lines_start_x_projected = []
+        self.lines_start_y_projected = []
+        self.lines_end_x_projected = []
+        self.lines_end_y_projected = []
+        self.lines_midpoint_x_projected = []
+        self.lines_midpoint_y_projected = []
+        #unzoomed pixel coordinate arrays
+        self.lines_start_x = [] #horizontal position in unzoomed pixel coordinates of the start of the line
+        self.lines_start_y = [] #vertical position in unzoomed pixel coordinates of the start of the line
+        self.lines_end_x = [] #horizontal position in unzoomed pixel coordinates of the end of the line
+        self.lines_end_y = [] #vertical position in unzoomed pixel coordinates of the end of the line
+        self.lines_midpoint_x = [] #horizontal midpoint in unzoomed pixel coordinates of the line, used for text display
+        self.lines_midpoint_y = [] #vertical midpoint in unzoomed pixel coordinates of the line, used for text display
+        #other line properties
+        self.lines_width = [] #width of the line, pixels
+        self.lines_colour = [] #colour of the line
+        self.lines_name = [] #name of all the lines
+        self.lines_info = [] #info about all the lines
+        self.lines_index = None #spatial index of the lines in global coordinates
+        self.lines_max_width = 0 #largest width of any line, pixels
+        #flags
+        self.lines_assigned_flag = False #have lines been stored yet
+        self.lines_removed = set() #indices of removed lines, indices are never reused so the other lines keep theirs
+        self.lines_bounding_box = None #extremes (north, south, east, west) of the lines in global coordinates, None until needed
+
+    #create containers to store compound lines
+    def init_compound_lines(self):
+        self.num_compound_lines = 0 #number of compound lines stored
+        self.compound_line_info_name = 'none' #name of the info stored with the compound lines
+        self.compound_line_info_type = 'none' #type of the info stored with the compound lines
+        #arrays of compound line properties
+        #relating to nodes
+        self.compound_lines_start_node_type = [] #what type of node is at the start of the line (valid are 'none','node' and 'pie_node')
+        self.compound_lines_start_node_index = [] #index of the starting node, if it exists
+        self.compound_lines_end_node_type = [] #what type of node is at the end of the line (valid are 'none','node' and 'pie_node')
+        self.compound_lines_end_node_index= [] #index of the ending node, if it exists
+        #global coordinate arrays, list of list of line points from start to finsh
+        self.compound_line_points_x_coords = [] #horizontal position of points that make up the line in global coordinates
+        self.compound_line_points_y_coords = [] #vertical position of points that make up the line in global coordinates
+        self.compound_lines_midpoint_x_coord = [] #horizontal midpoint (halfway along the line) in global coordinates, used for text display
+        self.compound_lines_midpoint_y_coord = [] #vertical midpoint (halfway along the line) in global coordinates, used for text display
+        #projected coordinate arrays, calculated once when the compound lines are assigned
+        self.compound_line_points_x_projected = []
+        self.compound_line_points_y_projected = []
+        self.compound_lines_midpoint_x_projected = []
+        self.compound_lines_midpoint_y_projected = []
+        #unzoomed pixel coordinate arrays
+        self.compound_line_points_x = [] #horizontal position of points that make up the line in unzoomed pixel coordinates
+        self.compound_line_points_y = [] #vertical position of points that make up the line in unzoomed pixel coordinates
+        self.compound_lines_midpoint_x = [] #horizontal midpoint in unzoomed pixel coordinates of the line, used for text display
+        self.compound_lines_midpoint_y = [] #vertical midpoint in unzoomed pixel coordinates of the line, used for text display
+        #simplification pyramid
+        self.compound_line_points_importance = [] #for each point, the largest simplification tolerance (global units) at which it is still drawn, list of lists
+        self.compound_lines_extent = 1 #size of the area covered by all compound lines in global units, the coarsest band's tolerance
+        self.compound_lines_bands = {} #for each simplification band in use, the flattened unzoomed pixel coordinates of each simplified line (None until needed)
+        #other line properties
+        self.compound_lines_width = [] #width of the compound lines, pixels
+        self.compound_lines_colour = [] #colour of the compound line
+        self.compound_lines_name = [] #name of the compound lines
+        self.compound_lines_info = [] #info about the compound lines
+        self.compound_lines_index = None #spatial index of the compound lines in global coordinates
+        self.compound_lines_max_width = 0 #largest width of any compound line, pixels
+        #flags
+        self.compound_lines_assigned_flag = False #have lines been stored yet
+        self.compound_lines_removed = set() #indices of removed compound lines, indices are never reused so the other compound lines keep theirs
+        self.compound_lines_bounding_box = None #extremes (north, south, east, west) of the compound lines in global coordinates, None until needed
 
 
 #this class is the zoomable map
 class ZoomMap:
+    #functions timed by the render stats, grouped by stage
+    instrumented_stages = {
+        'coordinates':('get_screen_positions','get_storage_subset','get_compound_line_band_points','get_view_change'),
+        'culling':('get_visible_objects','cull_canvas_items','get_detail_level'),
+    }
+    #canvas methods timed as the 'canvas' stage and counted
+    instrumented_canvas_calls = ('create_oval','create_line','create_arc','create_text','create_image','coords','itemconfigure','delete','move','scale','tag_raise')
+    #redraws which are recorded as frames
+    instrumented_frames = ('render_frame','render_all')
+    #layers brought up to date when the view changes, in drawing order: (name, canvas tag attribute, rendered view attribute, method bringing the layer up to date,
+    #method redrawing it exactly). Scaling the canvas keeps lines exact but not the size of nodes, labels and images, so those layers are redrawn once scaled
+    view_layers = (('basemap','basemap_tag','basemap_rendered_view','render_basemap','render_basemap'),
+                   ('raster_tiles','raster_tiles_tag','raster_tiles_rendered_view','render_raster_tiles','render_raster_tiles'),
+                   ('heatmap','heatmap_tag','heatmap_rendered_view','render_heatmap','render_heatmap'),
+                   ('lines','lines_tag','lines_rendered_view','apply_zoom_lines','apply_zoom_lines'),
+                   ('compound_lines','compound_lines_tag','compound_lines_rendered_view','apply_zoom_compound_lines','apply_zoom_compound_lines'),
+                   ('nodes','nodes_tag','nodes_rendered_view','apply_zoom_nodes','render_nodes'),
+                   ('pie_nodes','pie_nodes_tag','pie_nodes_rendered_view','apply_zoom_pie_nodes','render_pie_nodes'),
+                   ('labels','labels_tag','labels_rendered_view','apply_zoom_labels','render_labels'))
+    #attributes saved in snapshots for each object type, with how they are stored: 'float' and 'int' follow the storage mode, 'float_list' is always a list,
+    #'text' is a list of strings and 'ragged_' kinds are lists with a sequence of values for each object
+    snapshot_attributes = {
+        'nodes':(('nodes_x_coords','float'),('nodes_y_coords','float'),('nodes_x_projected','float'),('nodes_y_projected','float'),('nodes_radii','float'),('nodes_colours','text'),('nodes_names','text')),
+        'pie_nodes':(('pie_nodes_x_coords','float'),('pie_nodes_y_coords','float'),('pie_nodes_x_projected','float'),('pie_nodes_y_projected','float'),('pie_nodes_radii','float'),
+                     ('pie_nodes_colours','ragged_text'),('pie_nodes_colours_lengths','ragged_float_list'),('pie_nodes_slice_starts','ragged_float_list'),('pie_nodes_slice_extents','ragged_float_list'),('pie_nodes_names','text')),
+        'lines':(('lines_start_x_coord','float'),('lines_start_y_coord','float'),('lines_end_x_coord','float'),('lines_end_y_coord','float'),('lines_midpoint_x_coord','float'),('lines_midpoint_y_coord','float'),
+                 ('lines_start_x_projected','float'),('lines_start_y_projected','float'),('lines_end_x_projected','float'),('lines_end_y_projected','float'),('lines_midpoint_x_projected','float'),('lines_midpoint_y_projected','float'),
+                 ('lines_width','float'),('lines_colour','text'),('lines_name','text'),('lines_start_node_type','text'),('lines_start_node_index','int'),('lines_end_node_type','text'),('lines_end_node_index','int'),
+                 ('nodes_lines_offsets','int'),('nodes_lines_ends','int')),
+        'compound_lines':(('compound_line_points_x_coords','ragged_float'),('compound_line_points_y_coords','ragged_float'),('compound_line_points_x_projected','ragged_float'),('compound_line_points_y_projected','ragged_float'),
+                          ('compound_line_points_importance','ragged_float_list'),('compound_lines_midpoint_x_coord','float_list'),('compound_lines_midpoint_y_coord','float_list'),
+                          ('compound_lines_midpoint_x_projected','float_list'),('compound_lines_midpoint_y_projected','float_list'),('compound_lines_width','float_list'),('compound_lines_colour','text'),('compound_lines_name','text'),
+                          ('compound_lines_start_node_type','text'),('compound_lines_start_node_index','int'),('compound_lines_end_node_type','text'),('compound_lines_end_node_index','int')),
+    }
+    #unzoomed pixel coordinates saved in snapshots for each object type, if they have been calculated
+    snapshot_pixel_attributes = {
+        'nodes':(('nodes_x','float'),('nodes_y','float')),
+        'pie_nodes':(('pie_nodes_x','float'),('pie_nodes_y','float')),
+        'lines':(('lines_start_x','float'),('lines_start_y','float'),('lines_end_x','float'),('lines_end_y','float'),('lines_midpoint_x','float'),('lines_midpoint_y','float')),
+        'compound_lines':(('compound_line_points_x','ragged_float'),('compound_line_points_y','ragged_float'),('compound_lines_midpoint_x','float_list'),('compound_lines_midpoint_y','float_list')),
+    }
+
     #create the map
-    def __init__(self,map_width,map_height,window,background="white",zoom_control="<MouseWheel>",drag_start_control='<ButtonPress-1>',drag_end_control="<B1-Motion>",print_warnings=True,scroll_gain=1,zoom_gain=0.01):
+    def __init__(self,map_width,map_height,window,background="white",zoom_control="<MouseWheel>",drag_start_control='<ButtonPress-1>',drag_end_control="<B1-Motion>",print_warnings=True,scroll_gain=1,zoom_gain=0.01,storage_mode='list',culling=True,cull_margin=50,level_of_detail=False,cluster_size=30,simplify_tolerance=0.5,simplify_bands=24,max_frame_rate=60,instrumentation=False,stats_overlay=False,hover_tooltips=False,pick_tolerance=5,raster_layers=(),tile_size=256,tile_memory_budget=64*1024*1024,tile_workers=2,projection='equirectangular',labels=(),label_font=('Arial',8),label_colour='black',label_cell_size=8,label_bands_per_octave=4,precompute_workers=0,precompute_part_size=50000,smooth_zoom=False,zoom_duration=0.15,frame_budget=0.8,model=None):
         self.map_width = map_width #width (horizontal length) of the map display in pixels
         self.map_height = map_height #height (vertical length) of the map display in pixels
         self.map_center_x = int(self.map_width/2) #midpoint of the map in pixels, horizontal
@@ -18,6 +1425,95 @@ class ZoomMap:
         self.print_warnings = print_warnings #do we print warning and error messages
         self.scroll_gain = scroll_gain #how fast is panning
         self.zoom_gain = zoom_gain #how fast is zooming
+        self.model = MapModel() if model is None else model #objects drawn on the map, which other maps may also draw, see MapModel
+        self.model.views.append(self)
+        if model is None: #a map drawing the model of another map leaves its objects stored and prepared as that map set them up
+            self.set_storage_mode(storage_mode) #how are coordinates and other numeric object properties stored
+            self.projection = self.get_projection(projection) #how global coordinates are flattened before being scaled to pixels
+            self.level_of_detail = level_of_detail #do we draw clusters of nearby nodes and pie nodes as single markers when zoomed out
+            self.simplify_tolerance = simplify_tolerance #largest change (in pixels) allowed when simplifying compound lines for display
+            self.simplify_bands = simplify_bands #number of levels in the compound line simplification pyramid, beyond which lines are drawn with every point
+            self.precompute_workers = precompute_workers #number of processes building spatial indices, clusters and simplification pyramids, 0 builds them in this process
+            self.precompute_part_size = precompute_part_size #number of objects in each part of the preprocessing sent to a worker
+        self.culling = culling #do we only keep canvas items for objects which are on (or near) the screen
+        self.cull_margin = cull_margin #how far beyond the edge of the screen (in pixels) objects are still kept on the canvas
+        self.cluster_size = cluster_size #approximate screen size (in pixels) of the area covered by each cluster
+        self.max_frame_rate = max_frame_rate #most times per second the map is redrawn in response to zooming and dragging
+        self.smooth_zoom = smooth_zoom #do we animate zooming with the mouse wheel, rather than jumping straight to the new zoom
+        self.zoom_duration = zoom_duration #length of the animation of each mouse wheel zoom, seconds
+        self.frame_budget = frame_budget #fraction of each frame which may be spent redrawing, layers which do not fit are moved and scaled as they are until a later frame, None redraws every layer in every frame
+        self.animation = None #transition of the view being animated, None if the view is not animating
+        self.view_layer_times = {} #time taken by the last redraw of each layer, seconds, used to predict which layers fit in a frame
+        self.next_view_layer = 0 #position in view_layers of the first layer to redraw in the next frame, so layers which did not fit in a frame are redrawn first in the next
+        self.distorted_layers = set() #layers whose canvas items have been scaled rather than redrawn, so they must be redrawn exactly
+        self.render_scheduled = None #id of the pending tk callback which will redraw the map, None if no redraw is pending
+        self.last_frame_time = 0 #time.perf_counter() time at which the map was last redrawn
+        self.render_stats = None #timings of recent redraws, None if instrumentation is disabled
+        self.stats_overlay = False #are the render stats shown on the map
+        self.hover_tooltips = hover_tooltips #do we show the name of the object under the mouse
+        self.pick_tolerance = pick_tolerance #how far (in pixels) from an object the mouse can be and still select it
+        self.click_callback = None #function called with the type and index of an object when it is clicked
+        self.tooltip_tag = 'zoom_map_tooltip'
+        self.update_queue = None #updates pushed by other threads, None if the update stream is not running
+        self.update_stream_interval = 50 #time between applying queued updates, milliseconds
+        self.update_stream_scheduled = None #id of the pending tk callback which will apply queued updates
+        self.raster_layers = set() #object types drawn as raster tiles rather than as individual canvas items
+        self.vector_objects = {'nodes':set(),'pie_nodes':set(),'lines':set(),'compound_lines':set()} #indices of objects in raster layers which are still drawn as canvas items
+        self.tile_size = tile_size #width and height of each raster tile, pixels
+        self.tile_levels_per_octave = 2 #tiles are drawn at zooms of 2^(level/tile_levels_per_octave), and resized to the zoom in view
+        self.tile_cache = TileCache(tile_memory_budget) #rendered tiles, reused whenever the view returns to a tile level
+        self.tile_workers = tile_workers #number of threads drawing tiles
+        self.tile_pool = None #threads drawing tiles, created when first needed
+        self.tile_generation = 0 #increases whenever the objects in raster layers change, so tiles of older generations are replaced
+        self.tiles_pending = {} #tile key -> future of the tile being drawn
+        self.tiles_displayed = {} #tile key -> (canvas id, photo image, tile image, (crop, width, height) of the photo) of each tile on the canvas
+        self.tiles_poll_scheduled = None #id of the pending tk callback which will collect finished tiles
+        self.raster_tiles_rendered_view = None #view in which the tiles on the canvas were placed
+        self.tile_colours = {} #tk colour -> rgb tuple, colours are looked up through tk so tiles match the canvas
+        self.raster_tiles_tag = 'zoom_map_raster_tiles'
+        self.basemap = None #source of basemap tiles, None if there is no basemap
+        self.basemap_cache = None #decoded basemap tiles
+        self.basemap_pool = None #threads reading and decoding basemap tiles
+        self.basemap_pending = {} #(zoom,x,y) -> future of the basemap tile being loaded
+        self.basemap_missing = set() #(zoom,x,y) of tiles the basemap does not have
+        self.basemap_displayed = {} #(zoom,x,y) -> (canvas id, photo image, source tile, width, height) of each basemap tile on the canvas
+        self.basemap_poll_scheduled = None #id of the pending tk callback which will collect loaded basemap tiles
+        self.basemap_rendered_view = None #view in which the basemap tiles on the canvas were placed
+        self.basemap_tag = 'zoom_map_basemap'
+        self.heatmap = None #settings of the density heatmap of the nodes, None if there is no heatmap, see set_heatmap
+        self.heatmap_pyramid = None #summed weights of the nodes at every resolution, built when the heatmap is first drawn
+        self.heatmap_generation = None #nodes pixels generation the pyramid was built from, see nodes_pixels_generation
+        self.heatmap_palette = None #rgba colour of each of 256 densities, found when the heatmap is first drawn
+        self.heatmap_displayed = None #(canvas id, photo image) of the heatmap on the canvas, None if it is not shown
+        self.heatmap_rendered_view = None #view in which the heatmap on the canvas was drawn
+        self.heatmap_tag = 'zoom_map_heatmap'
+        self.labels_types = set() #object types ('nodes', 'pie_nodes', 'lines', 'compound_lines') whose names are drawn as labels
+        self.label_font = label_font #tk font of the labels
+        self.label_colour = label_colour #tk colour of the labels
+        self.label_cell_size = label_cell_size #side length (in pixels) of the cells of the grid used to stop labels overlapping
+        self.label_bands_per_octave = label_bands_per_octave #number of zoom bands each doubling of zoom is divided into, labels are placed once per band
+        self.label_gap = 2 #space (in pixels) between a node and its label
+        self.label_char_width = None #average width of a character in the label font, pixels, measured when first needed
+        self.label_line_height = None #height of a line of text in the label font, pixels
+        self.labels_priorities = {} #object type -> priority of each object's label, higher priority labels are placed first
+        self.labels_order = None #every label in priority order with what is needed to place it, None until needed
+        self.labels_max_width = 0 #width of the widest label, pixels
+        self.label_bands = {} #zoom band -> (keys of the placed labels, spatial index of their positions)
+        self.label_canvas_ids = {} #(object type, index) -> id of each label on the canvas
+        self.labels_rendered_view = None #view in which the labels on the canvas were drawn
+        self.labels_tag = 'zoom_map_labels'
+        self.groups = {} #group name -> {'members': object type -> set of indices, 'options': canvas options set for the group, 'hidden': is the group hidden}
+        self.groups_order = OrderedDict() #group name -> 'raise' or 'lower', in the order the groups were last raised or lowered
+        self.object_groups = {'nodes':{},'pie_nodes':{},'lines':{},'compound_lines':{}} #object type -> index -> tags of the groups the object belongs to
+        self.hidden_layers = set() #layers whose canvas items are hidden
+        self.overviews = [] #overviews showing the whole map, see add_overview
+        #canvas tags used to move or scale every item of a type with a single canvas call
+        self.nodes_tag = 'zoom_map_nodes'
+        self.node_clusters_tag = 'zoom_map_node_clusters'
+        self.pie_nodes_tag = 'zoom_map_pie_nodes'
+        self.pie_node_clusters_tag = 'zoom_map_pie_node_clusters'
+        self.lines_tag = 'zoom_map_lines'
+        self.compound_lines_tag = 'zoom_map_compound_lines'
         #create the canvas object
         self.map = tk.Canvas(self.window,bg=self.background,width=self.map_width,height=self.map_height)
         self.map.pack(side = tk.RIGHT)
@@ -36,7 +1532,7 @@ class ZoomMap:
         except:
             if self.print_warnings:
                 print("WARNING : ",drag_start_control,' not a valid keybinding for tkinter. Defaulting to  "<ButtonPress-1>", for drag start keybinding')
-            self.canvas.bind("<ButtonPress-1>",self.drag_start)
+            self.map.bind("<ButtonPress-1>",self.drag_start)
         #bind stopping a drag
         try:
             self.map.bind(drag_end_control,self.drag_end)
@@ -44,30 +1540,446 @@ class ZoomMap:
             if self.print_warnings:
                 print("WARNING : ",drag_end_control,' not a valid keybinding for tkinter. Defaulting to  "<B1-Motion>", for drag end keybinding')
             self.map.bind("<B1-Motion>",self.drag_end)
+        #bind hovering over and clicking on objects
+        self.map.bind("<Motion>",self.hover_map)
+        self.map.bind("<Leave>",self.hide_tooltip)
+        self.map.bind("<ButtonRelease-1>",self.click_map)
         
-        #create containers for objects to be displayed on the map
+        #create containers for the canvas items of the objects displayed on the map
         self.init_objects()
+        if model is not None: #objects already in the model get canvas items on the first render
+            self.reset_canvas_objects()
         #initialise important variables
         self.reset_zoom_parameters()
+        self.drag_last_x = 0 #last mouse position seen while dragging, horizontal
+        self.drag_last_y = 0 #last mouse position seen while dragging, vertical
+        self.drag_start_x = 0 #mouse position at the start of the last drag, horizontal
+        self.drag_start_y = 0 #mouse position at the start of the last drag, vertical
+        if instrumentation:
+            self.enable_instrumentation(stats_overlay)
+        if len(raster_layers)>0:
+            self.set_raster_layers(raster_layers)
+        if len(labels)>0:
+            self.set_labels(labels)
     
     #create or reset zoom parameters to default values
     def reset_zoom_parameters(self):
-        self.current_zoom = 1 #how far are we zoomed in at the moment
-        self.current_zoom_offset_x = 0 #offset from default origin (in pixels) in the x axis as a result of zoom
-        self.current_zoom_offset_y = 0 #offset from default origin (in pixels) in the x axis as a result of zoom
+        self.view = ViewTransform() #maps unzoomed pixel coordinates to the screen
+
+    #zoom level and offsets of the current view
+    @property
+    def current_zoom(self):
+        return self.view.zoom
+
+    @property
+    def current_zoom_offset_x(self):
+        return self.view.offset_x
+
+    @property
+    def current_zoom_offset_y(self):
+        return self.view.offset_y
 
     #print a warning if warnings enabled
     def warning_print(self,message):
         if self.print_warnings==True:
             print("WARNING: ",message)
 
-    #create empty containers to store displayed objects in
+    #select how numeric object properties are stored
+    #'list' stores python lists, 'array' stores contiguous numpy float arrays and does coordinate and zoom math on whole arrays at once
+    def set_storage_mode(self,storage_mode):
+        if storage_mode=='list':
+            self.storage_mode = 'list'
+        elif storage_mode=='array':
+            if np is None: #array storage requires numpy
+                self.warning_print("numpy is not installed, array storage mode unavailable. Defaulting to 'list' storage mode")
+                self.storage_mode = 'list'
+            else:
+                self.storage_mode = 'array'
+        else:
+            message = 'storage_mode ' + str(storage_mode) + " is not a valid storage mode, valid modes are 'list' and 'array'. Defaulting to 'list' storage mode"
+            self.warning_print(message)
+            self.storage_mode = 'list'
+
+    #convert a sequence of numbers into the storage used for numeric properties in the current storage mode
+    #a copy is always made, so that updating stored values never changes the caller's data
+    def make_float_storage(self,values):
+        if self.storage_mode=='array':
+            return np.array(values,dtype=np.float64)
+        else:
+            return list(values)
+
+    #append values to numeric storage, returning the storage, which may have moved
+    #stored arrays are the start of a larger buffer whose spare space takes the new values, and a full buffer is replaced by one twice the size,
+    #so appending k values costs amortized O(k) rather than copying every stored value. A buffer only grows the one array filling it
+    def append_storage(self,values,new_values):
+        if self.storage_mode=='list':
+            values.extend(new_values)
+            return values
+        size = len(values)
+        new_size = size+len(new_values)
+        buffer = values.base if isinstance(values,np.ndarray) else None
+        if buffer is None or self.storage_buffers.get(id(buffer)) is not buffer or self.storage_buffers_used.get(id(buffer))!=size or len(buffer)<new_size:
+            buffer = np.empty(max(2*new_size,16),dtype=np.float64)
+            buffer[:size] = values
+            self.storage_buffers[id(buffer)] = buffer
+        buffer[size:new_size] = new_values
+        self.storage_buffers_used[id(buffer)] = new_size
+        return buffer[:new_size]
+
+    #append values to a list of object properties, properties loaded from a snapshot may be arrays, which are turned into lists first
+    def append_list(self,values,new_values):
+        if not isinstance(values,list):
+            values = values.tolist() if hasattr(values,'tolist') else list(values)
+        values.extend(new_values)
+        return values
+
+    #get the values in numeric storage of the objects which have not been removed
+    def get_live_storage(self,values,removed):
+        if len(removed)==0:
+            return values
+        if self.storage_mode=='array' and not isinstance(values,list):
+            return np.delete(values,sorted(removed))
+        return [value for i,value in enumerate(values) if i not in removed]
+
+    #get a projection from its name, or use a projection object (any object with project and unproject methods) as it is
+    def get_projection(self,projection):
+        if isinstance(projection,str):
+            if projection not in projections:
+                self.warning_print("Projection : " + projection + " not supported, valid projections are " + ", ".join(projections) + ". Defaulting to equirectangular")
+                projection = 'equirectangular'
+            return projections[projection]()
+        return projection
+
+    #change the projection, every object is projected again, after which determine_scale and calculate_pixel_coordinates must be called
+    def set_projection(self,projection):
+        self.projection = self.get_projection(projection)
+        if self.nodes_assigned_flag:
+            self.project_nodes()
+        if self.pie_nodes_assigned_flag:
+            self.project_pie_nodes()
+        if self.lines_assigned_flag:
+            self.project_lines()
+        if self.compound_lines_assigned_flag:
+            self.project_compound_lines()
+
+    #project global coordinates held in numeric storage, a whole list or array is projected at once
+    def project_storage(self,coords_x,coords_y):
+        if self.storage_mode=='array':
+            coords_x = np.asarray(coords_x,dtype=np.float64)
+            coords_y = np.asarray(coords_y,dtype=np.float64)
+        else:
+            coords_x = list(coords_x)
+            coords_y = list(coords_y)
+        return self.projection.project(coords_x,coords_y)
+
+    #convert unzoomed pixel coordinates of the objects at the given indices to screen coordinates as python lists, ready to be passed to the canvas
+    def get_screen_positions(self,list_x,list_y,indices):
+        if self.storage_mode=='array' and not isinstance(list_x,list): #gather and transform the requested positions at once
+            index_array = np.asarray(indices,dtype=np.intp)
+            screen_x,screen_y = self.view.apply(list_x[index_array],list_y[index_array])
+            return screen_x.tolist(),screen_y.tolist()
+        zoom = self.view.zoom
+        offset_x = self.view.offset_x
+        offset_y = self.view.offset_y
+        return [list_x[i]*zoom+offset_x for i in indices],[list_y[i]*zoom+offset_y for i in indices]
+
+    #get the values in numeric storage of the objects at the given indices as a python list, used when passing values to the canvas one item at a time
+    def get_storage_subset(self,values,indices):
+        if self.storage_mode=='array' and not isinstance(values,list):
+            return values[np.asarray(indices,dtype=np.intp)].tolist()
+        else:
+            return [values[i] for i in indices]
+
+    #find the largest and smallest values in numeric storage
+    def get_storage_max_min(self,values):
+        if self.storage_mode=='array':
+            return float(np.max(values)),float(np.min(values))
+        else:
+            return max(values),min(values)
+
+    #resize a list of canvas ids to a new number of objects, keeping the existing canvas items for objects that still exist
+    #canvas items belonging to objects that no longer exist are deleted, new objects are marked 'blank' so they are created on the next render
+    def resize_canvas_ids(self,canvas_ids,num_objects):
+        for id in canvas_ids[num_objects:]: #delete the items of removed objects
+            self.delete_canvas_item(id)
+        canvas_ids = canvas_ids[:num_objects]
+        canvas_ids.extend(['blank']*(num_objects-len(canvas_ids))) #new objects have no canvas item yet
+        return canvas_ids
+
+    #delete the canvas item of an object, objects drawn with several items (such as pie nodes) store a list of ids
+    def delete_canvas_item(self,id):
+        if id=='blank':
+            return
+        if isinstance(id,list):
+            if len(id)>0:
+                self.map.delete(*id)
+        else:
+            self.map.delete(id)
+
+    #delete the canvas items of rendered objects which are no longer visible, and return the set of visible objects
+    def cull_canvas_items(self,canvas_ids,rendered,visible):
+        visible = set(visible)
+        for i in rendered-visible:
+            if i<len(canvas_ids) and canvas_ids[i]!='blank':
+                self.delete_canvas_item(canvas_ids[i])
+                canvas_ids[i] = 'blank'
+        return visible
+
+    #get the box in global coordinates which is visible on the screen, extended by a margin in pixels
+    def get_visible_region(self,margin):
+        min_pixel_x,min_pixel_y = self.view.invert(-margin,-margin) #upper left corner in unzoomed pixel coordinates
+        max_pixel_x,max_pixel_y = self.view.invert(self.map_width+margin,self.map_height+margin) #lower right corner in unzoomed pixel coordinates
+        west,north = self.convert_pixels_to_coords(min_pixel_x,min_pixel_y)
+        east,south = self.convert_pixels_to_coords(max_pixel_x,max_pixel_y)
+        return west,south,east,north
+
+    #get the indices of the objects indexed by a spatial grid which are visible on the screen
+    #extra_margin (in pixels) accounts for objects whose size extends beyond their coordinates, such as node radii and line widths
+    #objects in raster layers are drawn in tiles, so only the objects which are still drawn as canvas items are returned for them
+    def get_visible_objects(self,index,num_objects,extra_margin,object_type=None):
+        if object_type in self.raster_layers:
+            return sorted(i for i in self.vector_objects[object_type] if i<num_objects)
+        if self.culling==False or index is None: #every object is treated as visible
+            removed = self.get_removed_objects(object_type) if object_type is not None else ()
+            return [i for i in range(num_objects) if i not in removed] if len(removed)>0 else range(num_objects)
+        west,south,east,north = self.get_visible_region(self.cull_margin+extra_margin)
+        return index.query(west,south,east,north)
+
+    #get the level of detail at which to draw a set of clustered nodes, or None to draw the individual nodes
+    def get_detail_level(self,clusters,object_type=None):
+        if self.level_of_detail==False or clusters is None or object_type in self.raster_layers: #raster tiles draw every object
+            return None
+        extent_pixels = clusters.size*self.pixels_per_unit*self.view.zoom #side length of the whole quadtree on the screen
+        return clusters.select_level(extent_pixels,self.cluster_size)
+
+    #draw the visible clusters of a level of detail as single markers, whose size grows with the number of nodes they contain
+    #cluster_canvas_ids maps cluster indices to canvas items and is returned updated, items of clusters which have left the screen are deleted
+    #colours gives the colour of each node, and a cluster takes the colour of its first node, if colours is a string it is used for every cluster
+    def render_clusters(self,clusters,level,cluster_canvas_ids,tags,colours,base_radius,new_only):
+        clusters_x,clusters_y,clusters_count,clusters_first = clusters.levels[level]
+        west,south,east,north = self.get_visible_region(self.cull_margin+self.cluster_size)
+        visible = clusters.get_level_index(level).query(west,south,east,north) if self.culling else range(len(clusters_x))
+        visible = [cluster for cluster in visible if clusters_count[cluster]>0] #clusters whose points have all moved away or been removed are not drawn
+        visible_set = set(visible)
+        for cluster in list(cluster_canvas_ids): #remove clusters which are no longer visible
+            if cluster not in visible_set:
+                self.map.delete(cluster_canvas_ids.pop(cluster))
+        created = False #have we created any new canvas items
+        for cluster in visible:
+            id = cluster_canvas_ids.get(cluster)
+            if new_only and id is not None:
+                continue
+            x,y = self.view.apply(*self.convert_coords_to_pixels(clusters_x[cluster],clusters_y[cluster]))
+            count = clusters_count[cluster]
+            radius = min(base_radius+2*math.log2(count),self.cluster_size/2) if count>1 else base_radius #bigger clusters are drawn larger
+            if id is None:
+                colour = colours if isinstance(colours,str) else colours[clusters_first[cluster]]
+                cluster_canvas_ids[cluster] = self.map.create_oval(x-radius,y-radius,x+radius,y+radius,fill=colour,tags=tags)
+                created = True
+            else:
+                self.map.coords(id,x-radius,y-radius,x+radius,y+radius)
+        if created:
+            self.restore_z_order()
+        return cluster_canvas_ids
+
+    #get the canvas scale (about the origin) and shift which take items drawn in an old view to their positions in the current view
+    def get_view_change(self,old_view):
+        scale = self.view.zoom/old_view.zoom
+        return scale,self.view.offset_x-old_view.offset_x*scale,self.view.offset_y-old_view.offset_y*scale
+
+    #scale and shift every canvas item with a tag, using at most two canvas calls
+    def transform_canvas_items(self,tag,scale,shift_x,shift_y):
+        if scale!=1:
+            self.map.scale(tag,0,0,scale,scale)
+        if shift_x!=0 or shift_y!=0:
+            self.map.move(tag,shift_x,shift_y)
+
+    #check that a batch update refers to existing objects and gives one value per object, warning and returning False if not
+    #objects in removed have been removed, so cannot be updated
+    def check_update_indices(self,object_type,num_objects,indices,*values_lists,removed=()):
+        for values in values_lists:
+            if len(values)!=len(indices):
+                message = str(len(indices)) + " " + object_type + " indices given but " + str(len(values)) + " values, update ignored"
+                self.warning_print(message)
+                return False
+        for i in indices:
+            if i<0 or i>=num_objects:
+                message = object_type + " index " + str(i) + " does not exist, there are " + str(num_objects) + " " + object_type + "s. Update ignored"
+                self.warning_print(message)
+                return False
+            if i in removed:
+                self.warning_print(object_type + " " + str(i) + " has been removed. Update ignored")
+                return False
+        return True
+
+    #have the pixel coordinates of a type of object been calculated, if not updated objects will get them when calculate_pixel_coordinates is called
+    def pixel_coordinates_calculated(self,pixel_x,num_objects):
+        return num_objects>0 and len(pixel_x)==num_objects
+
+    #should objects appended after the existing num_objects objects get pixel coordinates straight away
+    #they do if the existing objects have them, or if there are no existing objects and the scale has been determined
+    def appended_pixel_coordinates_needed(self,pixel_x,num_objects):
+        return self.pixel_coordinates_calculated(pixel_x,num_objects) or (num_objects==0 and self.pixels_per_unit_calculated())
+
+    #check that appended objects are given one value of each property per object, warning and returning False if not
+    def check_append_values(self,object_type,*values_lists):
+        lengths = [len(values) for values in values_lists]
+        if min(lengths)!=max(lengths):
+            self.warning_print("Values given for appended " + object_type + "s have different lengths " + str(lengths) + ", append ignored")
+            return False
+        return True
+
+    #extend a list of canvas ids with 'blank' for objects appended after the first first objects, so they are drawn on the next render
+    def append_canvas_ids(self,canvas_ids,first,num_objects):
+        if len(canvas_ids)!=first: #items kept from objects which were replaced before their pixel coordinates were calculated
+            canvas_ids = self.resize_canvas_ids(canvas_ids,first)
+        canvas_ids.extend(['blank']*(num_objects-first))
+        return canvas_ids
+
+    #get values in numeric storage as a python list
+    def storage_to_list(self,values):
+        return values.tolist() if self.storage_mode=='array' and not isinstance(values,list) else list(values)
+
+    #draw the changes made through the update methods since the last render, only the canvas items of changed objects are touched
+    def render_dirty_objects(self):
+        if len(self.raster_layers)>0: #tiles showing changed objects must be drawn again
+            dirty = {'nodes':len(self.nodes_dirty_style)+len(self.nodes_dirty_geometry),'pie_nodes':len(self.pie_nodes_dirty_slices)+len(self.pie_nodes_dirty_geometry),
+                     'lines':len(self.lines_dirty_style)+len(self.lines_dirty_geometry),'compound_lines':len(self.compound_lines_dirty_style)+len(self.compound_lines_dirty_geometry)}
+            if any(dirty[layer]>0 for layer in self.raster_layers):
+                self.invalidate_tiles()
+                self.render_raster_tiles()
+        restyled = len(self.nodes_dirty_style)+len(self.pie_nodes_dirty_slices)+len(self.lines_dirty_style)+len(self.compound_lines_dirty_style)>0
+        if restyled or len(self.nodes_dirty_geometry)+len(self.pie_nodes_dirty_geometry)+len(self.lines_dirty_geometry)+len(self.compound_lines_dirty_geometry)>0:
+            self.objects_generation += 1 #overviews summarise the changed objects again
+            if len(self.nodes_dirty_geometry)>0:
+                self.render_heatmap() #and the heatmap is binned again from the moved nodes
+        labels_moved = any(object_type in self.labels_types and len(dirty_geometry)>0 for object_type,dirty_geometry in (('nodes',self.nodes_dirty_geometry),('pie_nodes',self.pie_nodes_dirty_geometry),
+                                                                                                                  ('lines',self.lines_dirty_geometry),('compound_lines',self.compound_lines_dirty_geometry)))
+        self.render_dirty_lines()
+        self.render_dirty_compound_lines()
+        self.render_dirty_nodes()
+        self.render_dirty_pie_nodes()
+        if labels_moved: #labelled objects have moved, so the labels must be placed again
+            self.invalidate_labels()
+            self.render_labels()
+        if restyled: #group styles override the styles of their objects
+            self.apply_groups_style()
+
+    #public tools to measure rendering performance
+
+    #start recording the timings and canvas calls of each redraw, optionally showing them in the corner of the map
+    def enable_instrumentation(self,overlay=False):
+        if self.render_stats is not None:
+            self.disable_instrumentation()
+        self.render_stats = stats = RenderStats()
+        #the wrappers are instance attributes which hide the class methods, deleting them restores the unwrapped methods
+        for stage,names in self.instrumented_stages.items():
+            for name in names:
+                setattr(self,name,stats.timed(stage,getattr(self,name)))
+        for name in self.instrumented_canvas_calls:
+            setattr(self.map,name,stats.timed('canvas',getattr(self.map,name),name))
+        for name in self.instrumented_frames:
+            setattr(self,name,stats.framed(getattr(self,name),self.end_instrumented_frame))
+        self.stats_overlay = overlay
+
+    #stop recording render timings and remove the overlay
+    def disable_instrumentation(self):
+        if self.render_stats is None:
+            return
+        for names in list(self.instrumented_stages.values())+[self.instrumented_frames]:
+            for name in names:
+                del self.__dict__[name]
+        for name in self.instrumented_canvas_calls:
+            delattr(self.map,name)
+        self.map.delete('zoom_map_stats_overlay')
+        self.render_stats = None
+        self.stats_overlay = False
+
+    #get a summary of the recent redraws, or None if instrumentation is disabled
+    #the summary holds the number of frames, the stage times, canvas call counts and items on the canvas of the last frame,
+    #the mean, 95th percentile and maximum time of recent frames and a histogram of recent frame times, all times in milliseconds
+    def get_render_stats(self):
+        if self.render_stats is None:
+            return None
+        return self.render_stats.get_summary()
+
+    #count the canvas items currently drawn for map objects
+    def count_canvas_items(self):
+        return len(self.nodes_rendered)+len(self.node_cluster_canvas_ids)+sum(len(self.pie_node_canvas_ids[i]) for i in self.pie_nodes_rendered)+len(self.pie_node_cluster_canvas_ids)+len(self.lines_rendered)+len(self.compound_lines_rendered)+len(self.tiles_displayed)+len(self.basemap_displayed)+len(self.label_canvas_ids)
+
+    #record the items on the canvas at the end of a frame and update the overlay
+    def end_instrumented_frame(self,stats):
+        stats.last_frame['items_on_canvas'] = self.count_canvas_items()
+        if self.stats_overlay:
+            self.draw_stats_overlay(stats)
+
+    #show the timings of the last frame in the upper left corner of the map
+    def draw_stats_overlay(self,stats):
+        summary = stats.get_summary()
+        frame = summary['last_frame']
+        stages = frame['stages']
+        calls = frame['calls']
+        text = "frame %.1f ms  mean %.1f  p95 %.1f\n" % (frame['total'],summary['mean_frame_time'],summary['p95_frame_time'])
+        text += "  ".join("%s %.1f" % (stage,elapsed) for stage,elapsed in stages.items()) + "\n"
+        text += "create %d  coords %d  delete %d  items %d" % (sum(count for name,count in calls.items() if name.startswith('create')),calls.get('coords',0),calls.get('delete',0),frame['items_on_canvas'])
+        overlay = self.map.find_withtag('zoom_map_stats_overlay')
+        if len(overlay)==0:
+            self.map.create_text(5,5,text=text,anchor='nw',font=('Courier',9),tags='zoom_map_stats_overlay')
+        else:
+            self.map.itemconfigure(overlay[0],text=text)
+        self.map.tag_raise('zoom_map_stats_overlay') #keep the overlay above the map objects
+
+    #keep lines under nodes after new canvas items have been created
+    def restore_z_order(self):
+        self.map.tag_raise(self.compound_lines_tag)
+        self.map.tag_raise(self.nodes_tag)
+        self.map.tag_raise(self.pie_nodes_tag)
+        self.map.tag_raise(self.labels_tag) #labels are drawn over every object
+        self.map.tag_lower(self.heatmap_tag) #the heatmap is drawn under every object
+        self.map.tag_lower(self.raster_tiles_tag) #raster tiles are drawn under every canvas item
+        self.map.tag_lower(self.basemap_tag) #with the basemap under them
+        self.apply_groups() #new canvas items take on the settings of their layers and groups
+
+    #create empty containers for the canvas items of the displayed objects
     def init_objects(self):
-        self.init_nodes() #containers to store nodes
-        self.init_pie_nodes() #containers to store pie nodes
-        self.init_lines() #containers to store lines
-        self.init_compound_lines() #containers to store compound lines
-    
+        self.init_nodes() #canvas items of nodes
+        self.init_pie_nodes() #canvas items of pie nodes
+        self.init_lines() #canvas items of lines
+        self.init_compound_lines() #canvas items of compound lines
+
+    #stop drawing the objects of a model shared with other maps, for a map which is no longer shown
+    #changes made through the other maps are no longer drawn on this map, which should not be used to change the objects afterwards
+    def detach_model(self):
+        if self in self.model.views:
+            self.model.views.remove(self)
+        if self.render_scheduled is not None:
+            self.map.after_cancel(self.render_scheduled)
+            self.render_scheduled = None
+
+    #record that objects have changed in every map drawing them, so each map draws the changes on its next render
+    #dirty is the name of the set of changed objects of a type, such as 'nodes_dirty_style'
+    def mark_dirty(self,dirty,indices):
+        for view in self.model.views:
+            getattr(view,dirty).update(indices)
+            view.schedule_render()
+
+    #fit the canvas items of the map to the objects once the pixel coordinates of every object have been calculated or loaded again
+    #objects keep their canvas items, which are moved on the next render, while tiles and labels drawn from the previous coordinates are discarded
+    def reset_canvas_objects(self):
+        self.node_canvas_ids = self.resize_canvas_ids(self.node_canvas_ids,self.num_nodes) #canvas ids for the nodes themselves
+        self.nodes_rendered = set(i for i in self.nodes_rendered if i<self.num_nodes)
+        self.pie_node_canvas_ids = self.resize_canvas_ids(self.pie_node_canvas_ids,self.num_pie_nodes) #canvas ids of the arcs making up each pie node
+        self.pie_nodes_rendered = set(i for i in self.pie_nodes_rendered if i<self.num_pie_nodes)
+        self.lines_canvas_ids = self.resize_canvas_ids(self.lines_canvas_ids,self.num_lines) #canvas ids for the lines themselves
+        self.lines_rendered = set(i for i in self.lines_rendered if i<self.num_lines)
+        self.compound_lines_canvas_ids = self.resize_canvas_ids(self.compound_lines_canvas_ids,self.num_compound_lines) #canvas ids for the compound lines themselves
+        self.compound_lines_rendered = set(i for i in self.compound_lines_rendered if i<self.num_compound_lines)
+        self.compound_lines_band = None #the simplified lines are drawn again from the new coordinates
+        self.invalidate_tiles() #tiles drawn from the previous objects or scale are no longer valid
+        self.invalidate_labels() #as are the labels placed for the previous objects or scale
+        self.map.delete(self.labels_tag) #and the labels on the canvas, which may name objects that have been replaced
+        self.label_canvas_ids = {}
+
     #private tools to work on these containers, we will later add on a public interface as well, which will be the same but with more checking
     
     #after objects has been assigned, determine correct scale
@@ -86,6 +1998,7 @@ class ZoomMap:
             warning_message = 'scale_mode ' + scale_mode + ' is not a valid scale mode\n' + 'Valid modes are "automatic", "manual", "semi-automatic" \n Defaulting to automatic scaling' 
             self.warning_print(warning_message)
             self.pixels_per_unit,self.start_x,self.start_y = self.get_automatic_scaling_boundaries(border_fraction_x,border_fraction_y)
+        self.projected_start_x,self.projected_start_y = self.projection.project(self.start_x,self.start_y) #upper left corner of the map in projected space
 
 
     #automatically calculate and store the position of all objects in the (unzoomed) pixel coordinate system
@@ -99,15 +2012,37 @@ class ZoomMap:
             self.calculate_compound_line_pixel_coordinates()
         if self.pie_nodes_assigned_flag==True:
             self.calculate_pie_nodes_pixel_coordinates()
+        self.objects_generation += 1 #the summaries of the objects in overviews are no longer valid
+        for view in self.model.views: #and every map drawing the objects must move their canvas items
+            view.reset_canvas_objects()
+
+    #convert projected coordinates held in numeric storage to unzoomed pixel coordinates, giving the same values as converting them one at a time
+    def convert_projected_storage_to_pixels(self,projected_x,projected_y):
+        if self.storage_mode=='array':
+            return self.convert_projected_to_pixels(np.asarray(projected_x,dtype=np.float64),np.asarray(projected_y,dtype=np.float64))
+        pixels = [self.convert_projected_to_pixels(x,y) for x,y in zip(projected_x,projected_y)]
+        return [x for x,y in pixels],[y for x,y in pixels]
 
     #convert global coordinates to unzoomed pixel coordinates
+    #works on single coordinates and (in array storage mode) on whole arrays of coordinates at once
     def convert_coords_to_pixels(self,coord_x,coord_y):
-        latitude_offset = coord_y-self.start_y #units between upper-left and position, y axis
-        longitude_offset = coord_x-self.start_x #units between upper left and position, x axis
+        return self.convert_projected_to_pixels(*self.projection.project(coord_x,coord_y))
+
+    #convert projected coordinates to unzoomed pixel coordinates, this only scales and shifts so it is cheap to repeat when the scale changes
+    #works on single coordinates and (in array storage mode) on whole arrays of coordinates at once
+    def convert_projected_to_pixels(self,projected_x,projected_y):
+        latitude_offset = projected_y-self.projected_start_y #units between upper-left and position, y axis
+        longitude_offset = projected_x-self.projected_start_x #units between upper left and position, x axis
         y = -(latitude_offset)*self.pixels_per_unit #multiply by -1 as positive pixels are down, but positive coords are north
         x = (longitude_offset)*self.pixels_per_unit 
         return x,y
 
+    #convert unzoomed pixel coordinates back to global coordinates
+    def convert_pixels_to_coords(self,x,y):
+        projected_x = x/self.pixels_per_unit+self.projected_start_x
+        projected_y = self.projected_start_y-y/self.pixels_per_unit #positive pixels are down, but positive coords are north
+        return self.projection.unproject(projected_x,projected_y)
+
     #automatically calculate the scale of the map
     def get_automatic_scaling_boundaries(self,border_fraction_x,border_fraction_y):
         extremes_defined,extreme_north,extreme_south,extreme_east,extreme_west = self.get_extreme_positions() #get the extreme positions in global coordinates
@@ -116,6 +2051,9 @@ class ZoomMap:
             message = "extreme positions not found among " + str(self.num_nodes) + " nodes, " + str(self.num_lines) + " lines, " + str(self.num_compound_lines) + " compound lines, " + str(self.num_pie_nodes) + "pie nodes "
             self.warning_print(message)
             self.warning_print("reverting to default extremes of +- 1 units")
+        #the map is fitted in projected space, projecting the extremes gives the extremes of the projected objects as each axis is projected in order
+        extreme_east,extreme_north = self.projection.project(extreme_east,extreme_north)
+        extreme_west,extreme_south = self.projection.project(extreme_west,extreme_south)
         units_north_south = extreme_north-extreme_south #how much distance between north and south in global coordinate frame
         units_east_west = extreme_east-extreme_west #how much distance between east and west in global coordinate frame
         start_x = extreme_west - units_east_west*border_fraction_x*0.5#starting x position (west-most) in global coordinates accounting for requested border (half as other half will be on other side)
@@ -125,6 +2063,7 @@ class ZoomMap:
         pixels_per_unit_x = self.map_width/units_east_west #maximum number of pixels per unit to achieve requested extra x space
         pixels_per_unit_y = self.map_height/units_north_south #minimum number of pixels per unit to achieve requested extra y space
         pixels_per_unit = min(pixels_per_unit_x,pixels_per_unit_y) #minima allows us to achieve requested extra space along both axes
+        start_x,start_y = self.projection.unproject(start_x,start_y) #the starting position is stored in global coordinates
         return pixels_per_unit,start_x,start_y #return the pixel density along with the starting position in global coordinates accounting for the requested border
 
 
@@ -144,108 +2083,166 @@ class ZoomMap:
         extreme_east = -1
         extreme_west = 1
         extremes_defined = False #have we determined extreme positions yet
-        if self.nodes_assigned_flag==True: #if we have assigned nodes
-            extreme_north,extreme_south,extreme_east,extreme_west = self.get_extreme_nodes() #get the extreme positions of the nodes
-            extremes_defined = True #we have defined extremes which we can compare to
-        #compare with 
-        if self.lines_assigned_flag==True: #if we have assigned lines
-            if extremes_defined==True: #and we have already measured extremes, compare the extremes and select the most extreme
-                new_extreme_north,new_extreme_south,new_extreme_east,new_extreme_west = self.get_extreme_lines() #get the new extreme positions from the lines
-                extreme_north = max(extreme_north,new_extreme_north)
-                extreme_south = min(extreme_south,new_extreme_south)
-                extreme_east = max(extreme_east,new_extreme_east)
-                extreme_west = min(extreme_west,new_extreme_west)
-            else: #if extremes not yet found, extremes are the new extremes
-                extreme_north,extreme_south,extreme_east,extreme_west = self.get_extreme_lines() #get the extreme positions of the lines
-                extremes_defined = True #we have defined extremes which we can compare to
-        #compare with compound lines if they exist
-        if self.compound_lines_assigned_flag==True: #if we have assigned compound lines
-            if extremes_defined==True: #and we have already measured extremes, compare the extremes and select the most extreme
-                new_extreme_north,new_extreme_south,new_extreme_east,new_extreme_west = self.get_extreme_compound_lines() #get the new extreme positions from the compound lines
+        for object_type in ('nodes','lines','compound_lines','pie_nodes'):
+            bounding_box = self.get_objects_bounding_box(object_type) #None if there are no objects of this type
+            if bounding_box is None:
+                continue
+            new_extreme_north,new_extreme_south,new_extreme_east,new_extreme_west = bounding_box
+            if extremes_defined==True: #we have already measured extremes, compare the extremes and select the most extreme
                 extreme_north = max(extreme_north,new_extreme_north)
                 extreme_south = min(extreme_south,new_extreme_south)
                 extreme_east = max(extreme_east,new_extreme_east)
                 extreme_west = min(extreme_west,new_extreme_west)
             else: #if extremes not yet found, extremes are the new extremes
-                extreme_north,extreme_south,extreme_east,extreme_west = self.get_extreme_compound_lines() #get the extreme positions of the compound lines
+                extreme_north,extreme_south,extreme_east,extreme_west = bounding_box
                 extremes_defined = True #we have defined extremes which we can compare to
-        #compare with pie nodes if they exist
-        if self.pie_nodes_assigned_flag==True: #if we have assigned pie nodes
-            if extremes_defined==True: #and we have already measured extremes, compare the extremes and select the most extreme
-                new_extreme_north,new_extreme_south,new_extreme_east,new_extreme_west = self.get_extreme_pie_nodes() #get the new extreme positions from the pie_nodes lines
-                extreme_north = max(extreme_north,new_extreme_north)
-                extreme_south = min(extreme_south,new_extreme_south)
-                extreme_east = max(extreme_east,new_extreme_east)
-                extreme_west = min(extreme_west,new_extreme_west)
-            else: #if extremes not yet found, extremes are the new extremes
-                extreme_north,extreme_south,extreme_east,extreme_west = self.get_extreme_pie_nodes() #get the extreme positions of the pie_nodes lines
-                extremes_defined = True #we have defined extremes which we can compare to
-
         #return whether we have found extremes and the extremes (or placeholder if we have not found the extremes)
-        return extremes_defined,extreme_north,extreme_south,extreme_east,extreme_west                
+        return extremes_defined,extreme_north,extreme_south,extreme_east,extreme_west
+
+    #get the extremes (north, south, east, west) of the objects of a type which have not been removed, or None if there are none
+    #the extremes are found by scanning the objects once, then kept up to date as objects are appended, so scaling does not scan every object again
+    def get_objects_bounding_box(self,object_type):
+        bounding_box = getattr(self,object_type+'_bounding_box')
+        if bounding_box is None and getattr(self,object_type+'_assigned_flag') and self.get_num_objects(object_type)>len(self.get_removed_objects(object_type)):
+            bounding_box = getattr(self,'get_extreme_'+object_type)()
+            setattr(self,object_type+'_bounding_box',bounding_box)
+        return bounding_box
+
+    #grow the bounding box of a type of object to take in appended objects, given the extremes of the appended objects
+    def grow_objects_bounding_box(self,object_type,north,south,east,west):
+        bounding_box = getattr(self,object_type+'_bounding_box')
+        if bounding_box is not None: #otherwise it is found when next needed
+            setattr(self,object_type+'_bounding_box',(max(bounding_box[0],north),min(bounding_box[1],south),max(bounding_box[2],east),min(bounding_box[3],west)))
+
+    #forget the bounding box of a type of object if removed objects reached its edge, given the extremes of the removed objects
+    #the bounding box can then only be found by scanning the remaining objects, which is left until it is next needed
+    def shrink_objects_bounding_box(self,object_type,north,south,east,west):
+        bounding_box = getattr(self,object_type+'_bounding_box')
+        if bounding_box is not None and (north>=bounding_box[0] or south<=bounding_box[1] or east>=bounding_box[2] or west<=bounding_box[3]):
+            setattr(self,object_type+'_bounding_box',None)
 
     #private tools for operating on nodes
-    #create containers to store nodes
+    #create containers for the canvas items of the nodes drawn on the map, the nodes themselves are stored in the model of the map
     def init_nodes(self):
-        #nodes, these are filled circles created using the tk oval object
-        self.num_nodes = 0 #number of nodes stored
-        self.node_info_type = 'none' #type of info stored
-        self.node_info_name = 'none' #name of info stored
-        #arrays of node properties
-        self.nodes_x_coords = [] #horizontal position in global coordinates of the centre of the node
-        self.nodes_y_coords = [] #vertical position in global coordinates of the centre of the node
-        self.nodes_x = [] #horizontal position in pixel coordinates of the centre of the node
-        self.nodes_y = [] #vertical position in pixel coordinates of the centre of the node
-        self.nodes_x_original = [] #copy of self.nodes_x without zoom applied
-        self.nodes_y_original = [] #copy of self.nodes_y without zoom applied
-        self.nodes_radii = []  #radius of the node, pixels
-        self.nodes_colours = [] #colour of the nodes
-        self.nodes_name = [] #name of the each node
-        self.nodes_info = [] #additional info about each node 
         self.node_canvas_ids = [] #id of the node object within the canvas
-        #flags
-        self.nodes_assigned_flag = False #have nodes been stored yet
+        self.nodes_rendered = set() #indices of the nodes which currently have a canvas item
+        self.node_cluster_canvas_ids = {} #id of the canvas item of each cluster drawn at the current level of detail
+        self.node_cluster_level = None #level of detail currently drawn, None if individual nodes are drawn
+        self.nodes_rendered_view = None #view in which the nodes on the canvas were drawn
+        self.nodes_style_changed_flag = False #do existing canvas items need their colour updated on the next render
+        self.nodes_dirty_style = set() #indices of nodes whose colour has changed since the last render
+        self.nodes_dirty_geometry = set() #indices of nodes whose position or radius has changed since the last render, or which have been appended or removed
+
+    #render the nodes which are visible on the screen, deleting the canvas items of nodes which have left the screen
+    #if new_only is True, nodes which already have a canvas item are assumed to be in the right place and only newly visible nodes are drawn
+    def render_nodes(self,new_only=False):
+        if self.num_nodes==0:
+            return
+        level = self.get_detail_level(self.nodes_clusters,'nodes')
+        if level!=self.node_cluster_level: #clusters from a different level of detail must be replaced
+            self.map.delete(self.node_clusters_tag)
+            self.node_cluster_canvas_ids = {}
+            self.node_cluster_level = level
+        if level is not None: #zoomed out far enough to draw clusters rather than individual nodes
+            self.nodes_rendered = self.cull_canvas_items(self.node_canvas_ids,self.nodes_rendered,[])
+            self.node_cluster_canvas_ids = self.render_clusters(self.nodes_clusters,level,self.node_cluster_canvas_ids,(self.nodes_tag,self.node_clusters_tag),self.nodes_colours,self.nodes_max_radius,new_only)
+            self.nodes_rendered_view = self.view.copy()
+            return
+        visible = self.get_visible_objects(self.nodes_index,self.num_nodes,self.nodes_max_radius,'nodes')
+        self.nodes_rendered = self.cull_canvas_items(self.node_canvas_ids,self.nodes_rendered,visible)
+        if new_only:
+            visible = [i for i in visible if self.node_canvas_ids[i]=='blank']
+        nodes_x,nodes_y = self.get_screen_positions(self.nodes_x,self.nodes_y,visible) #positions are derived from the unzoomed positions through the current view
+        nodes_radii = self.get_storage_subset(self.nodes_radii,visible)
+        created = False #have we created any new canvas items
+        for j,i in enumerate(visible):
+            x = nodes_x[j]
+            y = nodes_y[j]
+            radius = nodes_radii[j]
+            id = self.node_canvas_ids[i]
+            if id=='blank':
+                #draw a circle to represent the node, and store the id so we can move the object later
+                self.node_canvas_ids[i] = self.map.create_oval(x-radius,y-radius,x+radius,y+radius,fill=self.nodes_colours[i],tags=self.get_item_tags('nodes',i,self.nodes_tag))
+                created = True
+            else:
+                #move the existing oval object rather than deleting and recreating it
+                self.map.coords(id,x-radius,y-radius,x+radius,y+radius)
+                if self.nodes_style_changed_flag:
+                    self.map.itemconfigure(id,fill=self.nodes_colours[i])
+        if new_only==False:
+            self.nodes_style_changed_flag = False #all canvas items now have the correct style
+        self.nodes_rendered_view = self.view.copy()
+        if created:
+            self.restore_z_order()
+
+    #draw the nodes changed by the update methods since the last render
+    def render_dirty_nodes(self):
+        if len(self.nodes_dirty_style)==0 and len(self.nodes_dirty_geometry)==0:
+            return
+        if self.node_cluster_level is not None: #clusters are drawn, there are few enough of them to redraw them all
+            self.render_nodes()
+        else:
+            for i in self.nodes_dirty_geometry: #move or resize changed nodes which are on the canvas
+                id = self.node_canvas_ids[i]
+                if id!='blank':
+                    x,y = self.view.apply(self.nodes_x[i],self.nodes_y[i])
+                    radius = self.nodes_radii[i]
+                    self.map.coords(id,x-radius,y-radius,x+radius,y+radius)
+            for i in self.nodes_dirty_style: #restyle changed nodes which are on the canvas
+                id = self.node_canvas_ids[i]
+                if id!='blank':
+                    self.map.itemconfigure(id,fill=self.nodes_colours[i])
+            if len(self.nodes_dirty_geometry)>0:
+                self.render_nodes(new_only=True) #moved nodes may have entered or left the screen
+        self.nodes_dirty_style = set()
+        self.nodes_dirty_geometry = set()
 
-    #render the nodes
-    def render_nodes(self):
-        for i in range(self.num_nodes):
-            x = self.nodes_x[i]
-            y = self.nodes_y[i]
-            radius = self.nodes_radii[i]
-            colour = self.nodes_colours[i]
-            if self.node_canvas_ids[i]!='blank':
-                #delete the old oval object if one exists
-                self.map.delete(self.node_canvas_ids[i])
-            id = self.map.create_oval(x-radius,y-radius,x+radius,y+radius,fill=colour) #draw a circle to represent the node
-            self.node_canvas_ids[i] = id #store the id so we can delete the object later
+    #get the canvas items of the nodes ready to be reused by new nodes replacing them
+    def reset_nodes_view(self):
+        self.clear_groups_of_type('nodes') #groups hold the old objects, whose canvas items will be reused
+        node_canvas_ids = self.node_canvas_ids #keep the existing canvas items so they can be reused by the new nodes
+        nodes_rendered = self.nodes_rendered
+        self.map.delete(self.node_clusters_tag) #clusters of the old nodes are no longer valid
+        self.init_nodes()
+        self.node_canvas_ids = node_canvas_ids
+        self.nodes_rendered = nodes_rendered
+        self.nodes_style_changed_flag = True #reused canvas items must take on the style of the new nodes
 
     #create new nodes and replace the existing nodes
     def create_nodes(self,nodes_x_coords,nodes_y_coords,nodes_radii,nodes_colours,nodes_names,info_type='none',info_name='none',nodes_info=[]):
-        self.init_nodes() #remove the storage of the existing nodes
+        for view in self.model.views: #every map drawing the nodes reuses their canvas items for the new nodes
+            view.reset_nodes_view()
+        self.model.init_nodes() #remove the storage of the existing nodes
         self.num_nodes = len(nodes_x_coords) #get the number of nodes
         self.assign_nodes_positions(nodes_x_coords,nodes_y_coords)  #assign the position of the new nodes
         self.assign_nodes_radii(nodes_radii) #assign the nodes radii
         self.assign_nodes_colours(nodes_colours) #assign the nodes colours
         self.assign_nodes_names(nodes_names) #assign the nodes names
         self.assign_nodes_info(info_type,info_name,nodes_info) #assign info the nodes
+        self.build_nodes_index() #index the nodes so we can quickly find those on screen
         self.nodes_assigned_flag = True  
             
     #assign the nodes new x/y coordinates in the global coordinate frame
     def assign_nodes_positions(self,nodes_x_coords,nodes_y_coords):
-        self.nodes_x_coords = nodes_x_coords
-        self.nodes_y_coords = nodes_y_coords
+        self.nodes_x_coords = self.make_float_storage(nodes_x_coords)
+        self.nodes_y_coords = self.make_float_storage(nodes_y_coords)
+        self.project_nodes()
+
+    #project the positions of all the nodes at once
+    def project_nodes(self):
+        self.nodes_x_projected,self.nodes_y_projected = self.project_storage(self.nodes_x_coords,self.nodes_y_coords)
 
     #assign the nodes new radii
     def assign_nodes_radii(self,nodes_radii):
-        self.nodes_radii = nodes_radii
+        self.nodes_radii = self.make_float_storage(nodes_radii)
 
     #assign the nodes new colours
     def assign_nodes_colours(self,nodes_colours):
-        self.nodes_colours = nodes_colours
+        self.nodes_colours = list(nodes_colours) #copied so updates do not change the caller's list
 
     #assign the nodes new names
     def assign_nodes_names(self,nodes_names):
-        self.nodes_names = nodes_names
+        self.nodes_names = list(nodes_names) #copied so appending nodes does not change the caller's list
 
     #assign info about the nodes
     def assign_nodes_info(self,info_type,info_name,nodes_info):
@@ -261,94 +2258,382 @@ class ZoomMap:
         self.node_info_type='none'
         self.node_info_name='none'
 
+    #public tools to update existing nodes, the changes are drawn on the next render touching only the canvas items of the changed nodes
+
+    #change the colours of the nodes at the given indices
+    def update_nodes_colours(self,indices,nodes_colours):
+        if self.check_update_indices('node',self.num_nodes,indices,nodes_colours,removed=self.nodes_removed)==False:
+            return
+        for i,colour in zip(indices,nodes_colours):
+            self.nodes_colours[i] = colour
+        self.mark_dirty('nodes_dirty_style',indices)
+
+    #change the radii of the nodes at the given indices
+    def update_nodes_radii(self,indices,nodes_radii):
+        if self.check_update_indices('node',self.num_nodes,indices,nodes_radii,removed=self.nodes_removed)==False:
+            return
+        for i,radius in zip(indices,nodes_radii):
+            self.nodes_radii[i] = radius
+        self.nodes_max_radius = max(self.nodes_max_radius,max(nodes_radii,default=0)) #nodes are drawn up to this far from their centre
+        self.mark_dirty('nodes_dirty_geometry',indices)
+
+    #move the nodes at the given indices to new positions in global coordinates
+    def update_nodes_positions(self,indices,nodes_x_coords,nodes_y_coords):
+        if self.check_update_indices('node',self.num_nodes,indices,nodes_x_coords,nodes_y_coords,removed=self.nodes_removed)==False:
+            return
+        pixels_calculated = self.pixel_coordinates_calculated(self.nodes_x,self.num_nodes)
+        moved = list(dict.fromkeys(indices)) #each node once, even if it is moved more than once
+        if pixels_calculated: #the heatmap takes the weights of the nodes away from their old positions
+            self.update_heatmap_pyramids(moved,self.get_storage_subset(self.nodes_x,moved),self.get_storage_subset(self.nodes_y,moved),-1)
+        for i,coord_x,coord_y in zip(indices,nodes_x_coords,nodes_y_coords):
+            if self.nodes_clusters is not None: #move the node between clusters before its old position is overwritten
+                self.nodes_clusters.move_point(i,float(self.nodes_x_coords[i]),float(self.nodes_y_coords[i]),coord_x,coord_y,self.nodes_x_coords,self.nodes_y_coords)
+            self.nodes_x_coords[i] = coord_x
+            self.nodes_y_coords[i] = coord_y
+            self.nodes_index.update_item(i,coord_x,coord_y,coord_x,coord_y) #move the node within the spatial index
+            self.nodes_x_projected[i],self.nodes_y_projected[i] = self.projection.project(coord_x,coord_y)
+            if pixels_calculated:
+                self.nodes_x[i],self.nodes_y[i] = self.convert_projected_to_pixels(self.nodes_x_projected[i],self.nodes_y_projected[i])
+        if pixels_calculated: #and adds them at the new positions
+            self.update_heatmap_pyramids(moved,self.get_storage_subset(self.nodes_x,moved),self.get_storage_subset(self.nodes_y,moved))
+        self.nodes_bounding_box = None #found again when next needed
+        self.mark_dirty('nodes_dirty_geometry',indices)
+        if self.lines_assigned_flag:
+            self.move_attached_lines(indices) #lines follow the nodes they are attached to
+
+    #public tools to append and remove nodes, a node keeps its index for as long as it exists, as the indices of removed nodes are not reused
+
+    #append nodes after the existing nodes and return their indices, only the new nodes are stored, indexed and drawn
+    def append_nodes(self,nodes_x_coords,nodes_y_coords,nodes_radii,nodes_colours,nodes_names):
+        if self.check_append_values('node',nodes_x_coords,nodes_y_coords,nodes_radii,nodes_colours,nodes_names)==False or len(nodes_x_coords)==0:
+            return []
+        first = self.num_nodes
+        pixels_needed = self.appended_pixel_coordinates_needed(self.nodes_x,self.num_nodes)
+        nodes_x_coords = self.make_float_storage(nodes_x_coords)
+        nodes_y_coords = self.make_float_storage(nodes_y_coords)
+        nodes_x_projected,nodes_y_projected = self.project_storage(nodes_x_coords,nodes_y_coords)
+        self.nodes_x_coords = self.append_storage(self.nodes_x_coords,nodes_x_coords)
+        self.nodes_y_coords = self.append_storage(self.nodes_y_coords,nodes_y_coords)
+        self.nodes_x_projected = self.append_storage(self.nodes_x_projected,nodes_x_projected)
+        self.nodes_y_projected = self.append_storage(self.nodes_y_projected,nodes_y_projected)
+        self.nodes_radii = self.append_storage(self.nodes_radii,nodes_radii)
+        self.nodes_colours = self.append_list(self.nodes_colours,nodes_colours)
+        self.nodes_names = self.append_list(self.nodes_names,nodes_names)
+        self.num_nodes += len(nodes_x_coords)
+        if pixels_needed:
+            nodes_x,nodes_y = self.convert_projected_storage_to_pixels(nodes_x_projected,nodes_y_projected)
+            self.nodes_x = self.append_storage(self.nodes_x,nodes_x)
+            self.nodes_y = self.append_storage(self.nodes_y,nodes_y)
+            for view in self.model.views:
+                view.node_canvas_ids = view.append_canvas_ids(view.node_canvas_ids,first,self.num_nodes)
+                if view.heatmap_pyramid is not None and view.heatmap_pyramid.needs_rebuild(self.num_nodes):
+                    view.heatmap_pyramid = None #built again when the heatmap is next drawn
+            self.mark_dirty('nodes_dirty_geometry',range(first,self.num_nodes)) #drawn on the next render
+            self.update_heatmap_pyramids(range(first,self.num_nodes),nodes_x,nodes_y)
+        points_x = self.storage_to_list(nodes_x_coords)
+        points_y = self.storage_to_list(nodes_y_coords)
+        self.nodes_index = self.grow_spatial_grid(self.nodes_index,'nodes_index',self.nodes_removed,(points_x,points_y,points_x,points_y),
+                                                  lambda:(self.nodes_x_coords,self.nodes_y_coords,self.nodes_x_coords,self.nodes_y_coords))
+        self.nodes_max_radius = max(self.nodes_max_radius,max(nodes_radii))
+        if self.level_of_detail:
+            clusters = self.nodes_clusters
+            self.nodes_clusters = self.grow_node_clusters(clusters,'nodes_clusters',self.nodes_removed,self.nodes_x_coords,self.nodes_y_coords,first)
+            if self.nodes_clusters is not clusters:
+                for view in self.model.views:
+                    view.node_cluster_level = 'stale' #forces the rebuilt clusters to be drawn
+        self.grow_objects_bounding_box('nodes',max(points_y),min(points_y),max(points_x),min(points_x))
+        self.nodes_assigned_flag = True
+        self.schedule_render()
+        return list(range(first,self.num_nodes))
+
+    #remove the nodes at the given indices, along with the lines attached to them, only the canvas items of the removed objects are deleted
+    def remove_nodes(self,indices):
+        indices = sorted(set(indices))
+        if self.check_update_indices('node',self.num_nodes,indices,removed=self.nodes_removed)==False or len(indices)==0:
+            return
+        if self.lines_assigned_flag: #lines attached to a removed node would be left hanging
+            self.remove_lines(sorted(set(line for i in indices for line in self.get_node_lines(i))))
+        points_x = self.get_storage_subset(self.nodes_x_coords,indices)
+        points_y = self.get_storage_subset(self.nodes_y_coords,indices)
+        for i,x,y in zip(indices,points_x,points_y):
+            self.nodes_index.delete_item(i)
+            if self.nodes_clusters is not None:
+                self.nodes_clusters.remove_point(i,x,y,self.nodes_x_coords,self.nodes_y_coords)
+        self.nodes_removed.update(indices)
+        for view in self.model.views:
+            view.release_removed_objects('nodes',indices,view.node_canvas_ids,view.nodes_rendered)
+        self.shrink_objects_bounding_box('nodes',max(points_y),min(points_y),max(points_x),min(points_x))
+        if self.pixel_coordinates_calculated(self.nodes_x,self.num_nodes):
+            self.mark_dirty('nodes_dirty_geometry',indices) #labels and clusters of the removed nodes are redrawn on the next render
+            self.update_heatmap_pyramids(indices,self.get_storage_subset(self.nodes_x,indices),self.get_storage_subset(self.nodes_y,indices),-1)
+        self.schedule_render()
+
+    #build a spatial index of the nodes in global coordinates
+    def build_nodes_index(self):
+        self.nodes_index = self.build_spatial_grid('nodes_index',self.nodes_x_coords,self.nodes_y_coords,self.nodes_x_coords,self.nodes_y_coords)
+        self.nodes_max_radius = self.get_storage_max_min(self.nodes_radii)[0] if self.num_nodes>0 else 0 #nodes are drawn up to this far from their centre
+        if self.level_of_detail:
+            self.nodes_clusters = self.build_node_clusters('nodes_clusters',self.nodes_x_coords,self.nodes_y_coords)
+
     #find and return the most extreme coordinates found in the list of nodes
     def get_extreme_nodes(self):
-        extreme_north = max(self.nodes_y_coords) #northernmost node has largest y coordinate
-        extreme_south = min(self.nodes_y_coords) #southernmost node has smallest y coordinate
-        extreme_east = max(self.nodes_x_coords) #easternmost point has smallest x coordinate
-        extreme_west = min(self.nodes_x_coords) #westernmost point has largest x coordinate
+        extreme_north,extreme_south = self.get_storage_max_min(self.get_live_storage(self.nodes_y_coords,self.nodes_removed)) #northernmost node has largest y coordinate, southernmost node has smallest y coordinate
+        extreme_east,extreme_west = self.get_storage_max_min(self.get_live_storage(self.nodes_x_coords,self.nodes_removed)) #easternmost point has largest x coordinate, westernmost point has smallest x coordinate
         return extreme_north,extreme_south,extreme_east,extreme_west
 
     #calculate node positions in unzoomed pixel coordinates
     def calculate_node_pixel_coordinates(self):
-        for i in range(self.num_nodes): #go through each node
-            node_x,node_y = self.convert_coords_to_pixels(self.nodes_x_coords[i],self.nodes_y_coords[i]) #calculate the position in unzoomed pixel coordinates of each node
-            #append this info to existing coordinate lists
-            self.nodes_x.append(node_x)
-            self.nodes_y.append(node_y)
-        #make a copy of pixel position to store the original position before zooming
-        self.nodes_x_original = self.nodes_x
-        self.nodes_y_original = self.nodes_y    
-        self.node_canvas_ids = ['blank']*self.num_nodes #canvas ids for the nodes themsleves
+        if self.storage_mode=='array':
+            self.nodes_x,self.nodes_y = self.convert_projected_to_pixels(self.nodes_x_projected,self.nodes_y_projected) #convert all the nodes at once
+        else:
+            self.nodes_x = [] #clear any positions from a previous calculation
+            self.nodes_y = []
+            for i in range(self.num_nodes): #go through each node
+                node_x,node_y = self.convert_projected_to_pixels(self.nodes_x_projected[i],self.nodes_y_projected[i]) #calculate the position in unzoomed pixel coordinates of each node
+                #append this info to existing coordinate lists
+                self.nodes_x.append(node_x)
+                self.nodes_y.append(node_y)
+        self.nodes_pixels_generation += 1
     
 
-    def recalculate_zoom_position(self,zoom_delta,mouse_x,mouse_y,x,y):
-        #zoom in, keeping the mouse at the same position of the screen
-        new_x = x*(1+zoom_delta)-(mouse_x*zoom_delta) #do this for x
-        new_y = y*(1+zoom_delta)-(mouse_y*zoom_delta) #and y
-        return new_x,new_y
-
-    #recalculate the pixel position of a list of points after a zoom event
-    def recalculate_list_zoom_positions(self,zoom_delta,mouse_x,mouse_y,length_list,list_x,list_y):
-        new_list_x = [] #empty list to store new x positions
-        new_list_y = [] #empty list to store new y positions
-        for i in range(length_list): #go through the whole of both lists (which must be the same length)
-            new_x,new_y = self.recalculate_zoom_position(zoom_delta,mouse_x,mouse_y,list_x[i],list_y[i]) #for each entry in the list, calculate the zoomed x and y position
-            new_list_x.append(new_x) #store the new x position
-            new_list_y.append(new_y) #store the new y position
-        return new_list_x,new_list_y
-
-    #like recalculate_list_zoom_positions, but operates on lists of lists (useful for compound lines)
-    def recalculate_list_of_list_zoom_positions(self,zoom_delta,mouse_x,mouse_y,length_list,list_x,list_y):
-        new_list_x = [] #empty list of lists to store new x positions
-        new_list_y = [] #empty list of lists to store new y positions
-        for i in range(length_list): #go through the whole of both lists of lists (which must have the same number of lists)
-            sublist_x = list_x[i] #extract the sublist in the x dimension
-            sublist_y = list_y[i] #extract the sublist in the y dimension
-            sublist_length = len(sublist_x) #length of the sublist
-            new_sublist_x,new_sublist_y = self.recalculate_list_zoom_positions(zoom_delta,mouse_x,mouse_y,sublist_length,sublist_x,sublist_y) #for each sublist, calculate zoomed positions
-            new_list_x.append(new_sublist_x) #add the sublists to the whole list
-            new_list_y.append(new_sublist_y)
-        return new_list_x,new_list_y 
-
-    #apply zoom to nodes
-    def apply_zoom_nodes(self,zoom_delta,mouse_x,mouse_y):
-        #update the positions of the nodes
-        self.nodes_x,self.nodes_y = self.recalculate_list_zoom_positions(zoom_delta,mouse_x,mouse_y,self.num_nodes,self.nodes_x,self.nodes_y)
-        self.render_nodes() #rerender the nodes
+    #bring the nodes on the canvas up to date with the current view
+    def apply_zoom_nodes(self):
+        if self.nodes_rendered_view is not None and self.nodes_rendered_view.zoom==self.view.zoom: #only panned, so the nodes can be moved together
+            scale,shift_x,shift_y = self.get_view_change(self.nodes_rendered_view)
+            self.transform_canvas_items(self.nodes_tag,1,shift_x,shift_y)
+            self.render_nodes(new_only=True) #then add nodes which have come into view and remove those which have left
+        else:
+            self.render_nodes() #rerender the nodes, their radius does not change with zoom so each must be moved
 
     #private tools for operating on pie_nodes
     
-    #create containers to store pie chart nodes
+    #create containers for the canvas items of the pie chart nodes drawn on the map, the pie nodes themselves are stored in the model of the map
     def init_pie_nodes(self):
-        #pie nodes, these are filled circles representing a pie chart, created using tk arc objects
-        self.num_pie_nodes = 0 #number of pie nodes stored
-        self.pie_node_info_type = 'none' #type of info stored
-        self.pie_node_info_name = 'none' #name of info stored
-        self.pie_node_info_subtypes_names = [] #list of all types of info displayed, in order
-        #arrays of pie_node properties
-        self.pie_nodes_x_coords = [] #horizontal position in global coordinates of the centre of the pie node
-        self.pie_nodes_y_coords = [] #vertical position in global coordinates of the centre of the pie node
-        self.pie_nodes_x = [] #horizontal position in pixel coordinates of the centre of the pie node
-        self.pie_nodes_y = [] #vertical position in pixel coordinates of the centre of the pie node
-        self.pie_nodes_x_original = [] #copy of self.pie_nodes_x without zoom applied
-        self.pie_nodes_y_original = [] #copy of self.pie_nodes_y without zoom applied
-        self.pie_nodes_radii = []  #radius of the pie_node, pixels
-        self.pie_nodes_colours = [] #colour of the pie_nodes, list of lists
-        self.pie_nodes_colour_lengths = [] #length of each of the pie_nodes colour section, list of lists
-        self.pie_nodes_name = [] #name of the each node
-        self.pie_node_infos = [] #additional info about each pie_node, list of lists with one subentry for each pie slice 
-        self.pie_node_canvas_ids = [] #id of the arc objects that make up the pie_nodes, as a list of lists
-        #flags
-        self.pie_nodes_assigned_flag = False #have pie nodes been stored yet
+        self.pie_node_canvas_ids = [] #id of the arc objects that make up the pie_nodes, as a list of lists, 'blank' if the pie node is not drawn
+        self.pie_nodes_rendered = set() #indices of the pie nodes which currently have canvas items
+        self.pie_node_cluster_canvas_ids = {} #id of the canvas item of each cluster drawn at the current level of detail
+        self.pie_node_cluster_level = None #level of detail currently drawn, None if individual pie nodes are drawn
+        self.pie_nodes_rendered_view = None #view in which the pie nodes on the canvas were drawn
+        self.pie_nodes_style_changed_flag = False #do existing canvas items need their slices updated on the next render
+        self.pie_nodes_dirty_slices = {} #slices which have changed since the last render of each changed pie node, None if the number of slices changed
+        self.pie_nodes_dirty_geometry = set() #indices of pie nodes which have been appended or removed since the last render
+
+    #render the pie nodes which are visible on the screen, each slice is an arc item which is created once and then only moved or re-angled
+    #if new_only is True, pie nodes which already have canvas items are assumed to be in the right place and only newly visible pie nodes are drawn
+    def render_pie_nodes(self,new_only=False):
+        if self.num_pie_nodes==0:
+            return
+        level = self.get_detail_level(self.pie_nodes_clusters,'pie_nodes')
+        if level!=self.pie_node_cluster_level: #clusters from a different level of detail must be replaced
+            self.map.delete(self.pie_node_clusters_tag)
+            self.pie_node_cluster_canvas_ids = {}
+            self.pie_node_cluster_level = level
+        if level is not None: #zoomed out far enough to draw clusters rather than individual pie nodes
+            self.pie_nodes_rendered = self.cull_canvas_items(self.pie_node_canvas_ids,self.pie_nodes_rendered,[])
+            self.pie_node_cluster_canvas_ids = self.render_clusters(self.pie_nodes_clusters,level,self.pie_node_cluster_canvas_ids,(self.pie_nodes_tag,self.pie_node_clusters_tag),'grey',self.pie_nodes_max_radius,new_only)
+            self.pie_nodes_rendered_view = self.view.copy()
+            return
+        visible = self.get_visible_objects(self.pie_nodes_index,self.num_pie_nodes,self.pie_nodes_max_radius,'pie_nodes')
+        self.pie_nodes_rendered = self.cull_canvas_items(self.pie_node_canvas_ids,self.pie_nodes_rendered,visible)
+        if new_only:
+            visible = [i for i in visible if self.pie_node_canvas_ids[i]=='blank']
+        pie_nodes_x,pie_nodes_y = self.get_screen_positions(self.pie_nodes_x,self.pie_nodes_y,visible)
+        pie_nodes_radii = self.get_storage_subset(self.pie_nodes_radii,visible)
+        created = False #have we created any new canvas items
+        for j,i in enumerate(visible):
+            x = pie_nodes_x[j]
+            y = pie_nodes_y[j]
+            radius = pie_nodes_radii[j]
+            ids = self.pie_node_canvas_ids[i]
+            if ids!='blank' and self.pie_nodes_style_changed_flag and len(ids)!=len(self.pie_nodes_slice_extents[i]): #reused items have the wrong number of slices
+                self.delete_canvas_item(ids)
+                ids = 'blank'
+            if ids=='blank':
+                self.pie_node_canvas_ids[i] = self.create_pie_node_arcs(i,x,y,radius)
+                created = True
+            else:
+                #move the existing arcs rather than deleting and recreating them, every slice shares the same bounding box
+                for id in ids:
+                    self.map.coords(id,x-radius,y-radius,x+radius,y+radius)
+                if self.pie_nodes_style_changed_flag:
+                    self.configure_pie_node_arcs(i,range(len(ids)))
+        if new_only==False:
+            self.pie_nodes_style_changed_flag = False #all canvas items now have the correct style
+        self.pie_nodes_rendered_view = self.view.copy()
+        if created:
+            self.restore_z_order()
+
+    #draw the slices of a pie node as arcs, returning the list of their canvas ids
+    def create_pie_node_arcs(self,pie_node,x,y,radius):
+        starts = self.pie_nodes_slice_starts[pie_node]
+        extents = self.pie_nodes_slice_extents[pie_node]
+        colours = self.pie_nodes_colours[pie_node]
+        tags = self.get_item_tags('pie_nodes',pie_node,self.pie_nodes_tag)
+        return [self.map.create_arc(x-radius,y-radius,x+radius,y+radius,start=starts[k],extent=extents[k],fill=colours[k],outline='',style='pieslice',tags=tags) for k in range(len(extents))]
+
+    #set the angles and colours of some of the existing arcs of a pie node
+    def configure_pie_node_arcs(self,pie_node,slices):
+        ids = self.pie_node_canvas_ids[pie_node]
+        starts = self.pie_nodes_slice_starts[pie_node]
+        extents = self.pie_nodes_slice_extents[pie_node]
+        colours = self.pie_nodes_colours[pie_node]
+        for k in slices:
+            self.map.itemconfigure(ids[k],start=starts[k],extent=extents[k],fill=colours[k])
+
+    #draw the pie nodes changed by the update methods since the last render, only the arcs of slices which have changed are touched
+    def render_dirty_pie_nodes(self):
+        if len(self.pie_nodes_dirty_slices)==0 and len(self.pie_nodes_dirty_geometry)==0:
+            return
+        created = False #have we created any new canvas items
+        for i,changed_slices in self.pie_nodes_dirty_slices.items():
+            ids = self.pie_node_canvas_ids[i]
+            if ids=='blank': #not on the canvas, the pie node will be drawn with its new slices when it comes into view
+                continue
+            if changed_slices is None: #the number of slices has changed, so the arcs must be replaced
+                self.delete_canvas_item(ids)
+                x,y = self.view.apply(self.pie_nodes_x[i],self.pie_nodes_y[i])
+                self.pie_node_canvas_ids[i] = self.create_pie_node_arcs(i,x,y,self.pie_nodes_radii[i])
+                created = True
+            else:
+                self.configure_pie_node_arcs(i,changed_slices)
+        self.pie_nodes_dirty_slices = {}
+        if created:
+            self.restore_z_order()
+        if len(self.pie_nodes_dirty_geometry)>0: #pie nodes have been appended or removed
+            if self.pie_node_cluster_level is not None: #clusters are drawn, there are few enough of them to redraw them all
+                self.render_pie_nodes()
+            else:
+                self.render_pie_nodes(new_only=True)
+            self.pie_nodes_dirty_geometry = set()
 
-    #render the pie nodes PLACEHOLDER
-    def render_pie_nodes(self):
-        pass
+    #calculate the start and extent angles (in degrees) of the slices of a pie node from the lengths of its colour sections
+    #slices start at the top of the pie node and run anticlockwise
+    def calculate_pie_node_slice_angles(self,colours_lengths):
+        total = sum(colours_lengths)
+        starts = []
+        extents = []
+        start = 90.0
+        for length in colours_lengths:
+            extent = 360.0*length/total if total>0 else 0.0
+            starts.append(start%360)
+            extents.append(min(extent,359.999)) #tk draws nothing for an arc with an extent of exactly 360 degrees
+            start += extent
+        return starts,extents
+
+    #public tools to update existing pie nodes, the changes are drawn on the next render touching only the arcs of slices which have changed
+
+    #change the colour section lengths, and optionally the colours, of the pie nodes at the given indices
+    def update_pie_nodes_slices(self,indices,pie_nodes_colours_lengths,pie_nodes_colours=None):
+        if pie_nodes_colours is None:
+            pie_nodes_colours = [self.pie_nodes_colours[i] for i in indices]
+        if self.check_update_indices('pie node',self.num_pie_nodes,indices,pie_nodes_colours_lengths,pie_nodes_colours,removed=self.pie_nodes_removed)==False:
+            return
+        for i,colours_lengths,colours in zip(indices,pie_nodes_colours_lengths,pie_nodes_colours):
+            old_starts = self.pie_nodes_slice_starts[i]
+            old_extents = self.pie_nodes_slice_extents[i]
+            old_colours = self.pie_nodes_colours[i]
+            starts,extents = self.calculate_pie_node_slice_angles(colours_lengths)
+            self.pie_nodes_colours_lengths[i] = list(colours_lengths)
+            self.pie_nodes_colours[i] = list(colours)
+            self.pie_nodes_slice_starts[i] = starts
+            self.pie_nodes_slice_extents[i] = extents
+            if len(extents)!=len(old_extents):
+                changed_slices = None #the arcs must be replaced
+            else:
+                changed_slices = [k for k in range(len(extents)) if starts[k]!=old_starts[k] or extents[k]!=old_extents[k] or colours[k]!=old_colours[k]]
+                if len(changed_slices)==0:
+                    continue
+            for view in self.model.views:
+                if changed_slices is None or i in view.pie_nodes_dirty_slices and view.pie_nodes_dirty_slices[i] is None:
+                    view.pie_nodes_dirty_slices[i] = None
+                else:
+                    view.pie_nodes_dirty_slices[i] = sorted(set(view.pie_nodes_dirty_slices.get(i,[])).union(changed_slices))
+        for view in self.model.views:
+            view.schedule_render()
+
+    #public tools to append and remove pie nodes, a pie node keeps its index for as long as it exists, as the indices of removed pie nodes are not reused
+
+    #append pie nodes after the existing pie nodes and return their indices, only the new pie nodes are stored, indexed and drawn
+    def append_pie_nodes(self,pie_nodes_x_coords,pie_nodes_y_coords,pie_nodes_radii,pie_nodes_colours,pie_nodes_colours_lengths,pie_nodes_names):
+        if self.check_append_values('pie node',pie_nodes_x_coords,pie_nodes_y_coords,pie_nodes_radii,pie_nodes_colours,pie_nodes_colours_lengths,pie_nodes_names)==False or len(pie_nodes_x_coords)==0:
+            return []
+        first = self.num_pie_nodes
+        pixels_needed = self.appended_pixel_coordinates_needed(self.pie_nodes_x,self.num_pie_nodes)
+        pie_nodes_x_coords = self.make_float_storage(pie_nodes_x_coords)
+        pie_nodes_y_coords = self.make_float_storage(pie_nodes_y_coords)
+        pie_nodes_x_projected,pie_nodes_y_projected = self.project_storage(pie_nodes_x_coords,pie_nodes_y_coords)
+        self.pie_nodes_x_coords = self.append_storage(self.pie_nodes_x_coords,pie_nodes_x_coords)
+        self.pie_nodes_y_coords = self.append_storage(self.pie_nodes_y_coords,pie_nodes_y_coords)
+        self.pie_nodes_x_projected = self.append_storage(self.pie_nodes_x_projected,pie_nodes_x_projected)
+        self.pie_nodes_y_projected = self.append_storage(self.pie_nodes_y_projected,pie_nodes_y_projected)
+        self.pie_nodes_radii = self.append_storage(self.pie_nodes_radii,pie_nodes_radii)
+        self.pie_nodes_colours = self.append_list(self.pie_nodes_colours,[list(colours) for colours in pie_nodes_colours])
+        self.pie_nodes_colours_lengths = self.append_list(self.pie_nodes_colours_lengths,[list(colours_lengths) for colours_lengths in pie_nodes_colours_lengths])
+        slice_angles = [self.calculate_pie_node_slice_angles(colours_lengths) for colours_lengths in pie_nodes_colours_lengths]
+        self.pie_nodes_slice_starts = self.append_list(self.pie_nodes_slice_starts,[starts for starts,extents in slice_angles])
+        self.pie_nodes_slice_extents = self.append_list(self.pie_nodes_slice_extents,[extents for starts,extents in slice_angles])
+        self.pie_nodes_names = self.append_list(self.pie_nodes_names,pie_nodes_names)
+        self.num_pie_nodes += len(pie_nodes_x_coords)
+        if pixels_needed:
+            pie_nodes_x,pie_nodes_y = self.convert_projected_storage_to_pixels(pie_nodes_x_projected,pie_nodes_y_projected)
+            self.pie_nodes_x = self.append_storage(self.pie_nodes_x,pie_nodes_x)
+            self.pie_nodes_y = self.append_storage(self.pie_nodes_y,pie_nodes_y)
+            for view in self.model.views:
+                view.pie_node_canvas_ids = view.append_canvas_ids(view.pie_node_canvas_ids,first,self.num_pie_nodes)
+            self.mark_dirty('pie_nodes_dirty_geometry',range(first,self.num_pie_nodes)) #drawn on the next render
+        points_x = self.storage_to_list(pie_nodes_x_coords)
+        points_y = self.storage_to_list(pie_nodes_y_coords)
+        self.pie_nodes_index = self.grow_spatial_grid(self.pie_nodes_index,'pie_nodes_index',self.pie_nodes_removed,(points_x,points_y,points_x,points_y),
+                                                      lambda:(self.pie_nodes_x_coords,self.pie_nodes_y_coords,self.pie_nodes_x_coords,self.pie_nodes_y_coords))
+        self.pie_nodes_max_radius = max(self.pie_nodes_max_radius,max(pie_nodes_radii))
+        if self.level_of_detail:
+            clusters = self.pie_nodes_clusters
+            self.pie_nodes_clusters = self.grow_node_clusters(clusters,'pie_nodes_clusters',self.pie_nodes_removed,self.pie_nodes_x_coords,self.pie_nodes_y_coords,first)
+            if self.pie_nodes_clusters is not clusters:
+                for view in self.model.views:
+                    view.pie_node_cluster_level = 'stale' #forces the rebuilt clusters to be drawn
+        self.grow_objects_bounding_box('pie_nodes',max(points_y),min(points_y),max(points_x),min(points_x))
+        self.pie_nodes_assigned_flag = True
+        self.schedule_render()
+        return list(range(first,self.num_pie_nodes))
+
+    #remove the pie nodes at the given indices, only the canvas items of the removed pie nodes are deleted
+    def remove_pie_nodes(self,indices):
+        indices = sorted(set(indices))
+        if self.check_update_indices('pie node',self.num_pie_nodes,indices,removed=self.pie_nodes_removed)==False or len(indices)==0:
+            return
+        points_x = self.get_storage_subset(self.pie_nodes_x_coords,indices)
+        points_y = self.get_storage_subset(self.pie_nodes_y_coords,indices)
+        for i,x,y in zip(indices,points_x,points_y):
+            self.pie_nodes_index.delete_item(i)
+            if self.pie_nodes_clusters is not None:
+                self.pie_nodes_clusters.remove_point(i,x,y,self.pie_nodes_x_coords,self.pie_nodes_y_coords)
+        self.pie_nodes_removed.update(indices)
+        for view in self.model.views:
+            for i in indices:
+                view.pie_nodes_dirty_slices.pop(i,None)
+            view.release_removed_objects('pie_nodes',indices,view.pie_node_canvas_ids,view.pie_nodes_rendered)
+        self.shrink_objects_bounding_box('pie_nodes',max(points_y),min(points_y),max(points_x),min(points_x))
+        if self.pixel_coordinates_calculated(self.pie_nodes_x,self.num_pie_nodes):
+            self.mark_dirty('pie_nodes_dirty_geometry',indices) #labels and clusters of the removed pie nodes are redrawn on the next render
+        self.schedule_render()
+
+    #get the canvas items of the pie nodes ready to be reused by new pie nodes replacing them
+    def reset_pie_nodes_view(self):
+        self.clear_groups_of_type('pie_nodes') #groups hold the old objects, whose canvas items will be reused
+        pie_node_canvas_ids = self.pie_node_canvas_ids #keep the existing canvas items so they can be reused by the new pie nodes
+        pie_nodes_rendered = self.pie_nodes_rendered
+        self.map.delete(self.pie_node_clusters_tag) #clusters of the old pie nodes are no longer valid
+        self.init_pie_nodes()
+        self.pie_node_canvas_ids = pie_node_canvas_ids
+        self.pie_nodes_rendered = pie_nodes_rendered
+        self.pie_nodes_style_changed_flag = True #reused canvas items must take on the slices of the new pie nodes
 
     #create new pie nodes and replace the existing pie nodes
     def create_pie_nodes(self,pie_nodes_x_coords,pie_nodes_y_coords,pie_nodes_radii,pie_nodes_colours,pie_nodes_colours_lengths,pie_nodes_names,info_type='none',info_name='none',info_subtype_names=[],pie_nodes_infos=[]):
-        self.init_pie_nodes() #remove the storage of the existing nodes
+        for view in self.model.views: #every map drawing the pie nodes reuses their canvas items for the new pie nodes
+            view.reset_pie_nodes_view()
+        self.model.init_pie_nodes() #remove the storage of the existing nodes
         self.num_pie_nodes = len(pie_nodes_x_coords) #get the number of pie nodes
         self.assign_pie_nodes_positions(pie_nodes_x_coords,pie_nodes_y_coords)  #assign the position of the new pie nodes
         self.assign_pie_nodes_radii(pie_nodes_radii) #assign the pie nodes radii
@@ -356,28 +2641,43 @@ class ZoomMap:
         self.assign_pie_nodes_colours_lengths(pie_nodes_colours_lengths) #assign the length of each colour segments
         self.assign_pie_nodes_names(pie_nodes_names) #assign the pie nodes names
         self.assign_pie_nodes_info(info_type,info_name,info_subtype_names,pie_nodes_infos) #assign info to the pie nodes
+        self.pie_nodes_index = self.build_spatial_grid('pie_nodes_index',self.pie_nodes_x_coords,self.pie_nodes_y_coords,self.pie_nodes_x_coords,self.pie_nodes_y_coords) #index the pie nodes so we can quickly find those on screen
+        self.pie_nodes_max_radius = self.get_storage_max_min(self.pie_nodes_radii)[0] if self.num_pie_nodes>0 else 0 #pie nodes are drawn up to this far from their centre
+        if self.level_of_detail:
+            self.pie_nodes_clusters = self.build_node_clusters('pie_nodes_clusters',self.pie_nodes_x_coords,self.pie_nodes_y_coords)
         self.pie_nodes_assigned_flag = True  
 
     #assign the pie nodes new x/y coordinates in the global coordinate frame
     def assign_pie_nodes_positions(self,pie_nodes_x_coords,pie_nodes_y_coords):
-        self.pie_nodes_x_coords = pie_nodes_x_coords
-        self.pie_nodes_y_coords = pie_nodes_y_coords
+        self.pie_nodes_x_coords = self.make_float_storage(pie_nodes_x_coords)
+        self.pie_nodes_y_coords = self.make_float_storage(pie_nodes_y_coords)
+        self.project_pie_nodes()
+
+    #project the positions of all the pie nodes at once
+    def project_pie_nodes(self):
+        self.pie_nodes_x_projected,self.pie_nodes_y_projected = self.project_storage(self.pie_nodes_x_coords,self.pie_nodes_y_coords)
 
     #assign the pie nodes new radii
     def assign_pie_nodes_radii(self,pie_nodes_radii):
-        self.pie_nodes_radii = pie_nodes_radii
+        self.pie_nodes_radii = self.make_float_storage(pie_nodes_radii)
 
     #assign the pie nodes new colours
     def assign_pie_nodes_colours(self,pie_nodes_colours):
-        self.pie_nodes_colours = pie_nodes_colours
+        self.pie_nodes_colours = [list(colours) for colours in pie_nodes_colours] #copied so updates do not change the caller's lists
 
-    #assign the length of the colour segment of each pie node
-    def assign_pie_nodes_colours(self,pie_nodes_colours_lengths):
-        self.pie_nodes_colours_lengths = pie_nodes_colours_lengths
+    #assign the length of the colour segment of each pie node, and calculate the angles of the slices they make up
+    def assign_pie_nodes_colours_lengths(self,pie_nodes_colours_lengths):
+        self.pie_nodes_colours_lengths = [list(colours_lengths) for colours_lengths in pie_nodes_colours_lengths]
+        self.pie_nodes_slice_starts = []
+        self.pie_nodes_slice_extents = []
+        for colours_lengths in self.pie_nodes_colours_lengths:
+            starts,extents = self.calculate_pie_node_slice_angles(colours_lengths)
+            self.pie_nodes_slice_starts.append(starts)
+            self.pie_nodes_slice_extents.append(extents)
 
     #assign the nodes new names
     def assign_pie_nodes_names(self,pie_nodes_names):
-        self.pie_nodes_names = pie_nodes_names
+        self.pie_nodes_names = list(pie_nodes_names) #copied so appending pie nodes does not change the caller's list
 
     #assign info about the nodes
     def assign_pie_nodes_info(self,info_type,info_name,info_subtype_names,pie_nodes_info):
@@ -395,83 +2695,112 @@ class ZoomMap:
 
     #find and return the most extreme coordinates found in the list of nodes
     def get_extreme_pie_nodes(self):
-        extreme_north = max(self.pie_nodes_y_coords) #northernmost node has largest y coordinate
-        extreme_south = min(self.pie_nodes_y_coords) #southernmost node has smallest y coordinate
-        extreme_east = max(self.pie_nodes_x_coords) #easternmost point has smallest x coordinate
-        extreme_west = min(self.pie_nodes_x_coords) #westernmost point has largest x coordinate
+        extreme_north,extreme_south = self.get_storage_max_min(self.get_live_storage(self.pie_nodes_y_coords,self.pie_nodes_removed)) #northernmost node has largest y coordinate, southernmost node has smallest y coordinate
+        extreme_east,extreme_west = self.get_storage_max_min(self.get_live_storage(self.pie_nodes_x_coords,self.pie_nodes_removed)) #easternmost point has largest x coordinate, westernmost point has smallest x coordinate
         return extreme_north,extreme_south,extreme_east,extreme_west
 
+    #calculate pie node positions in unzoomed pixel coordinates
+    def calculate_pie_nodes_pixel_coordinates(self):
+        if self.storage_mode=='array':
+            self.pie_nodes_x,self.pie_nodes_y = self.convert_projected_to_pixels(self.pie_nodes_x_projected,self.pie_nodes_y_projected) #convert all the pie nodes at once
+        else:
+            self.pie_nodes_x = [] #clear any positions from a previous calculation
+            self.pie_nodes_y = []
+            for i in range(self.num_pie_nodes): #go through each pie node
+                pie_node_x,pie_node_y = self.convert_projected_to_pixels(self.pie_nodes_x_projected[i],self.pie_nodes_y_projected[i]) #calculate the position in unzoomed pixel coordinates of each pie node
+                self.pie_nodes_x.append(pie_node_x)
+                self.pie_nodes_y.append(pie_node_y)
+
     #apply zoom to pie nodes
-    def apply_zoom_pie_nodes(self,zoom_delta,mouse_x,mouse_y):
-        self.pie_nodes_x,self.pie_nodes_y = self.recalculate_list_zoom_positions(zoom_delta,mouse_x,mouse_y,self.num_pie_nodes,self.pie_nodes_x,self.pie_nodes_y)
-        self.render_pie_nodes() #once we have applied the zoom, render the pie nodes
+    def apply_zoom_pie_nodes(self):
+        if self.pie_nodes_rendered_view is not None and self.pie_nodes_rendered_view.zoom==self.view.zoom: #only panned, so the pie nodes can be moved together
+            scale,shift_x,shift_y = self.get_view_change(self.pie_nodes_rendered_view)
+            self.transform_canvas_items(self.pie_nodes_tag,1,shift_x,shift_y)
+            self.render_pie_nodes(new_only=True)
+        else:
+            self.render_pie_nodes() #once we have applied the zoom, render the pie nodes
 
     #private tools for operating on lines
 
-    #create containers to store lines
+    #create containers for the canvas items of the lines drawn on the map, the lines themselves are stored in the model of the map
     def init_lines(self):
-        #lines, these are well, lines
-        self.num_lines = 0 #number of lines stored
-        self.line_info_name = 'none' #name of the info stored with the lines
-        self.line_info_type = 'none' #type of the info stored with the lines
-        #arrays of line properties
-        #relating to nodes
-        self.lines_start_node_type = [] #what type of node is at the start of the line (valid are 'none','node' and 'pie')
-        self.lines_start_node_index = [] #index of the starting node, if it exists
-        self.lines_start_node_type = [] #what type of node is at the end of the line (valid are 'none','node' and 'pie')
-        self.lines_start_node_index= [] #index of the ending node, if it exists
-        #global coordinate arrays
-        self.lines_start_x_coord = [] #horizontal position in global coordinates of the start of the line
-        self.lines_start_y_coord = [] #vertical position in global coordinates of the start of the line
-        self.lines_end_x_coord = [] #horizontal position in global coordinates of the end of the line
-        self.lines_end_y_coord = [] #vertical position in global coordinates of the end of the line
-        self.lines_midpoint_x_coord = [] #horizontal midpoint in global coordinates of the line, used for text display
-        self.lines_midpoint_y_coord = [] #vertical midpoint in global coordinates of the line, used for text display
-        #pixel coordinate arrays
-        self.lines_start_x = [] #horizontal position in pixel coordinates of the start of the line
-        self.lines_start_y = [] #vertical position in pixel coordinates of the start of the line
-        self.lines_end_x = [] #horizontal position in pixel coordinates of the end of the line
-        self.lines_end_y = [] #vertical position in pixel coordinates of the end of the line
-        self.lines_midpoint_x = [] #horizontal midpoint in pixel coordinates of the line, used for text display
-        self.lines_midpoint_y = [] #vertical midpoint in pixel coordinates of the line, used for text display
-        #copy of pixel coordinate arrays before zoom has been applied
-        self.lines_start_x_original = []
-        self.lines_start_y_original = []
-        self.lines_end_x_original = []
-        self.lines_end_y_original = []
-        self.lines_midpoint_x_original = [] 
-        self.lines_midpoint_y_original = []
-        #other line properties 
-        self.lines_width = [] #width of the line, pixels
-        self.lines_colour = [] #colour of the line
-        self.lines_name = [] #name of all the lines
-        self.lines_info = [] #info about all the lines
-        self.lines_canvas_ids = [] #id of the line, so we can delete it later
-        #flags
-        self.lines_assigned_flag = False #have lines been stored yet
+        self.lines_canvas_ids = [] #id of the line, so we can move or delete it later
+        self.lines_rendered = set() #indices of the lines which currently have a canvas item
+        self.lines_rendered_view = None #view in which the lines on the canvas were drawn
+        self.lines_style_changed_flag = False #do existing canvas items need their colour and width updated on the next render
+        self.lines_dirty_style = set() #indices of lines whose colour or width has changed since the last render
+        self.lines_dirty_geometry = set() #indices of lines whose position has changed since the last render, or which have been appended or removed
 
-    #render the lines PLACEHOLDER
-    def render_lines(self):
-        for i in range(self.num_lines): #go through all the lines
+    #render the lines which are visible on the screen, deleting the canvas items of lines which have left the screen
+    #if new_only is True, lines which already have a canvas item are assumed to be in the right place and only newly visible lines are drawn
+    def render_lines(self,new_only=False):
+        if self.num_lines==0:
+            return
+        visible = self.get_visible_objects(self.lines_index,self.num_lines,self.lines_max_width,'lines')
+        self.lines_rendered = self.cull_canvas_items(self.lines_canvas_ids,self.lines_rendered,visible)
+        if new_only:
+            visible = [i for i in visible if self.lines_canvas_ids[i]=='blank']
+        #positions are derived from the unzoomed positions through the current view
+        lines_start_x,lines_start_y = self.get_screen_positions(self.lines_start_x,self.lines_start_y,visible)
+        lines_end_x,lines_end_y = self.get_screen_positions(self.lines_end_x,self.lines_end_y,visible)
+        lines_width = self.get_storage_subset(self.lines_width,visible)
+        created = False #have we created any new canvas items
+        for j,i in enumerate(visible): #go through all the visible lines
             #extract data about the line
-            start_x = self.lines_start_x[i]
-            start_y = self.lines_start_y[i]
-            end_x = self.lines_end_x[i]
-            end_y = self.lines_end_y[i]
-            midpoint_x = self.lines_midpoint_x[i]
-            midpoint_y = self.lines_midpoint_y[i]
-            width = self.lines_width[i]
-            colour = self.lines_colour[i]
-            if self.lines_canvas_ids[i]!='blank':
-                #delete the old line object if one exists
-                self.map.delete(self.lines_canvas_ids[i])
-            id = self.map.create_line(start_x,start_y,end_x,end_y,fill=colour,width=width) #draw the line
-            self.lines_canvas_ids[i] = id #store the id so we can delete the object later
+            start_x = lines_start_x[j]
+            start_y = lines_start_y[j]
+            end_x = lines_end_x[j]
+            end_y = lines_end_y[j]
+            width = lines_width[j]
+            id = self.lines_canvas_ids[i]
+            if id=='blank':
+                #draw the line, and store the id so we can move the object later
+                self.lines_canvas_ids[i] = self.map.create_line(start_x,start_y,end_x,end_y,fill=self.lines_colour[i],width=width,tags=self.get_item_tags('lines',i,self.lines_tag))
+                created = True
+            else:
+                #move the existing line object rather than deleting and recreating it
+                self.map.coords(id,start_x,start_y,end_x,end_y)
+                if self.lines_style_changed_flag:
+                    self.map.itemconfigure(id,fill=self.lines_colour[i],width=width)
+        if new_only==False:
+            self.lines_style_changed_flag = False #all canvas items now have the correct style
+        self.lines_rendered_view = self.view.copy()
+        if created:
+            self.restore_z_order()
 
     
-    #create new lines and replace the existing lines #note this must be done after node creation if using nodes to define line start/end points 
+    #draw the lines changed by the update methods since the last render
+    def render_dirty_lines(self):
+        for i in self.lines_dirty_geometry: #move changed lines which are on the canvas
+            id = self.lines_canvas_ids[i]
+            if id!='blank':
+                start_x,start_y = self.view.apply(self.lines_start_x[i],self.lines_start_y[i])
+                end_x,end_y = self.view.apply(self.lines_end_x[i],self.lines_end_y[i])
+                self.map.coords(id,start_x,start_y,end_x,end_y)
+        for i in self.lines_dirty_style: #restyle changed lines which are on the canvas
+            id = self.lines_canvas_ids[i]
+            if id!='blank':
+                self.map.itemconfigure(id,fill=self.lines_colour[i],width=self.lines_width[i])
+        if len(self.lines_dirty_geometry)>0:
+            self.render_lines(new_only=True) #moved lines may have entered or left the screen
+        self.lines_dirty_style = set()
+        self.lines_dirty_geometry = set()
+
+    #get the canvas items of the lines ready to be reused by new lines replacing them
+    def reset_lines_view(self):
+        self.clear_groups_of_type('lines') #groups hold the old objects, whose canvas items will be reused
+        lines_canvas_ids = self.lines_canvas_ids #keep the existing canvas items so they can be reused by the new lines
+        lines_rendered = self.lines_rendered
+        self.init_lines()
+        self.lines_canvas_ids = lines_canvas_ids
+        self.lines_rendered = lines_rendered
+        self.lines_style_changed_flag = True #reused canvas items must take on the style of the new lines
+
+    #create new lines and replace the existing lines #note this must be done after node creation if using nodes to define line start/end points
     def create_lines(self,lines_width,lines_colour,lines_name,info_name,info_type,lines_info,lines_start_node_type='none',lines_start_node_index=-1,lines_end_node_type='none',lines_end_node_index=-1,line_coords_prefer=False,lines_start_x_coord=[],lines_start_y_coord=[],lines_end_x_coord=[],lines_end_y_coord=[]):
-        self.init_lines() #reset line storage, removing all existing lines
+        for view in self.model.views: #every map drawing the lines reuses their canvas items for the new lines
+            view.reset_lines_view()
+        self.model.init_lines() #reset line storage, removing all existing lines
         self.num_lines = len(lines_width) #number of lines
         self.assign_lines_width(lines_width) #assign width of all lines
         self.assign_lines_colour(lines_colour) #assign colour of all lines
@@ -479,19 +2808,22 @@ class ZoomMap:
         self.assign_lines_info(info_name,info_type,lines_info) #assign info to lines
         self.assign_lines_nodes_and_positions(lines_start_node_type,lines_start_node_index,lines_end_node_type,lines_end_node_index,line_coords_prefer,lines_start_x_coord,lines_start_y_coord,lines_end_x_coord,lines_end_y_coord) #determine the position of the start and end of the line
         self.calculate_lines_midpoint() #calculate the midpoint of the line
+        self.project_lines() #project the start, end and midpoint of every line
+        self.build_lines_index() #index the lines so we can quickly find those on screen
+        self.build_lines_incidence(lines_start_node_type,lines_start_node_index,lines_end_node_type,lines_end_node_index,line_coords_prefer,lines_start_x_coord,lines_end_x_coord) #record which lines are attached to each node
         self.lines_assigned_flag=True #lines have been assigned
 
     #assign the width of all the lines
     def assign_lines_width(self,lines_width):
-        self.lines_width = lines_width
+        self.lines_width = self.make_float_storage(lines_width)
 
     #assign the colour of all the lines
     def assign_lines_colour(self,lines_colour):
-        self.lines_colour = lines_colour
+        self.lines_colour = list(lines_colour) #copied so updates do not change the caller's list
 
     #assign the name of all the lines
     def assign_lines_names(self,lines_name):
-        self.lines_name = lines_name
+        self.lines_name = list(lines_name) #copied so appending lines does not change the caller's list
 
     #assign info to the lines
     def assign_lines_info(self,info_name,info_type,lines_info):
@@ -503,51 +2835,202 @@ class ZoomMap:
             self.warning_print(message)
             self.assign_lines_none_info()
 
-    #assign no info to the lines
-    def assign_lines_none_info(self):
-        self.line_info_type='none'
-        self.line_info_name='none'
+    #assign no info to the lines
+    def assign_lines_none_info(self):
+        self.line_info_type='none'
+        self.line_info_name='none'
+
+    #public tools to update existing lines, the changes are drawn on the next render touching only the canvas items of the changed lines
+
+    #change the colours of the lines at the given indices
+    def update_lines_colours(self,indices,lines_colour):
+        if self.check_update_indices('line',self.num_lines,indices,lines_colour,removed=self.lines_removed)==False:
+            return
+        for i,colour in zip(indices,lines_colour):
+            self.lines_colour[i] = colour
+        self.mark_dirty('lines_dirty_style',indices)
+
+    #change the widths of the lines at the given indices
+    def update_lines_widths(self,indices,lines_width):
+        if self.check_update_indices('line',self.num_lines,indices,lines_width,removed=self.lines_removed)==False:
+            return
+        for i,width in zip(indices,lines_width):
+            self.lines_width[i] = width
+        self.lines_max_width = max(self.lines_max_width,max(lines_width,default=0)) #lines are drawn up to this far from their end points
+        self.mark_dirty('lines_dirty_style',indices)
+
+    #move the start and end of the lines at the given indices to new positions in global coordinates
+    def update_lines_positions(self,indices,lines_start_x_coord,lines_start_y_coord,lines_end_x_coord,lines_end_y_coord):
+        if self.check_update_indices('line',self.num_lines,indices,lines_start_x_coord,lines_start_y_coord,lines_end_x_coord,lines_end_y_coord,removed=self.lines_removed)==False:
+            return
+        pixels_calculated = self.pixel_coordinates_calculated(self.lines_start_x,self.num_lines)
+        for j,i in enumerate(indices):
+            self.lines_start_x_coord[i] = start_x = lines_start_x_coord[j]
+            self.lines_start_y_coord[i] = start_y = lines_start_y_coord[j]
+            self.lines_end_x_coord[i] = end_x = lines_end_x_coord[j]
+            self.lines_end_y_coord[i] = end_y = lines_end_y_coord[j]
+            self.lines_midpoint_x_coord[i] = (start_x+end_x)/2
+            self.lines_midpoint_y_coord[i] = (start_y+end_y)/2
+            self.lines_index.update_item(i,min(start_x,end_x),min(start_y,end_y),max(start_x,end_x),max(start_y,end_y)) #move the line within the spatial index
+            self.lines_start_x_projected[i],self.lines_start_y_projected[i] = self.projection.project(start_x,start_y)
+            self.lines_end_x_projected[i],self.lines_end_y_projected[i] = self.projection.project(end_x,end_y)
+            self.lines_midpoint_x_projected[i],self.lines_midpoint_y_projected[i] = self.projection.project(self.lines_midpoint_x_coord[i],self.lines_midpoint_y_coord[i])
+            if pixels_calculated:
+                self.lines_start_x[i],self.lines_start_y[i] = self.convert_projected_to_pixels(self.lines_start_x_projected[i],self.lines_start_y_projected[i])
+                self.lines_end_x[i],self.lines_end_y[i] = self.convert_projected_to_pixels(self.lines_end_x_projected[i],self.lines_end_y_projected[i])
+                self.lines_midpoint_x[i],self.lines_midpoint_y[i] = self.convert_projected_to_pixels(self.lines_midpoint_x_projected[i],self.lines_midpoint_y_projected[i])
+        self.lines_bounding_box = None #found again when next needed
+        self.mark_dirty('lines_dirty_geometry',indices)
+
+    #public tools to append and remove lines, a line keeps its index for as long as it exists, as the indices of removed lines are not reused
+
+    #append lines after the existing lines and return their indices, the ends of the lines are given as in create_lines
+    #only the new lines are stored, indexed and drawn, and lines attached to nodes follow them when the nodes move
+    def append_lines(self,lines_width,lines_colour,lines_name,lines_start_node_type=[],lines_start_node_index=-1,lines_end_node_type=[],lines_end_node_index=-1,line_coords_prefer=False,lines_start_x_coord=[],lines_start_y_coord=[],lines_end_x_coord=[],lines_end_y_coord=[]):
+        if self.check_append_values('line',lines_width,lines_colour,lines_name)==False or len(lines_width)==0:
+            return []
+        num_new = len(lines_width)
+        start_x,start_y,start_node_type,start_node_index = self.extract_position_nodes_for_lines(lines_start_node_type,lines_start_node_index,line_coords_prefer,lines_start_x_coord,lines_start_y_coord,num_new)
+        end_x,end_y,end_node_type,end_node_index = self.extract_position_nodes_for_lines(lines_end_node_type,lines_end_node_index,line_coords_prefer,lines_end_x_coord,lines_end_y_coord,num_new)
+        if len(start_x)!=num_new or len(end_x)!=num_new: #a warning has been given
+            return []
+        first = self.num_lines
+        pixels_needed = self.appended_pixel_coordinates_needed(self.lines_start_x,self.num_lines)
+        start_x,start_y,end_x,end_y = [self.make_float_storage(coords) for coords in (start_x,start_y,end_x,end_y)]
+        if self.storage_mode=='array':
+            midpoint_x = (start_x+end_x)/2
+            midpoint_y = (start_y+end_y)/2
+        else:
+            midpoint_x = [(start+end)/2 for start,end in zip(start_x,end_x)]
+            midpoint_y = [(start+end)/2 for start,end in zip(start_y,end_y)]
+        self.lines_start_x_coord = self.append_storage(self.lines_start_x_coord,start_x)
+        self.lines_start_y_coord = self.append_storage(self.lines_start_y_coord,start_y)
+        self.lines_end_x_coord = self.append_storage(self.lines_end_x_coord,end_x)
+        self.lines_end_y_coord = self.append_storage(self.lines_end_y_coord,end_y)
+        self.lines_midpoint_x_coord = self.append_storage(self.lines_midpoint_x_coord,midpoint_x)
+        self.lines_midpoint_y_coord = self.append_storage(self.lines_midpoint_y_coord,midpoint_y)
+        projected = [self.project_storage(coords_x,coords_y) for coords_x,coords_y in ((start_x,start_y),(end_x,end_y),(midpoint_x,midpoint_y))]
+        self.lines_start_x_projected = self.append_storage(self.lines_start_x_projected,projected[0][0])
+        self.lines_start_y_projected = self.append_storage(self.lines_start_y_projected,projected[0][1])
+        self.lines_end_x_projected = self.append_storage(self.lines_end_x_projected,projected[1][0])
+        self.lines_end_y_projected = self.append_storage(self.lines_end_y_projected,projected[1][1])
+        self.lines_midpoint_x_projected = self.append_storage(self.lines_midpoint_x_projected,projected[2][0])
+        self.lines_midpoint_y_projected = self.append_storage(self.lines_midpoint_y_projected,projected[2][1])
+        self.lines_width = self.append_storage(self.lines_width,lines_width)
+        self.lines_colour = self.append_list(self.lines_colour,lines_colour)
+        self.lines_name = self.append_list(self.lines_name,lines_name)
+        self.lines_start_node_type = self.append_list(self.lines_start_node_type,start_node_type)
+        self.lines_start_node_index = self.append_list(self.lines_start_node_index,start_node_index)
+        self.lines_end_node_type = self.append_list(self.lines_end_node_type,end_node_type)
+        self.lines_end_node_index = self.append_list(self.lines_end_node_index,end_node_index)
+        self.num_lines += num_new
+        if pixels_needed:
+            pixels = [self.convert_projected_storage_to_pixels(projected_x,projected_y) for projected_x,projected_y in projected]
+            self.lines_start_x = self.append_storage(self.lines_start_x,pixels[0][0])
+            self.lines_start_y = self.append_storage(self.lines_start_y,pixels[0][1])
+            self.lines_end_x = self.append_storage(self.lines_end_x,pixels[1][0])
+            self.lines_end_y = self.append_storage(self.lines_end_y,pixels[1][1])
+            self.lines_midpoint_x = self.append_storage(self.lines_midpoint_x,pixels[2][0])
+            self.lines_midpoint_y = self.append_storage(self.lines_midpoint_y,pixels[2][1])
+            for view in self.model.views:
+                view.lines_canvas_ids = view.append_canvas_ids(view.lines_canvas_ids,first,self.num_lines)
+            self.mark_dirty('lines_dirty_geometry',range(first,self.num_lines)) #drawn on the next render
+        boxes = self.get_lines_boxes(start_x,start_y,end_x,end_y)
+        self.lines_index = self.grow_spatial_grid(self.lines_index,'lines_index',self.lines_removed,boxes,self.get_every_line_box)
+        self.lines_max_width = max(self.lines_max_width,max(lines_width))
+        #record which nodes the new lines are attached to
+        for end,(node_type,node_index,lines_x_coord) in enumerate(((lines_start_node_type,lines_start_node_index,lines_start_x_coord),(lines_end_node_type,lines_end_node_index,lines_end_x_coord))):
+            for j in self.get_attached_lines(node_type,line_coords_prefer,lines_x_coord,num_new):
+                self.nodes_lines_appended_ends.setdefault(int(node_index[j]),[]).append(2*(first+j)+end)
+        min_x,min_y,max_x,max_y = boxes
+        self.grow_objects_bounding_box('lines',max(max_y),min(min_y),max(max_x),min(min_x))
+        self.lines_assigned_flag = True
+        self.schedule_render()
+        return list(range(first,self.num_lines))
+
+    #remove the lines at the given indices, only the canvas items of the removed lines are deleted
+    def remove_lines(self,indices):
+        indices = sorted(set(indices))
+        if self.check_update_indices('line',self.num_lines,indices,removed=self.lines_removed)==False or len(indices)==0:
+            return
+        for i in indices:
+            self.lines_index.delete_item(i)
+        self.lines_removed.update(indices)
+        for view in self.model.views:
+            view.release_removed_objects('lines',indices,view.lines_canvas_ids,view.lines_rendered)
+        min_x,min_y,max_x,max_y = self.get_lines_boxes(*[self.get_storage_subset(coords,indices) for coords in (self.lines_start_x_coord,self.lines_start_y_coord,self.lines_end_x_coord,self.lines_end_y_coord)])
+        self.shrink_objects_bounding_box('lines',max(max_y),min(min_y),max(max_x),min(min_x))
+        if self.pixel_coordinates_calculated(self.lines_start_x,self.num_lines):
+            self.mark_dirty('lines_dirty_geometry',indices) #labels of the removed lines are redrawn on the next render
+        self.schedule_render()
 
     #assign nodes and positions to determine the start and end of lines
     def assign_lines_nodes_and_positions(self,lines_start_node_type=[],lines_start_node_index=-1,lines_end_node_type=[],lines_end_node_index=-1,line_coords_prefer=False,lines_start_x_coord=[],lines_start_y_coord=[],lines_end_x_coord=[],lines_end_y_coord=[]):
         #empty list for node type indicates we are not using node types, all lines are generated from explicit positions (note this selection can be made independently for starting and ending nodes)
         self.lines_start_x_coord,self.lines_start_y_coord,self.lines_start_node_type,self.lines_start_node_index = self.extract_position_nodes_for_lines(lines_start_node_type,lines_start_node_index,line_coords_prefer,lines_start_x_coord,lines_start_y_coord) #assign nodes and positions for start of line
         self.lines_end_x_coord,self.lines_end_y_coord,self.lines_end_node_type,self.lines_end_node_index = self.extract_position_nodes_for_lines(lines_end_node_type,lines_end_node_index,line_coords_prefer,lines_end_x_coord,lines_end_y_coord) #assign nodes and positions for end of line
+        #copy the nodes of the lines, so appending lines does not change the caller's lists
+        self.lines_start_node_type,self.lines_start_node_index,self.lines_end_node_type,self.lines_end_node_index = [
+            [values]*self.num_lines if isinstance(values,(str,int)) else list(values) for values in (self.lines_start_node_type,self.lines_start_node_index,self.lines_end_node_type,self.lines_end_node_index)]
+        #store the coordinates in the current storage mode
+        self.lines_start_x_coord = self.make_float_storage(self.lines_start_x_coord)
+        self.lines_start_y_coord = self.make_float_storage(self.lines_start_y_coord)
+        self.lines_end_x_coord = self.make_float_storage(self.lines_end_x_coord)
+        self.lines_end_y_coord = self.make_float_storage(self.lines_end_y_coord)
+
+    #project the start, end and midpoint of all the lines at once
+    def project_lines(self):
+        self.lines_start_x_projected,self.lines_start_y_projected = self.project_storage(self.lines_start_x_coord,self.lines_start_y_coord)
+        self.lines_end_x_projected,self.lines_end_y_projected = self.project_storage(self.lines_end_x_coord,self.lines_end_y_coord)
+        self.lines_midpoint_x_projected,self.lines_midpoint_y_projected = self.project_storage(self.lines_midpoint_x_coord,self.lines_midpoint_y_coord)
 
     #calculate the midpoint of lines in global coordinates
     def calculate_lines_midpoint(self):
+        if self.storage_mode=='array': #calculate all the midpoints at once
+            self.lines_midpoint_x_coord = (self.lines_start_x_coord+self.lines_end_x_coord)/2
+            self.lines_midpoint_y_coord = (self.lines_start_y_coord+self.lines_end_y_coord)/2
+            return
         for i in range(self.num_lines):
             new_x = (self.lines_start_x_coord[i]+self.lines_end_x_coord[i])/2
             new_y = (self.lines_start_y_coord[i]+self.lines_end_y_coord[i])/2
             self.lines_midpoint_x_coord.append(new_x)
             self.lines_midpoint_y_coord.append(new_y)
 
-    #extract the position and nodes of lines
-    def extract_position_nodes_for_lines(self,node_type,node_index,line_coords_prefer,lines_x_coord,lines_y_coord):
+    #extract the position and nodes of lines, num_lines is the number of lines given, by default every line
+    def extract_position_nodes_for_lines(self,node_type,node_index,line_coords_prefer,lines_x_coord,lines_y_coord,num_lines=None):
+        if num_lines is None:
+            num_lines = self.num_lines
+        if isinstance(node_type,str): #a single node type such as the default 'none' means no nodes were given for this end of the lines
+            node_type = []
         if len(node_type)==0 and len(lines_x_coord)>0: #we are not using nodes for any positions
             list_x_coord = lines_x_coord #we use this as is in this mode
             list_y_coord = lines_y_coord
-            list_node_type = ['none']*self.num_lines #we are not using node for position
-            list_node_index = [-1]*self.num_lines #placeholder for node index
+            list_node_type = ['none']*num_lines #we are not using node for position
+            list_node_index = [-1]*num_lines #placeholder for node index
         else:
             list_x_coord = [] #we must assign to this from each node in this mode
             list_y_coord = []
             list_node_index = node_index #we can use this as is
             list_node_type = node_type
             if len(node_type)>0 and len(lines_x_coord)==0: #we are not using explicit positions, only nodes provided
-                for i in range(self.num_lines): #go through all the lines
-                    new_x,new_y = self.extract_node_position(node_type[i],node_index[i]) #extract the x and y position of the requested node
-                    list_x_coord.append(new_x) #and append these positions to the list of positions
-                    list_y_coord.append(new_y)
-            elif len(node_type)>0 and len(lines_x_coord)==0: #we have access to both nodes and positions (though potentially not all might be nodes)
-                for i in range(self.num_lines): #go through all the lines
+                if self.storage_mode=='array' and all(type=='node' for type in node_type): #all positions come from nodes, so gather them at once
+                    index_array = np.asarray(node_index,dtype=np.intp)
+                    list_x_coord = self.nodes_x_coords[index_array]
+                    list_y_coord = self.nodes_y_coords[index_array]
+                else:
+                    for i in range(num_lines): #go through all the lines
+                        new_x,new_y = self.extract_node_position(node_type[i],node_index[i]) #extract the x and y position of the requested node
+                        list_x_coord.append(new_x) #and append these positions to the list of positions
+                        list_y_coord.append(new_y)
+            elif len(node_type)>0 and len(lines_x_coord)>0: #we have access to both nodes and positions (though potentially not all might be nodes)
+                for i in range(num_lines): #go through all the lines
                     if node_type[i]=='none':
                         #we don't have a node, so use provided coordinates
                         list_x_coord.append(lines_x_coord[i])
                         list_y_coord.append(lines_y_coord[i])
                     else: #if we do have a node
                         #check if we have a non-blank position
-                        if lines_x_coord=='none': #if there is no coordinate for this position
+                        if lines_x_coord[i]=='none': #if there is no coordinate for this position
                             #we must use the node
                             new_x,new_y = self.extract_node_position(node_type[i],node_index[i]) #extract the x and y position of the requested node
                             list_x_coord.append(new_x)
@@ -572,6 +3055,71 @@ class ZoomMap:
         #return the position and linked nodes of the lines
         return list_x_coord,list_y_coord,list_node_type,list_node_index
 
+    #get the lines whose position at one end is taken from a node (rather than from given coordinates), following the same rules as extract_position_nodes_for_lines
+    def get_attached_lines(self,node_type,line_coords_prefer,lines_x_coord,num_lines=None):
+        if isinstance(node_type,str) or len(node_type)==0: #no nodes were given for this end of the lines
+            return []
+        coords_used = line_coords_prefer==True and len(lines_x_coord)>0 #given coordinates take the place of nodes
+        return [i for i in range(self.num_lines if num_lines is None else num_lines) if node_type[i]=='node' and not (coords_used and lines_x_coord[i]!='none')]
+
+    #build the incidence of nodes and lines, listing the line ends attached to each node
+    #this is a counting sort of the attached line ends by node, so takes time proportional to the number of lines and nodes
+    def build_lines_incidence(self,lines_start_node_type,lines_start_node_index,lines_end_node_type,lines_end_node_index,line_coords_prefer,lines_start_x_coord,lines_end_x_coord):
+        ends_node = [] #node attached to each line end
+        ends = [] #line end, 2*line index plus 1 for the end of the line
+        for end,(node_type,node_index,lines_x_coord) in enumerate(((lines_start_node_type,lines_start_node_index,lines_start_x_coord),(lines_end_node_type,lines_end_node_index,lines_end_x_coord))):
+            for i in self.get_attached_lines(node_type,line_coords_prefer,lines_x_coord):
+                ends_node.append(int(node_index[i]))
+                ends.append(2*i+end)
+        num_nodes = max(self.num_nodes,max(ends_node,default=-1)+1)
+        self.nodes_lines_offsets,self.nodes_lines_ends = group_by_index(ends_node,ends,num_nodes,self.storage_mode=='array')
+
+    #get the line ends attached to a node, each as 2*line index plus 1 for the end of the line
+    def get_node_line_ends(self,node):
+        if node+1>=len(self.nodes_lines_offsets): #the node was created after the lines, so only appended lines can be attached to it
+            ends = []
+        else:
+            ends = self.nodes_lines_ends[self.nodes_lines_offsets[node]:self.nodes_lines_offsets[node+1]]
+        appended_ends = self.nodes_lines_appended_ends.get(node)
+        if appended_ends is not None:
+            ends = list(ends)+appended_ends
+        if len(self.lines_removed)>0:
+            ends = [end for end in ends if int(end)//2 not in self.lines_removed]
+        return ends
+
+    #merge the line ends of appended lines into the compressed incidence of nodes and lines, leaving out the ends of removed lines
+    def merge_lines_incidence(self):
+        num_nodes = max(len(self.nodes_lines_offsets)-1,max(self.nodes_lines_appended_ends,default=-1)+1)
+        offsets = [0]
+        ends = []
+        for node in range(num_nodes):
+            ends.extend(int(end) for end in self.get_node_line_ends(node))
+            offsets.append(len(ends))
+        if self.storage_mode=='array':
+            offsets = np.asarray(offsets,dtype=np.intp)
+            ends = np.asarray(ends,dtype=np.intp)
+        self.nodes_lines_offsets = offsets
+        self.nodes_lines_ends = ends
+        self.nodes_lines_appended_ends = {}
+
+    #get the indices of the lines attached to a node
+    def get_node_lines(self,node):
+        return sorted(set(int(end)//2 for end in self.get_node_line_ends(node)))
+
+    #move the ends of the lines attached to nodes which have moved, only the lines attached to those nodes are touched
+    def move_attached_lines(self,nodes):
+        lines = {} #line index -> new start and end positions
+        for node in nodes:
+            for end in self.get_node_line_ends(node):
+                line = int(end)//2
+                if line not in lines:
+                    lines[line] = [self.lines_start_x_coord[line],self.lines_start_y_coord[line],self.lines_end_x_coord[line],self.lines_end_y_coord[line]]
+                position = 2*(end%2) #start or end of the line
+                lines[line][position] = self.nodes_x_coords[node]
+                lines[line][position+1] = self.nodes_y_coords[node]
+        if len(lines)>0:
+            self.update_lines_positions(list(lines),*zip(*lines.values()))
+
     #extract x/y global position from a created node
     #currently supports nodes and pie nodes
     def extract_node_position(self,node_type,node_index):
@@ -588,152 +3136,1838 @@ class ZoomMap:
             y = 0
         return x,y
 
+    #get the bounding boxes (min x, min y, max x, max y) in global coordinates of lines with the given start and end coordinates, as python lists
+    def get_lines_boxes(self,start_x,start_y,end_x,end_y):
+        if self.storage_mode=='array':
+            return np.minimum(start_x,end_x).tolist(),np.minimum(start_y,end_y).tolist(),np.maximum(start_x,end_x).tolist(),np.maximum(start_y,end_y).tolist()
+        min_x = [min(start,end) for start,end in zip(start_x,end_x)]
+        min_y = [min(start,end) for start,end in zip(start_y,end_y)]
+        max_x = [max(start,end) for start,end in zip(start_x,end_x)]
+        max_y = [max(start,end) for start,end in zip(start_y,end_y)]
+        return min_x,min_y,max_x,max_y
+
+    #get the bounding boxes of every line
+    def get_every_line_box(self):
+        return self.get_lines_boxes(self.lines_start_x_coord,self.lines_start_y_coord,self.lines_end_x_coord,self.lines_end_y_coord)
+
+    #build a spatial index of the bounding boxes of the lines in global coordinates
+    def build_lines_index(self):
+        self.lines_index = self.build_spatial_grid('lines_index',*self.get_every_line_box())
+        self.lines_max_width = self.get_storage_max_min(self.lines_width)[0] if self.num_lines>0 else 0 #lines are drawn up to this far from their end points
+
     #find and return the most extreme coordinates found in the list of lines
     def get_extreme_lines(self):
         #get the extremes for the starting points
-        extreme_north_start = max(self.lines_start_y_coord) #northernmost node has largest y coordinate
-        extreme_south_start = min(self.lines_start_y_coord) #southernmost node has smallest y coordinate
-        extreme_east_start = min(self.lines_start_x_coord) #easternmost point has smallest x coordinate
-        extreme_west_start = max(self.lines_start_x_coord) #westernmost point has largest x coordinate
+        extreme_north_start,extreme_south_start = self.get_storage_max_min(self.get_live_storage(self.lines_start_y_coord,self.lines_removed)) #northernmost point has largest y coordinate, southernmost point has smallest y coordinate
+        extreme_east_start,extreme_west_start = self.get_storage_max_min(self.get_live_storage(self.lines_start_x_coord,self.lines_removed)) #easternmost point has largest x coordinate, westernmost point has smallest x coordinate
         #get the extremes for the ending points
-        extreme_north_end = max(self.lines_end_y_coord) #northernmost node has largest y coordinate
-        extreme_south_end = min(self.lines_end_y_coord) #southernmost node has smallest y coordinate
-        extreme_east_end = min(self.lines_end_x_coord) #easternmost point has smallest x coordinate
-        extreme_west_end = max(self.lines_end_x_coord) #westernmost point has largest x coordinate
+        extreme_north_end,extreme_south_end = self.get_storage_max_min(self.get_live_storage(self.lines_end_y_coord,self.lines_removed))
+        extreme_east_end,extreme_west_end = self.get_storage_max_min(self.get_live_storage(self.lines_end_x_coord,self.lines_removed))
         #the most extreme for each category is the extreme point
         extreme_north = max(extreme_north_start,extreme_north_end)
         extreme_south = min(extreme_south_end,extreme_south_start)
-        extreme_east = min(extreme_east_end,extreme_east_start)
-        extreme_west = max(extreme_west_end,extreme_west_start)
+        extreme_east = max(extreme_east_end,extreme_east_start)
+        extreme_west = min(extreme_west_end,extreme_west_start)
         return extreme_north,extreme_south,extreme_east,extreme_west
 
     #calculate line positions in unzoomed pixel coordinates
-    def calculate_line_pixel_coordinates(self):      
+    def calculate_line_pixel_coordinates(self):
+        if self.storage_mode=='array': #convert all the lines at once
+            self.lines_start_x,self.lines_start_y = self.convert_projected_to_pixels(self.lines_start_x_projected,self.lines_start_y_projected)
+            self.lines_end_x,self.lines_end_y = self.convert_projected_to_pixels(self.lines_end_x_projected,self.lines_end_y_projected)
+            self.lines_midpoint_x,self.lines_midpoint_y = self.convert_projected_to_pixels(self.lines_midpoint_x_projected,self.lines_midpoint_y_projected)
+        else:
+            self.calculate_line_pixel_coordinates_list()
+
+    #calculate line positions in unzoomed pixel coordinates one line at a time, used in list storage mode
+    def calculate_line_pixel_coordinates_list(self):
+        #clear any positions from a previous calculation
+        self.lines_start_x = []
+        self.lines_start_y = []
+        self.lines_end_x = []
+        self.lines_end_y = []
+        self.lines_midpoint_x = []
+        self.lines_midpoint_y = []
         for i in range(self.num_lines): #go through each line
-            line_start_x,line_start_y = self.convert_coords_to_pixels(self.lines_start_x_coord[i],self.lines_start_y_coord[i])  #calculate the position in unzoomed pixel coordinates of line start
-            line_end_x,line_end_y = self.convert_coords_to_pixels(self.lines_end_x_coord[i],self.lines_end_y_coord[i])  #calculate the position in unzoomed pixel coordinates of line end
-            line_midpoint_x,line_midpoint_y = self.convert_coords_to_pixels(self.lines_midpoint_x_coord[i],self.lines_midpoint_y_coord[i]) #calculate the position in unzoomed pixel coordinates of the line midpoint
+            line_start_x,line_start_y = self.convert_projected_to_pixels(self.lines_start_x_projected[i],self.lines_start_y_projected[i])  #calculate the position in unzoomed pixel coordinates of line start
+            line_end_x,line_end_y = self.convert_projected_to_pixels(self.lines_end_x_projected[i],self.lines_end_y_projected[i])  #calculate the position in unzoomed pixel coordinates of line end
+            line_midpoint_x,line_midpoint_y = self.convert_projected_to_pixels(self.lines_midpoint_x_projected[i],self.lines_midpoint_y_projected[i]) #calculate the position in unzoomed pixel coordinates of the line midpoint
             #append this info to the existing coordinate lists
             self.lines_start_x.append(line_start_x)
             self.lines_start_y.append(line_start_y)
             self.lines_end_x.append(line_end_x)
             self.lines_end_y.append(line_end_y)
             self.lines_midpoint_x.append(line_midpoint_x)
-            self.lines_midpoint_y.append(line_midpoint_y)      
-        #create a copy of these positions to store positions before zoom is applied
-        self.lines_start_x_original = self.lines_start_x
-        self.lines_start_y_original = self.lines_start_y
-        self.lines_end_x_original = self.lines_end_x
-        self.lines_end_y_original = self.lines_end_y
-        self.lines_midpoint_x_original = self.lines_midpoint_x
-        self.lines_midpoint_y_original = self.lines_midpoint_y
-        self.lines_canvas_ids = ['blank']*self.num_lines #canvas ids for the lines themsleves
+            self.lines_midpoint_y.append(line_midpoint_y)
 
     #apply zoom to lines
-    def apply_zoom_lines(self,zoom_delta,mouse_x,mouse_y):
-        self.lines_start_x,self.lines_start_y = self.recalculate_list_zoom_positions(zoom_delta,mouse_x,mouse_y,self.num_lines,self.lines_start_x,self.lines_start_y) #calculate zoom for start of line
-        self.lines_end_x,self.lines_end_y = self.recalculate_list_zoom_positions(zoom_delta,mouse_x,mouse_y,self.num_lines,self.lines_end_x,self.lines_end_y) #calculate zoom for end of line
-        self.lines_midpoint_x,self.lines_midpoint_y = self.recalculate_list_zoom_positions(zoom_delta,mouse_x,mouse_y,self.num_lines,self.lines_midpoint_x,self.lines_midpoint_y) #calculate zoom for middle of line
-        self.render_lines() #once we have applied the zoom, render the lines
+    def apply_zoom_lines(self):
+        if self.lines_rendered_view is None: #nothing drawn yet
+            self.render_lines()
+            return
+        #line widths are not changed by scaling the canvas, so all the rendered lines can be zoomed and moved with a couple of canvas calls
+        scale,shift_x,shift_y = self.get_view_change(self.lines_rendered_view)
+        self.transform_canvas_items(self.lines_tag,scale,shift_x,shift_y)
+        self.render_lines(new_only=True) #then add lines which have come into view and remove those which have left
 
     #private tools for operating on compound lines
 
-    #find and return the most extreme coordinates found in the list of compound lines
-    #create containers to store compound lines
+    #create containers for the canvas items of the compound lines drawn on the map, the compound lines themselves are stored in the model of the map
     def init_compound_lines(self):
-        self.num_compound_lines = 0 #number of compound lines stored
-        self.compound_line_info_name = 'none' #name of the info stored with the compound lines
-        self.compound_line_info_type = 'none' #type of the info stored with the compound lines
-        #arrays of compound line properties
-        #relating to nodes
-        self.compound_lines_start_node_type = [] #what type of node is at the start of the line (valid are 'none','node' and 'pie')
-        self.compound_lines_start_node_index = [] #index of the starting node, if it exists
-        self.compound_lines_start_node_type = [] #what type of node is at the end of the line (valid are 'none','node' and 'pie')
-        self.compound_lines_start_node_index= [] #index of the ending node, if it exists
-        #global coordinate arrays, list of list of line points from start to finsh
-        self.compound_line_points_x_coords = [] #horizontal position of points that make up the line in global coordinates
-        self.compound_line_points_y_coords = [] #vertical position of points that make up the line in global coordinates
-        #pixel coordinate arrays
-        self.compound_line_points_x = [] #horizontal position of points that make up the line in pixel coordinates
-        self.compound_line_points_y = [] #vertical position of points that make up the line in pixel coordinates
-        self.compound_lines_midpoint_x = [] #horizontal midpoint in pixel coordinates of the line, used for text display
-        self.compound_lines_midpoint_y = [] #vertical midpoint in pixel coordinates of the line, used for text display
-        #copy of pixel coordinate arrays before zoom has been applied
-        self.compound_line_points_x_original = []
-        self.compound_line_points_y_original = []
-        self.compound_lines_midpoint_x_original = [] 
-        self.compound_lines_midpoint_y_original = []
-        #other line properties
-        self.compound_lines_width = [] #width of the compound lines, pixels
-        self.compound_lines_colour = [] #colour of the compound line
-        self.compound_lines_info = [] #info about the compound lines
-        self.lines_canvas_ids = [] #id of the line components, so we can delete it later
-        #flags
-        self.compound_lines_assigned_flag = False #have lines been stored yet
+        self.compound_lines_band = None #simplification band currently drawn
+        self.compound_lines_canvas_ids = [] #id of the line components, so we can delete it later
+        self.compound_lines_rendered = set() #indices of the compound lines which currently have a canvas item
+        self.compound_lines_rendered_view = None #view in which the compound lines on the canvas were drawn
+        self.compound_lines_style_changed_flag = False #do existing canvas items need their colour and width updated on the next render
+        self.compound_lines_dirty_style = set() #indices of compound lines whose colour or width has changed since the last render
+        self.compound_lines_dirty_geometry = set() #indices of compound lines which have been appended or removed since the last render
 
-    #render the compound lines PLACEHOLDER
-    def render_compound_lines(self):
-        pass
-    
-    #create new compound lines and replace the existing compound lines #note this must be done after node creation if using nodes to define line start/end points 
-    def create_compound_lines(self,compound_lines_width,compound_lines_colour,compound_lines_name,info_name,info_type,compound_lines_info):
-        self.init_compound_lines() #reset line storage, removing all existing lines
+    #render the compound lines which are visible on the screen, each simplified to the detail which can be seen at the current zoom
+    #if new_only is True, compound lines which already have a canvas item are assumed to be in the right place and only newly visible lines are drawn
+    def render_compound_lines(self,new_only=False):
+        if self.num_compound_lines==0:
+            return
+        band = self.get_compound_lines_band()
+        if band!=self.compound_lines_band: #the simplified shape of every line has changed, so all lines must be redrawn
+            self.compound_lines_band = band
+            new_only = False
+        visible = self.get_visible_objects(self.compound_lines_index,self.num_compound_lines,self.compound_lines_max_width,'compound_lines')
+        self.compound_lines_rendered = self.cull_canvas_items(self.compound_lines_canvas_ids,self.compound_lines_rendered,visible)
+        if new_only:
+            visible = [i for i in visible if self.compound_lines_canvas_ids[i]=='blank']
+        zoom = self.view.zoom
+        offset_x = self.view.offset_x
+        offset_y = self.view.offset_y
+        created = False #have we created any new canvas items
+        for i in visible:
+            points = self.get_compound_line_band_points(i,band) #flattened unzoomed pixel coordinates of the simplified line
+            screen_points = [value*zoom+offset_x if j%2==0 else value*zoom+offset_y for j,value in enumerate(points)]
+            id = self.compound_lines_canvas_ids[i]
+            if id=='blank':
+                #draw the line, and store the id so we can move the object later
+                self.compound_lines_canvas_ids[i] = self.map.create_line(screen_points,fill=self.compound_lines_colour[i],width=self.compound_lines_width[i],tags=self.get_item_tags('compound_lines',i,self.compound_lines_tag))
+                created = True
+            else:
+                #move the existing line object rather than deleting and recreating it
+                self.map.coords(id,screen_points)
+                if self.compound_lines_style_changed_flag:
+                    self.map.itemconfigure(id,fill=self.compound_lines_colour[i],width=self.compound_lines_width[i])
+        if new_only==False:
+            self.compound_lines_style_changed_flag = False #all canvas items now have the correct style
+        self.compound_lines_rendered_view = self.view.copy()
+        if created:
+            self.restore_z_order()
+
+    #draw the compound lines changed by the update methods since the last render
+    def render_dirty_compound_lines(self):
+        for i in self.compound_lines_dirty_style: #restyle changed compound lines which are on the canvas
+            id = self.compound_lines_canvas_ids[i]
+            if id!='blank':
+                self.map.itemconfigure(id,fill=self.compound_lines_colour[i],width=self.compound_lines_width[i])
+        self.compound_lines_dirty_style = set()
+        if len(self.compound_lines_dirty_geometry)>0: #compound lines have been appended or removed
+            self.render_compound_lines(new_only=True)
+            self.compound_lines_dirty_geometry = set()
+
+    #get the canvas items of the compound lines ready to be reused by new compound lines replacing them
+    def reset_compound_lines_view(self):
+        self.clear_groups_of_type('compound_lines') #groups hold the old objects, whose canvas items will be reused
+        compound_lines_canvas_ids = self.compound_lines_canvas_ids #keep the existing canvas items so they can be reused by the new lines
+        compound_lines_rendered = self.compound_lines_rendered
+        self.init_compound_lines()
+        self.compound_lines_canvas_ids = compound_lines_canvas_ids
+        self.compound_lines_rendered = compound_lines_rendered
+        self.compound_lines_style_changed_flag = True #reused canvas items must take on the style of the new lines
+
+    #create new compound lines and replace the existing compound lines #note this must be done after node creation if using nodes to define line start/end points
+    #compound_lines_x_coords and compound_lines_y_coords are lists with a list of point coordinates for each line, from start to finish
+    #if a start or end node is given for a line, the position of that node replaces the first or last point of that line
+    def create_compound_lines(self,compound_lines_width,compound_lines_colour,compound_lines_name,info_name,info_type,compound_lines_info,compound_lines_x_coords=[],compound_lines_y_coords=[],compound_lines_start_node_type=[],compound_lines_start_node_index=[],compound_lines_end_node_type=[],compound_lines_end_node_index=[]):
+        short_lines = self.get_short_compound_lines(compound_lines_x_coords,compound_lines_y_coords)
+        if len(short_lines)>0:
+            self.warning_print("Compound lines " + str(short_lines) + " have fewer than 2 points, so cannot be drawn. Compound lines not created")
+            return
+        for view in self.model.views: #every map drawing the compound lines reuses their canvas items for the new lines
+            view.reset_compound_lines_view()
+        self.model.init_compound_lines() #reset line storage, removing all existing lines
         self.num_compound_lines = len(compound_lines_width) #number of compound lines
         self.assign_compound_lines_width(compound_lines_width) #assign width of all compound lines
         self.assign_compound_lines_colour(compound_lines_colour) #assign colour of all compound lines
         self.assign_compound_lines_names(compound_lines_name) #assign name to the compound lines
         self.assign_compound_lines_info(info_name,info_type,compound_lines_info) #assign info to compound lines
-        self.assign_compound_lines_nodes_and_positions() #determine the position of the start and end of the compound line
+        self.assign_compound_lines_nodes_and_positions(compound_lines_x_coords,compound_lines_y_coords,compound_lines_start_node_type,compound_lines_start_node_index,compound_lines_end_node_type,compound_lines_end_node_index) #determine the position of the points of the compound line
         self.calculate_compound_lines_midpoint() #calculate the midpoint of the compound line
+        self.project_compound_lines() #project the points and midpoint of every compound line
+        self.build_compound_lines_index() #index the compound lines so we can quickly find those on screen
+        self.calculate_compound_lines_importance() #build the simplification pyramid
+        self.compound_lines_assigned_flag = True #compound lines have been assigned
 
     #assign the width of all the lines
     def assign_compound_lines_width(self,lines_width):
-        self.compound_lines_width = lines_width
+        self.compound_lines_width = list(lines_width)
 
     #assign the colour of all the compound lines
     def assign_compound_lines_colour(self,lines_colour):
-        self.compound_lines_colour = lines_colour
+        self.compound_lines_colour = list(lines_colour)
 
     #assign the name of all the compound lines
     def assign_compound_lines_names(self,lines_name):
-        self.compound_lines_name = lines_name
+        self.compound_lines_name = list(lines_name) #copied so appending compound lines does not change the caller's list
 
     #assign info to the compound lines
     def assign_compound_lines_info(self,info_name,info_type,lines_info):
         #at the moment we only handle no node info
         if info_type=='none':
-            self.assign_lines_none_info()
+            self.assign_compound_lines_none_info()
         else:
-            message = 'Lines Info Type : ' + info_type + " not yet supported, defaulting to none"
+            message = 'Compound Lines Info Type : ' + info_type + " not yet supported, defaulting to none"
             self.warning_print(message)
-            self.assign_lines_none_info()
+            self.assign_compound_lines_none_info()
 
     #assign no info to the compound lines
     def assign_compound_lines_none_info(self):
         self.compound_line_info_type='none'
         self.compound_line_info_name='none'
 
-    #assign nodes and positions to determine the start and end of compound lines
-    def assign_compound_lines_nodes_and_positions(self):
-        pass  #placeholder
+    #public tools to update existing compound lines, the changes are drawn on the next render touching only the canvas items of the changed lines
+
+    #change the colours of the compound lines at the given indices
+    def update_compound_lines_colours(self,indices,compound_lines_colour):
+        if self.check_update_indices('compound line',self.num_compound_lines,indices,compound_lines_colour,removed=self.compound_lines_removed)==False:
+            return
+        for i,colour in zip(indices,compound_lines_colour):
+            self.compound_lines_colour[i] = colour
+        self.mark_dirty('compound_lines_dirty_style',indices)
+
+    #change the widths of the compound lines at the given indices
+    def update_compound_lines_widths(self,indices,compound_lines_width):
+        if self.check_update_indices('compound line',self.num_compound_lines,indices,compound_lines_width,removed=self.compound_lines_removed)==False:
+            return
+        for i,width in zip(indices,compound_lines_width):
+            self.compound_lines_width[i] = width
+        self.compound_lines_max_width = max(self.compound_lines_max_width,max(compound_lines_width,default=0)) #lines are drawn up to this far from their points
+        self.mark_dirty('compound_lines_dirty_style',indices)
+
+    #public tools to append and remove compound lines, a compound line keeps its index for as long as it exists, as the indices of removed compound lines are not reused
+
+    #append compound lines after the existing compound lines and return their indices, the points and end nodes are given as in create_compound_lines
+    #only the new lines are stored, simplified, indexed and drawn. The simplification bands keep the extent of the lines they were built for,
+    #so appended lines reaching outside it are simplified as finely as the coarsest band allows
+    def append_compound_lines(self,compound_lines_width,compound_lines_colour,compound_lines_name,compound_lines_x_coords,compound_lines_y_coords,compound_lines_start_node_type=[],compound_lines_start_node_index=[],compound_lines_end_node_type=[],compound_lines_end_node_index=[]):
+        if self.check_append_values('compound line',compound_lines_width,compound_lines_colour,compound_lines_name,compound_lines_x_coords,compound_lines_y_coords)==False or len(compound_lines_width)==0:
+            return []
+        short_lines = self.get_short_compound_lines(compound_lines_x_coords,compound_lines_y_coords)
+        if len(short_lines)>0:
+            self.warning_print("Appended compound lines " + str(short_lines) + " have fewer than 2 points, append ignored")
+            return []
+        num_new = len(compound_lines_width)
+        first = self.num_compound_lines
+        pixels_needed = self.appended_pixel_coordinates_needed(self.compound_line_points_x,self.num_compound_lines)
+        self.compound_lines_start_node_type = self.append_list(self.compound_lines_start_node_type,compound_lines_start_node_type if len(compound_lines_start_node_type)>0 else ['none']*num_new)
+        self.compound_lines_start_node_index = self.append_list(self.compound_lines_start_node_index,compound_lines_start_node_index if len(compound_lines_start_node_type)>0 else [-1]*num_new)
+        self.compound_lines_end_node_type = self.append_list(self.compound_lines_end_node_type,compound_lines_end_node_type if len(compound_lines_end_node_type)>0 else ['none']*num_new)
+        self.compound_lines_end_node_index = self.append_list(self.compound_lines_end_node_index,compound_lines_end_node_index if len(compound_lines_end_node_type)>0 else [-1]*num_new)
+        for j in range(num_new):
+            points_x,points_y = self.get_compound_line_points(compound_lines_x_coords[j],compound_lines_y_coords[j],first+j)
+            self.compound_line_points_x_coords.append(points_x)
+            self.compound_line_points_y_coords.append(points_y)
+            projected_x,projected_y = self.project_storage(points_x,points_y)
+            self.compound_line_points_x_projected.append(projected_x)
+            self.compound_line_points_y_projected.append(projected_y)
+            self.compound_line_points_importance.append(douglas_peucker_importance(points_x,points_y))
+        self.num_compound_lines += num_new
+        self.calculate_compound_lines_midpoint(first)
+        midpoint_x_projected,midpoint_y_projected = self.projection.project(self.compound_lines_midpoint_x_coord[first:],self.compound_lines_midpoint_y_coord[first:])
+        self.compound_lines_midpoint_x_projected = self.append_list(self.compound_lines_midpoint_x_projected,midpoint_x_projected)
+        self.compound_lines_midpoint_y_projected = self.append_list(self.compound_lines_midpoint_y_projected,midpoint_y_projected)
+        self.compound_lines_width = self.append_list(self.compound_lines_width,compound_lines_width)
+        self.compound_lines_colour = self.append_list(self.compound_lines_colour,compound_lines_colour)
+        self.compound_lines_name = self.append_list(self.compound_lines_name,compound_lines_name)
+        for band_points in self.compound_lines_bands.values(): #the new lines are simplified when first drawn
+            band_points.extend([None]*num_new)
+        if pixels_needed:
+            self.calculate_compound_lines_pixels_from(first)
+            for view in self.model.views:
+                view.compound_lines_canvas_ids = view.append_canvas_ids(view.compound_lines_canvas_ids,first,self.num_compound_lines)
+            self.mark_dirty('compound_lines_dirty_geometry',range(first,self.num_compound_lines)) #drawn on the next render
+        min_x,min_y,max_x,max_y = boxes = self.get_compound_lines_boxes(range(first,self.num_compound_lines))
+        self.compound_lines_index = self.grow_spatial_grid(self.compound_lines_index,'compound_lines_index',self.compound_lines_removed,boxes,
+                                                           lambda:self.get_compound_lines_boxes(range(self.num_compound_lines)))
+        self.compound_lines_max_width = max(self.compound_lines_max_width,max(compound_lines_width))
+        if first==0: #the first compound lines set the tolerance of the coarsest simplification band
+            self.compound_lines_extent = max(max(max_x)-min(min_x),max(max_y)-min(min_y)) or 1
+            self.compound_lines_bands = {}
+            for view in self.model.views:
+                view.compound_lines_band = None
+        self.grow_objects_bounding_box('compound_lines',max(max_y),min(min_y),max(max_x),min(min_x))
+        self.compound_lines_assigned_flag = True
+        self.schedule_render()
+        return list(range(first,self.num_compound_lines))
+
+    #remove the compound lines at the given indices, only the canvas items of the removed lines are deleted
+    def remove_compound_lines(self,indices):
+        indices = sorted(set(indices))
+        if self.check_update_indices('compound line',self.num_compound_lines,indices,removed=self.compound_lines_removed)==False or len(indices)==0:
+            return
+        for i in indices:
+            self.compound_lines_index.delete_item(i)
+        self.compound_lines_removed.update(indices)
+        for view in self.model.views:
+            view.release_removed_objects('compound_lines',indices,view.compound_lines_canvas_ids,view.compound_lines_rendered)
+        min_x,min_y,max_x,max_y = self.get_compound_lines_boxes(indices)
+        self.shrink_objects_bounding_box('compound_lines',max(max_y),min(min_y),max(max_x),min(min_x))
+        if self.pixel_coordinates_calculated(self.compound_line_points_x,self.num_compound_lines):
+            self.mark_dirty('compound_lines_dirty_geometry',indices) #labels of the removed lines are redrawn on the next render
+        self.schedule_render()
+
+    #assign nodes and positions to determine the points of compound lines
+    def assign_compound_lines_nodes_and_positions(self,lines_x_coords,lines_y_coords,start_node_type,start_node_index,end_node_type,end_node_index):
+        if len(lines_x_coords)!=self.num_compound_lines:
+            message = "You must provide the points of every compound line \n returning blank data as default"
+            self.warning_print(message)
+            self.num_compound_lines = 0
+            return
+        #empty lists of node types indicate that all lines use their given points
+        self.compound_lines_start_node_type = list(start_node_type) if len(start_node_type)>0 else ['none']*self.num_compound_lines
+        self.compound_lines_start_node_index = list(start_node_index) if len(start_node_type)>0 else [-1]*self.num_compound_lines
+        self.compound_lines_end_node_type = list(end_node_type) if len(end_node_type)>0 else ['none']*self.num_compound_lines
+        self.compound_lines_end_node_index = list(end_node_index) if len(end_node_type)>0 else [-1]*self.num_compound_lines
+        for i in range(self.num_compound_lines):
+            points_x,points_y = self.get_compound_line_points(lines_x_coords[i],lines_y_coords[i],i)
+            self.compound_line_points_x_coords.append(points_x)
+            self.compound_line_points_y_coords.append(points_y)
+
+    #get the points of compound line i from its given points, with its first or last point moved to the node it starts or ends at
+    def get_compound_line_points(self,line_x_coords,line_y_coords,i):
+        points_x = list(line_x_coords)
+        points_y = list(line_y_coords)
+        if self.compound_lines_start_node_type[i]!='none': #the line starts at a node
+            points_x[0],points_y[0] = self.extract_node_position(self.compound_lines_start_node_type[i],self.compound_lines_start_node_index[i])
+        if self.compound_lines_end_node_type[i]!='none': #the line ends at a node
+            points_x[-1],points_y[-1] = self.extract_node_position(self.compound_lines_end_node_type[i],self.compound_lines_end_node_index[i])
+        return self.make_float_storage(points_x),self.make_float_storage(points_y)
+
+    #get the indices of the compound lines given fewer than 2 points, tk needs at least 2 points to draw a line
+    def get_short_compound_lines(self,lines_x_coords,lines_y_coords):
+        return [i for i,(line_x_coords,line_y_coords) in enumerate(zip(lines_x_coords,lines_y_coords)) if min(len(line_x_coords),len(line_y_coords))<2]
+
+    #project the points and midpoints of all the compound lines, each line is projected at once
+    def project_compound_lines(self):
+        self.compound_line_points_x_projected = []
+        self.compound_line_points_y_projected = []
+        for i in range(self.num_compound_lines):
+            points_x,points_y = self.project_storage(self.compound_line_points_x_coords[i],self.compound_line_points_y_coords[i])
+            self.compound_line_points_x_projected.append(points_x)
+            self.compound_line_points_y_projected.append(points_y)
+        self.compound_lines_midpoint_x_projected,self.compound_lines_midpoint_y_projected = self.projection.project(list(self.compound_lines_midpoint_x_coord),list(self.compound_lines_midpoint_y_coord))
+
+    #calculate the midpoint of compound lines in global coordinates, this is the point halfway along the length of the line
+    #midpoints are calculated for the lines from first onwards, the lines before them already have theirs
+    def calculate_compound_lines_midpoint(self,first=0):
+        for i in range(first,self.num_compound_lines):
+            points_x = self.compound_line_points_x_coords[i]
+            points_y = self.compound_line_points_y_coords[i]
+            #length of each segment of the line
+            segment_lengths = [math.hypot(points_x[j+1]-points_x[j],points_y[j+1]-points_y[j]) for j in range(len(points_x)-1)]
+            remaining = sum(segment_lengths)/2 #distance left to travel along the line to reach the midpoint
+            midpoint_x = points_x[0]
+            midpoint_y = points_y[0]
+            for j,length in enumerate(segment_lengths):
+                if length>=remaining and length>0: #the midpoint lies on this segment
+                    fraction = remaining/length
+                    midpoint_x = points_x[j]+(points_x[j+1]-points_x[j])*fraction
+                    midpoint_y = points_y[j]+(points_y[j+1]-points_y[j])*fraction
+                    break
+                remaining = remaining-length
+            self.compound_lines_midpoint_x_coord.append(float(midpoint_x))
+            self.compound_lines_midpoint_y_coord.append(float(midpoint_y))
+
+    #get the bounding boxes (min x, min y, max x, max y) in global coordinates of the compound lines at the given indices, as python lists
+    def get_compound_lines_boxes(self,indices):
+        min_x = []
+        min_y = []
+        max_x = []
+        max_y = []
+        for i in indices:
+            line_max_x,line_min_x = self.get_storage_max_min(self.compound_line_points_x_coords[i])
+            line_max_y,line_min_y = self.get_storage_max_min(self.compound_line_points_y_coords[i])
+            min_x.append(line_min_x)
+            min_y.append(line_min_y)
+            max_x.append(line_max_x)
+            max_y.append(line_max_y)
+        return min_x,min_y,max_x,max_y
+
+    #build a spatial index of the bounding boxes of the compound lines in global coordinates
+    def build_compound_lines_index(self):
+        min_x,min_y,max_x,max_y = self.get_compound_lines_boxes(range(self.num_compound_lines))
+        self.compound_lines_index = self.build_spatial_grid('compound_lines_index',min_x,min_y,max_x,max_y)
+        self.compound_lines_max_width = max(self.compound_lines_width) if self.num_compound_lines>0 else 0 #lines are drawn up to this far from their points
+        if self.num_compound_lines>0: #the coarsest simplification band has a tolerance as large as the area covered by the lines
+            self.compound_lines_extent = max(max(max_x)-min(min_x),max(max_y)-min(min_y)) or 1
+
+    #calculate how important each point of each compound line is to its shape, which defines the simplification pyramid
+    def calculate_compound_lines_importance(self):
+        if self.precompute_workers>0:
+            parts = self.run_precompute_stage('compound_lines_importance',douglas_peucker_importance_entries,self.num_compound_lines,
+                                              lambda start,end:(self.compound_line_points_x_coords[start:end],self.compound_line_points_y_coords[start:end]))
+            self.compound_line_points_importance = []
+            for importance,offsets in parts:
+                importance = importance.tolist()
+                self.compound_line_points_importance.extend(importance[offsets[i]:offsets[i+1]] for i in range(len(offsets)-1))
+        else:
+            self.compound_line_points_importance = [douglas_peucker_importance(self.compound_line_points_x_coords[i],self.compound_line_points_y_coords[i]) for i in range(self.num_compound_lines)]
+        self.compound_lines_bands = {}
+
+    #get the simplification band to draw at the current zoom
+    #band b drops points which move the line by less than compound_lines_extent/2^b global units, None means every point is drawn
+    #zoom is the zoom of the view the lines are drawn in, by default the current zoom
+    def get_compound_lines_band(self,zoom=None):
+        if zoom is None:
+            zoom = self.view.zoom
+        tolerance = self.simplify_tolerance/(self.pixels_per_unit*zoom) #largest invisible change in global units
+        if tolerance>=self.compound_lines_extent:
+            return 0
+        band = int(math.ceil(math.log2(self.compound_lines_extent/tolerance)))
+        if band>=self.simplify_bands:
+            return None
+        return band
 
-    #calculate the midpoint of compound lines in global coordinates
-    def calculate_compound_lines_midpoint(self):
-        pass #placeholder
+    #get the flattened unzoomed pixel coordinates of a compound line simplified to a band, each band is calculated once and then cached
+    def get_compound_line_band_points(self,line,band):
+        band_points = self.compound_lines_bands.get(band)
+        if band_points is None:
+            band_points = [None]*self.num_compound_lines
+            self.compound_lines_bands[band] = band_points
+        points = band_points[line]
+        if points is None:
+            points_x = self.compound_line_points_x[line]
+            points_y = self.compound_line_points_y[line]
+            if band is None:
+                kept = range(len(points_x))
+            else:
+                tolerance = self.compound_lines_extent/2**band
+                kept = [j for j,importance in enumerate(self.compound_line_points_importance[line]) if importance>tolerance]
+            points = []
+            for j in kept:
+                points.append(float(points_x[j]))
+                points.append(float(points_y[j]))
+            band_points[line] = points
+        return points
 
     #get extreme positions from compound lines
     def get_extreme_compound_lines(self):
-        pass #placeholder
+        lines_y_coords = self.get_live_storage(self.compound_line_points_y_coords,self.compound_lines_removed)
+        lines_x_coords = self.get_live_storage(self.compound_line_points_x_coords,self.compound_lines_removed)
+        extreme_north = max(self.get_storage_max_min(points_y)[0] for points_y in lines_y_coords) #northernmost point has largest y coordinate
+        extreme_south = min(self.get_storage_max_min(points_y)[1] for points_y in lines_y_coords) #southernmost point has smallest y coordinate
+        extreme_east = max(self.get_storage_max_min(points_x)[0] for points_x in lines_x_coords) #easternmost point has largest x coordinate
+        extreme_west = min(self.get_storage_max_min(points_x)[1] for points_x in lines_x_coords) #westernmost point has smallest x coordinate
+        return extreme_north,extreme_south,extreme_east,extreme_west
 
     #calculate compound line positions in unzoomed pixel coordinates
     def calculate_compound_line_pixel_coordinates(self):
-        pass #placeholder
+        self.compound_line_points_x = []
+        self.compound_line_points_y = []
+        self.compound_lines_midpoint_x,self.compound_lines_midpoint_y = [],[]
+        self.calculate_compound_lines_pixels_from(0)
+        self.compound_lines_bands = {} #cached simplified lines are in the old pixel coordinates
+
+    #calculate the unzoomed pixel coordinates of the compound lines from first onwards, appending them after those of the lines before first
+    def calculate_compound_lines_pixels_from(self,first):
+        for i in range(first,self.num_compound_lines):
+            if self.storage_mode=='array': #convert each whole line at once
+                points_x,points_y = self.convert_projected_to_pixels(self.compound_line_points_x_projected[i],self.compound_line_points_y_projected[i])
+            else:
+                points_x = []
+                points_y = []
+                for projected_x,projected_y in zip(self.compound_line_points_x_projected[i],self.compound_line_points_y_projected[i]):
+                    x,y = self.convert_projected_to_pixels(projected_x,projected_y)
+                    points_x.append(x)
+                    points_y.append(y)
+            self.compound_line_points_x.append(points_x)
+            self.compound_line_points_y.append(points_y)
+        for projected_x,projected_y in zip(self.compound_lines_midpoint_x_projected[first:],self.compound_lines_midpoint_y_projected[first:]):
+            x,y = self.convert_projected_to_pixels(projected_x,projected_y)
+            self.compound_lines_midpoint_x.append(x)
+            self.compound_lines_midpoint_y.append(y)
 
     #apply zoom to compound lines
-    def apply_zoom_compound_lines(self,zoom_delta,mouse_x,mouse_y):
-         self.compound_line_points_x,self.compound_line_points_y = self.recalculate_list_of_list_zoom_positions(zoom_delta,mouse_x,mouse_y,self.num_compound_lines,self.compound_line_points_x,self.compound_line_points_y) #zoom the points that make up the compound lines
-         self.compound_lines_midpoint_x,self.compound_line_midpoint_y = self.recalculate_list_zoom_positions(zoom_delta,mouse_x,mouse_y,self.num_compound_lines,self.compound_lines_midpoint_x,self.compound_lines_midpoint_y) #zoom the midpoint of the compound lines
-         self.render_compound_lines() #once we have applied the zoom, render the compound lines
+    def apply_zoom_compound_lines(self):
+        if self.num_compound_lines==0:
+            return
+        if self.compound_lines_rendered_view is None or self.get_compound_lines_band()!=self.compound_lines_band: #nothing drawn yet, or a different level of simplification is needed, so redraw the lines
+            self.render_compound_lines()
+            return
+        #like lines, compound line widths are not changed by scaling the canvas
+        scale,shift_x,shift_y = self.get_view_change(self.compound_lines_rendered_view)
+        self.transform_canvas_items(self.compound_lines_tag,scale,shift_x,shift_y)
+        self.render_compound_lines(new_only=True) #then add lines which have come into view and remove those which have left
+
+    #public tools to find the objects under the cursor
+    #objects are found through the spatial indices in global coordinates, and distances are measured in screen pixels in the current view
+
+    #get the box in global coordinates covered by a square of screen pixels around a point
+    def get_screen_box_coords(self,x,y,half_size):
+        min_pixel_x,min_pixel_y = self.view.invert(x-half_size,y-half_size)
+        max_pixel_x,max_pixel_y = self.view.invert(x+half_size,y+half_size)
+        west,north = self.convert_pixels_to_coords(min_pixel_x,min_pixel_y)
+        east,south = self.convert_pixels_to_coords(max_pixel_x,max_pixel_y)
+        return min(west,east),min(south,north),max(west,east),max(south,north)
+
+    #find the circular object nearest a screen position, returning its index and distance from its edge in pixels, or None if none is within tolerance
+    def pick_circle(self,index,num_objects,pixel_x,pixel_y,radii,max_radius,x,y,tolerance):
+        if tolerance is None:
+            tolerance = self.pick_tolerance
+        if num_objects==0 or index is None or not self.pixel_coordinates_calculated(pixel_x,num_objects):
+            return None
+        candidates = index.query(*self.get_screen_box_coords(x,y,tolerance+max_radius))
+        if self.storage_mode=='array' and len(candidates)>0: #measure the distance to every candidate at once
+            index_array = np.asarray(candidates,dtype=np.intp)
+            screen_x,screen_y = self.view.apply(pixel_x[index_array],pixel_y[index_array])
+            distances = np.maximum(np.hypot(x-screen_x,y-screen_y)-radii[index_array],0)
+            nearest = int(np.argmin(distances))
+            return (candidates[nearest],float(distances[nearest])) if distances[nearest]<=tolerance else None
+        nearest = None
+        for i in candidates:
+            screen_x,screen_y = self.view.apply(pixel_x[i],pixel_y[i])
+            distance = max(math.hypot(x-screen_x,y-screen_y)-radii[i],0) #the mouse is on the object anywhere within its radius
+            if distance<=tolerance and (nearest is None or distance<nearest[1]):
+                nearest = (i,distance)
+        return nearest
+
+    #find the node nearest a screen position, returning its index and distance from its edge in pixels, or None if no node is within tolerance
+    def pick_node(self,x,y,tolerance=None):
+        return self.pick_circle(self.nodes_index,self.num_nodes,self.nodes_x,self.nodes_y,self.nodes_radii,self.nodes_max_radius,x,y,tolerance)
+
+    #find the pie node nearest a screen position, returning its index and distance from its edge in pixels, or None if no pie node is within tolerance
+    def pick_pie_node(self,x,y,tolerance=None):
+        return self.pick_circle(self.pie_nodes_index,self.num_pie_nodes,self.pie_nodes_x,self.pie_nodes_y,self.pie_nodes_radii,self.pie_nodes_max_radius,x,y,tolerance)
+
+    #find the line nearest a screen position, returning its index and distance from its edge in pixels, or None if no line is within tolerance
+    def pick_line(self,x,y,tolerance=None):
+        if tolerance is None:
+            tolerance = self.pick_tolerance
+        if self.num_lines==0 or self.lines_index is None or not self.pixel_coordinates_calculated(self.lines_start_x,self.num_lines):
+            return None
+        candidates = self.lines_index.query(*self.get_screen_box_coords(x,y,tolerance+self.lines_max_width))
+        if self.storage_mode=='array' and len(candidates)>0: #measure the distance to every candidate at once
+            index_array = np.asarray(candidates,dtype=np.intp)
+            start_x,start_y = self.view.apply(self.lines_start_x[index_array],self.lines_start_y[index_array])
+            delta_x,delta_y = self.view.apply(self.lines_end_x[index_array],self.lines_end_y[index_array])
+            delta_x = delta_x-start_x
+            delta_y = delta_y-start_y
+            length_squared = delta_x*delta_x+delta_y*delta_y
+            fraction = np.clip(((x-start_x)*delta_x+(y-start_y)*delta_y)/np.where(length_squared==0,1,length_squared),0,1)
+            distances = np.maximum(np.hypot(x-start_x-fraction*delta_x,y-start_y-fraction*delta_y)-self.lines_width[index_array]/2,0)
+            nearest = int(np.argmin(distances))
+            return (candidates[nearest],float(distances[nearest])) if distances[nearest]<=tolerance else None
+        nearest = None
+        for i in candidates:
+            start_x,start_y = self.view.apply(self.lines_start_x[i],self.lines_start_y[i])
+            end_x,end_y = self.view.apply(self.lines_end_x[i],self.lines_end_y[i])
+            distance = max(point_segment_distance(x,y,start_x,start_y,end_x,end_y)-self.lines_width[i]/2,0)
+            if distance<=tolerance and (nearest is None or distance<nearest[1]):
+                nearest = (i,distance)
+        return nearest
+
+    #find the compound line nearest a screen position, measured against the line as drawn at the current zoom
+    #returns its index and distance from its edge in pixels, or None if no compound line is within tolerance
+    def pick_compound_line(self,x,y,tolerance=None):
+        if tolerance is None:
+            tolerance = self.pick_tolerance
+        if self.num_compound_lines==0 or self.compound_lines_index is None or len(self.compound_line_points_x)!=self.num_compound_lines:
+            return None
+        candidates = self.compound_lines_index.query(*self.get_screen_box_coords(x,y,tolerance+self.compound_lines_max_width))
+        band = self.get_compound_lines_band()
+        pixel_x,pixel_y = self.view.invert(x,y) #compare in unzoomed pixels, then scale the distance to the screen
+        zoom = self.view.zoom
+        nearest = None
+        for i in candidates:
+            points = self.get_compound_line_band_points(i,band)
+            line_distance = min((point_segment_distance(pixel_x,pixel_y,points[j],points[j+1],points[j+2],points[j+3]) for j in range(0,len(points)-2,2)),default=math.hypot(pixel_x-points[0],pixel_y-points[1]))
+            distance = max(line_distance*zoom-self.compound_lines_width[i]/2,0)
+            if distance<=tolerance and (nearest is None or distance<nearest[1]):
+                nearest = (i,distance)
+        return nearest
+
+    #find the object nearest a screen position, pie nodes and nodes are preferred to lines as they are drawn on top
+    #returns the object type ('pie_node', 'node', 'line' or 'compound_line'), its index and its distance in pixels, or None if nothing is within tolerance
+    def pick(self,x,y,tolerance=None):
+        for object_type,pick_function in (('pie_node',self.pick_pie_node),('node',self.pick_node)):
+            picked = pick_function(x,y,tolerance)
+            if picked is not None:
+                return (object_type,)+picked
+        nearest = None
+        for object_type,picked in (('line',self.pick_line(x,y,tolerance)),('compound_line',self.pick_compound_line(x,y,tolerance))):
+            if picked is not None and (nearest is None or picked[1]<nearest[2]):
+                nearest = (object_type,)+picked
+        return nearest
+
+    #get the name of a picked object, used as the text of tooltips
+    def get_object_name(self,object_type,index):
+        names = {'node':self.nodes_names,'pie_node':self.pie_nodes_names,'line':self.lines_name,'compound_line':self.compound_lines_name}[object_type]
+        return str(names[index]) if index<len(names) else object_type+" "+str(index)
+
+    #set a function to be called as callback(object_type,index) when an object is clicked, None removes the callback
+    def set_click_callback(self,callback):
+        self.click_callback = callback
+
+    #show or hide the name of the object under the mouse
+    def set_hover_tooltips(self,hover_tooltips):
+        self.hover_tooltips = hover_tooltips
+        if hover_tooltips==False:
+            self.hide_tooltip()
+
+    #show the tooltip for the object under the mouse
+    def hover_map(self,event):
+        if self.hover_tooltips==False:
+            return
+        x = self.map.canvasx(event.x)
+        y = self.map.canvasy(event.y)
+        picked = self.pick(x,y)
+        if picked is None:
+            self.hide_tooltip()
+        else:
+            self.show_tooltip(x,y,self.get_object_name(picked[0],picked[1]))
+
+    #draw a tooltip next to a screen position, reusing the existing tooltip items
+    def show_tooltip(self,x,y,text):
+        items = self.map.find_withtag(self.tooltip_tag)
+        if len(items)==0:
+            self.map.create_rectangle(0,0,0,0,fill='lightyellow',outline='black',tags=(self.tooltip_tag,self.tooltip_tag+'_box'))
+            self.map.create_text(0,0,anchor='nw',tags=(self.tooltip_tag,self.tooltip_tag+'_text'))
+        self.map.itemconfigure(self.tooltip_tag+'_text',text=text)
+        self.map.coords(self.tooltip_tag+'_text',x+12,y+12)
+        left,top,right,bottom = self.map.bbox(self.tooltip_tag+'_text')
+        self.map.coords(self.tooltip_tag+'_box',left-3,top-2,right+3,bottom+2)
+        self.map.tag_raise(self.tooltip_tag+'_box')
+        self.map.tag_raise(self.tooltip_tag+'_text')
+
+    #remove the tooltip
+    def hide_tooltip(self,event=None):
+        self.map.delete(self.tooltip_tag)
+
+    #pass the object under the mouse to the click callback, if the mouse has not been dragged since the button was pressed
+    def click_map(self,event):
+        if self.click_callback is None:
+            return
+        if abs(event.x-self.drag_start_x)>3 or abs(event.y-self.drag_start_y)>3: #the map was dragged, not clicked
+            return
+        picked = self.pick(self.map.canvasx(event.x),self.map.canvasy(event.y))
+        if picked is not None:
+            self.click_callback(picked[0],picked[1])
+
+    #public tools to label objects with their names
+    #labels are placed in priority order onto a grid of screen cells, and a label is dropped if any cell it covers is taken, so labels never overlap
+    #placement only depends on the zoom, so it is done once for each zoom band over the whole map and reused while panning and when returning to the band
+    #when the band changes only the labels which appear or disappear are created or deleted, the rest are moved
+
+    #select which object types ('nodes', 'pie_nodes', 'lines', 'compound_lines') are labelled with their names, an empty selection removes every label
+    def set_labels(self,object_types,font=None,colour=None):
+        object_types = set(object_types)
+        for object_type in object_types-set(self.vector_objects):
+            self.warning_print("Label type : " + str(object_type) + " not supported, valid types are " + ", ".join(self.vector_objects))
+            object_types.discard(object_type)
+        self.labels_types = object_types
+        if font is not None:
+            self.label_font = font
+            self.label_char_width = None #the new font must be measured
+        if colour is not None:
+            self.label_colour = colour
+            for id in self.label_canvas_ids.values():
+                self.map.itemconfigure(id,fill=colour)
+        self.invalidate_labels()
+        if self.pixels_per_unit_calculated():
+            self.render_labels()
+
+    #set the priority of the label of each object of a type, higher priority labels are placed first and so are kept when labels collide
+    #by default nodes and pie nodes are prioritised by radius and lines by width
+    def set_labels_priority(self,object_type,priorities):
+        if object_type not in self.vector_objects:
+            self.warning_print("Label type : " + str(object_type) + " not supported, valid types are " + ", ".join(self.vector_objects))
+            return
+        self.labels_priorities[object_type] = list(priorities)
+        self.invalidate_labels()
+
+    #forget the placed labels, they are placed again when next drawn
+    def invalidate_labels(self):
+        self.labels_order = None
+        self.label_bands = {}
+
+    #measure the average character width and the line height of the label font, in pixels
+    def measure_label_font(self):
+        font = tkfont.Font(root=self.map,font=self.label_font)
+        return font.measure('0'),font.metrics('linespace')
+
+    #get the names, unzoomed pixel positions, global positions, radii (None for lines) and default priorities of the objects of a type
+    def get_label_objects(self,object_type):
+        if object_type=='nodes':
+            return self.num_nodes,self.nodes_names,self.nodes_x,self.nodes_y,self.nodes_x_coords,self.nodes_y_coords,self.nodes_radii,self.nodes_radii
+        if object_type=='pie_nodes':
+            return self.num_pie_nodes,self.pie_nodes_names,self.pie_nodes_x,self.pie_nodes_y,self.pie_nodes_x_coords,self.pie_nodes_y_coords,self.pie_nodes_radii,self.pie_nodes_radii
+        if object_type=='lines':
+            return self.num_lines,self.lines_name,self.lines_midpoint_x,self.lines_midpoint_y,self.lines_midpoint_x_coord,self.lines_midpoint_y_coord,None,self.lines_width
+        return self.num_compound_lines,self.compound_lines_name,self.compound_lines_midpoint_x,self.compound_lines_midpoint_y,self.compound_lines_midpoint_x_coord,self.compound_lines_midpoint_y_coord,None,self.compound_lines_width
+
+    #list every label in priority order, ties are broken by object type then index so placement is repeatable
+    #each label is stored with everything placement needs: its key, unzoomed pixel position, horizontal offset from that position, width and global position
+    def get_labels_order(self):
+        if self.label_char_width is None:
+            self.label_char_width,self.label_line_height = self.measure_label_font()
+        order = []
+        for type_order,object_type in enumerate(self.vector_objects):
+            if object_type not in self.labels_types:
+                continue
+            num_objects,names,pixel_x,pixel_y,coords_x,coords_y,radii,priorities = self.get_label_objects(object_type)
+            if not self.pixel_coordinates_calculated(pixel_x,num_objects):
+                continue
+            priorities = self.labels_priorities.get(object_type,priorities)
+            if self.storage_mode=='array': #placement works on single values, which are faster to read from lists
+                pixel_x,pixel_y,coords_x,coords_y = (self.storage_to_list(values) for values in (pixel_x,pixel_y,coords_x,coords_y)) #compound line midpoints are always lists
+            priorities = self.storage_to_list(priorities)
+            radii = radii if radii is None or isinstance(radii,list) else radii.tolist()
+            removed = self.get_removed_objects(object_type)
+            for i in range(min(num_objects,len(names),len(priorities))):
+                name = names[i]
+                if name is None or str(name)=='' or i in removed: #unnamed and removed objects have no label
+                    continue
+                width = len(str(name))*self.label_char_width
+                offset = -width/2 if radii is None else radii[i]+self.label_gap #line labels are centred on the line, node labels start just beyond the node
+                order.append((-priorities[i],type_order,i,object_type,pixel_x[i],pixel_y[i],offset,width,coords_x[i],coords_y[i]))
+        order.sort(key=lambda label:label[:3])
+        self.labels_max_width = max((label[7] for label in order),default=0)
+        return [((object_type,i),x,y,offset,width,coord_x,coord_y) for priority,type_order,i,object_type,x,y,offset,width,coord_x,coord_y in order]
+
+    #get the zoom band of a zoom level, labels are placed at the zoom at the centre of the band
+    def get_label_band(self,zoom):
+        return int(round(math.log2(zoom)*self.label_bands_per_octave))
+
+    #place the labels for a zoom band, going through the labels in priority order and keeping each one whose cells of the grid are all free
+    #this takes time proportional to the number of labels, and returns the keys of the placed labels with a spatial index of their positions
+    def place_labels(self,band):
+        if self.labels_order is None:
+            self.labels_order = self.get_labels_order()
+        scale = 2**(band/self.label_bands_per_octave) #zoom at which the labels are placed
+        cell_size = self.label_cell_size
+        height = self.label_line_height
+        occupied = set() #(column,row) of the cells covered by placed labels
+        keys = []
+        placed_x = []
+        placed_y = []
+        for key,x,y,offset,width,coord_x,coord_y in self.labels_order:
+            left = x*scale+offset
+            top = y*scale-height/2
+            columns = range(int(left//cell_size),int((left+width)//cell_size)+1)
+            rows = range(int(top//cell_size),int((top+height)//cell_size)+1)
+            if any((column,row) in occupied for row in rows for column in columns): #collides with a label of higher priority
+                continue
+            occupied.update((column,row) for row in rows for column in columns)
+            keys.append(key)
+            placed_x.append(coord_x)
+            placed_y.append(coord_y)
+        return keys,SpatialGrid(placed_x,placed_y,placed_x,placed_y)
+
+    #get the screen position and anchor of a label
+    def get_label_position(self,object_type,i):
+        if object_type=='nodes':
+            x,y = self.view.apply(self.nodes_x[i],self.nodes_y[i])
+            return x+self.nodes_radii[i]+self.label_gap,y,'w'
+        if object_type=='pie_nodes':
+            x,y = self.view.apply(self.pie_nodes_x[i],self.pie_nodes_y[i])
+            return x+self.pie_nodes_radii[i]+self.label_gap,y,'w'
+        if object_type=='lines':
+            x,y = self.view.apply(self.lines_midpoint_x[i],self.lines_midpoint_y[i])
+            return x,y,'center'
+        x,y = self.view.apply(self.compound_lines_midpoint_x[i],self.compound_lines_midpoint_y[i])
+        return x,y,'center'
+
+    #draw the placed labels of the current zoom band which are on the screen, deleting the labels which are not
+    #if new_only is True, labels which are already on the canvas are assumed to be in the right place and only newly visible labels are drawn
+    def render_labels(self,new_only=False):
+        if len(self.labels_types)==0: #labels are turned off
+            if len(self.label_canvas_ids)>0:
+                self.map.delete(self.labels_tag)
+                self.label_canvas_ids = {}
+            return
+        if not self.pixels_per_unit_calculated():
+            return
+        band = self.get_label_band(self.view.zoom)
+        if band not in self.label_bands:
+            self.label_bands[band] = self.place_labels(band)
+        keys,index = self.label_bands[band]
+        if self.culling:
+            margin = self.labels_max_width+max(self.nodes_max_radius,self.pie_nodes_max_radius)+self.label_gap
+            west,south,east,north = self.get_visible_region(self.cull_margin+margin)
+            visible = [keys[j] for j in index.query(west,south,east,north)]
+        else:
+            visible = keys
+        clustered = set() #object types currently drawn as clusters have no individual labels
+        if self.node_cluster_level is not None:
+            clustered.add('nodes')
+        if self.pie_node_cluster_level is not None:
+            clustered.add('pie_nodes')
+        visible = [key for key in visible if key[0] not in clustered]
+        visible_set = set(visible)
+        for key in list(self.label_canvas_ids): #delete the labels which have been dropped or have left the screen
+            if key not in visible_set:
+                self.map.delete(self.label_canvas_ids.pop(key))
+        created = False #have we created any new canvas items
+        for key in visible:
+            id = self.label_canvas_ids.get(key)
+            if new_only and id is not None:
+                continue
+            object_type,i = key
+            x,y,anchor = self.get_label_position(object_type,i)
+            if id is None:
+                names = self.get_label_objects(object_type)[1]
+                self.label_canvas_ids[key] = self.map.create_text(x,y,text=str(names[i]),anchor=anchor,font=self.label_font,fill=self.label_colour,tags=self.get_item_tags(object_type,i,self.labels_tag))
+                created = True
+            else:
+                self.map.coords(id,x,y)
+        self.labels_rendered_view = self.view.copy()
+        if created:
+            self.restore_z_order()
+
+    #bring the labels on the canvas up to date with the current view
+    def apply_zoom_labels(self):
+        if self.labels_rendered_view is not None and self.labels_rendered_view.zoom==self.view.zoom: #only panned, so the labels can be moved together
+            scale,shift_x,shift_y = self.get_view_change(self.labels_rendered_view)
+            self.transform_canvas_items(self.labels_tag,1,shift_x,shift_y)
+            self.render_labels(new_only=True) #then add labels which have come into view and remove those which have left
+        else:
+            self.render_labels() #the gap between an object and its label does not change with zoom, so each label must be moved
+
+    #public tools to style, order and show or hide whole layers and groups of objects
+    #every canvas item carries the tag of its layer and of each group its object belongs to, so the canvas changes them all with one call per tag
+    #the settings are recorded and applied again whenever new canvas items are created, as objects come into view or are redrawn
+
+    #get the canvas tag of a layer ('nodes', 'pie_nodes', 'lines', 'compound_lines' or 'labels')
+    def get_layer_tag(self,layer):
+        return {'nodes':self.nodes_tag,'pie_nodes':self.pie_nodes_tag,'lines':self.lines_tag,'compound_lines':self.compound_lines_tag,'labels':self.labels_tag,'heatmap':self.heatmap_tag}.get(layer)
+
+    #get the canvas tag of a group
+    def get_group_tag(self,group):
+        return 'zoom_map_group_' + str(group)
+
+    #get the tags of a new canvas item of an object, its layer tag along with the tags of the object's groups
+    def get_item_tags(self,object_type,i,tags):
+        groups = self.object_groups[object_type].get(i)
+        if groups is None:
+            return tags
+        return (tags,)+groups
+
+    #get the canvas items currently drawn for an object, including its label
+    def get_object_canvas_items(self,object_type,i):
+        canvas_ids = {'nodes':self.node_canvas_ids,'pie_nodes':self.pie_node_canvas_ids,'lines':self.lines_canvas_ids,'compound_lines':self.compound_lines_canvas_ids}[object_type]
+        items = []
+        if i<len(canvas_ids) and canvas_ids[i]!='blank':
+            items.extend(canvas_ids[i] if isinstance(canvas_ids[i],list) else [canvas_ids[i]])
+        label = self.label_canvas_ids.get((object_type,i))
+        if label is not None:
+            items.append(label)
+        return items
+
+    #add objects of a type ('nodes', 'pie_nodes', 'lines', 'compound_lines') to a group, creating the group if needed
+    def add_to_group(self,group,object_type,indices):
+        if object_type not in self.object_groups:
+            self.warning_print("Object type : " + str(object_type) + " not supported, valid types are " + ", ".join(self.object_groups))
+            return
+        if group not in self.groups:
+            self.groups[group] = {'members':{},'options':{},'hidden':False}
+        members = self.groups[group]['members'].setdefault(object_type,set())
+        tag = self.get_group_tag(group)
+        object_groups = self.object_groups[object_type]
+        for i in indices:
+            if i in members:
+                continue
+            members.add(i)
+            object_groups[i] = object_groups.get(i,())+(tag,)
+            for id in self.get_object_canvas_items(object_type,i): #items already on the canvas are tagged now, later items when they are created
+                self.map.addtag_withtag(tag,id)
+        self.apply_groups()
+
+    #remove objects of a type from a group, their canvas items lose the group's settings when next restyled or redrawn
+    def remove_from_group(self,group,object_type,indices):
+        if group not in self.groups or object_type not in self.groups[group]['members']:
+            return
+        members = self.groups[group]['members'][object_type]
+        tag = self.get_group_tag(group)
+        object_groups = self.object_groups[object_type]
+        for i in indices:
+            if i not in members:
+                continue
+            members.discard(i)
+            groups = tuple(group_tag for group_tag in object_groups[i] if group_tag!=tag)
+            if len(groups)>0:
+                object_groups[i] = groups
+            else:
+                del object_groups[i]
+            for id in self.get_object_canvas_items(object_type,i):
+                self.map.dtag(id,tag)
+
+    #remove a group, its objects keep any style it gave their canvas items until they are restyled or redrawn
+    def delete_group(self,group):
+        if group not in self.groups:
+            return
+        for object_type,members in list(self.groups[group]['members'].items()):
+            self.remove_from_group(group,object_type,list(members))
+        del self.groups[group]
+        self.groups_order.pop(group,None)
+
+    #remove every object of a type from the groups, used when the objects are replaced
+    def clear_groups_of_type(self,object_type):
+        if len(self.object_groups[object_type])==0:
+            return
+        layer_tag = self.get_layer_tag(object_type)
+        for group,settings in self.groups.items():
+            if len(settings['members'].pop(object_type,()))>0:
+                self.map.dtag(layer_tag,self.get_group_tag(group))
+        self.object_groups[object_type] = {}
+
+    #set canvas options (such as fill or width) of every object in a group with one canvas call, labels of the objects are not restyled
+    #the options must be valid for every type of canvas item in the group, and override the objects' own styles until the group is deleted
+    def style_group(self,group,**options):
+        if group not in self.groups:
+            self.warning_print("Group " + str(group) + " does not exist")
+            return
+        self.groups[group]['options'].update(options)
+        self.map.itemconfigure(self.get_group_tag(group)+'&&!'+self.labels_tag,**options)
+
+    #hide every object in a group, along with their labels
+    def hide_group(self,group):
+        self.set_group_hidden(group,True)
+
+    #show the objects in a group again
+    def show_group(self,group):
+        self.set_group_hidden(group,False)
+
+    def set_group_hidden(self,group,hidden):
+        if group not in self.groups:
+            self.warning_print("Group " + str(group) + " does not exist")
+            return
+        self.groups[group]['hidden'] = hidden
+        self.map.itemconfigure(self.get_group_tag(group),state='hidden' if hidden else 'normal')
+        if not hidden: #objects in other hidden groups or in hidden layers stay hidden
+            self.apply_groups_hidden()
+            self.apply_layers_hidden()
+
+    #hide every canvas item of a layer ('nodes', 'pie_nodes', 'lines', 'compound_lines', 'labels' or 'heatmap')
+    def hide_layer(self,layer):
+        self.set_layer_hidden(layer,True)
+
+    #show a hidden layer, objects in hidden groups stay hidden
+    def show_layer(self,layer):
+        self.set_layer_hidden(layer,False)
+
+    def set_layer_hidden(self,layer,hidden):
+        tag = self.get_layer_tag(layer)
+        if tag is None:
+            self.warning_print("Layer : " + str(layer) + " not supported, valid layers are nodes, pie_nodes, lines, compound_lines, labels and heatmap")
+            return
+        if hidden:
+            self.hidden_layers.add(layer)
+            self.map.itemconfigure(tag,state='hidden')
+        else:
+            self.hidden_layers.discard(layer)
+            self.map.itemconfigure(tag,state='normal')
+            self.apply_groups_hidden()
+
+    #raise the objects in a group above the other objects of their layer, layers keep their order so lines stay under nodes
+    def raise_group(self,group):
+        self.order_group(group,'raise')
+
+    #lower the objects in a group below the other objects of their layer
+    def lower_group(self,group):
+        self.order_group(group,'lower')
+
+    def order_group(self,group,order):
+        if group not in self.groups:
+            self.warning_print("Group " + str(group) + " does not exist")
+            return
+        self.groups_order.pop(group,None)
+        self.groups_order[group] = order #moved to the end, so it is applied after earlier raises and lowers
+        self.apply_group_order(group)
+
+    #raise or lower a group within each of its layers, one canvas call per layer
+    def apply_group_order(self,group):
+        tag = self.get_group_tag(group)
+        for object_type in list(self.groups[group]['members'])+['labels']:
+            layer_tag = self.get_layer_tag(object_type)
+            if self.groups_order[group]=='raise':
+                self.map.tag_raise(tag+'&&'+layer_tag,layer_tag)
+            else:
+                self.map.tag_lower(tag+'&&'+layer_tag,layer_tag)
+
+    def apply_groups_hidden(self):
+        for group,settings in self.groups.items():
+            if settings['hidden']:
+                self.map.itemconfigure(self.get_group_tag(group),state='hidden')
+
+    def apply_layers_hidden(self):
+        for layer in self.hidden_layers:
+            self.map.itemconfigure(self.get_layer_tag(layer),state='hidden')
+
+    def apply_groups_style(self):
+        for group,settings in self.groups.items():
+            if len(settings['options'])>0:
+                self.map.itemconfigure(self.get_group_tag(group)+'&&!'+self.labels_tag,**settings['options'])
+
+    #apply the recorded layer and group settings to the canvas items, including those created since they were set
+    def apply_groups(self):
+        for group in self.groups_order:
+            self.apply_group_order(group)
+        self.apply_groups_style()
+        self.apply_groups_hidden()
+        self.apply_layers_hidden()
+
+    #public tools to draw static layers as raster tiles
+    #objects in raster layers are drawn offscreen into square tiles, which are shown on the canvas as image items
+    #tiles are drawn by worker threads at discrete tile levels, tile_levels_per_octave for each doubling of zoom, and resized to the zoom in view
+    #so zooming reuses the cached tiles of the nearest level. While the tiles of a new level are drawn, the tiles already on the canvas are kept in place
+
+    #select which object types ('nodes', 'pie_nodes', 'lines', 'compound_lines') are drawn as raster tiles, requires Pillow
+    def set_raster_layers(self,layers):
+        layers = set(layers)
+        for layer in layers-set(self.vector_objects):
+            self.warning_print("Raster layer : " + str(layer) + " not supported, valid layers are " + ", ".join(self.vector_objects))
+            layers.discard(layer)
+        if len(layers)>0 and Image is None:
+            self.warning_print("raster layers require Pillow, which is not installed. Drawing every layer as canvas items")
+            layers = set()
+        self.raster_layers = layers
+        self.invalidate_tiles()
+        if len(layers)==0 and self.tile_pool is not None:
+            self.tile_pool.shutdown(wait=False,cancel_futures=True)
+            self.tile_pool = None
+        if self.pixels_per_unit_calculated():
+            self.render_all()
+
+    #draw some objects of a raster layer as canvas items on top of the tiles, used for objects which change or are highlighted
+    #these objects are left out of the tiles, indices replaces the previous set of objects drawn as canvas items for the layer
+    def set_vector_objects(self,object_type,indices):
+        self.vector_objects[object_type] = set(indices)
+        if object_type in self.raster_layers:
+            self.invalidate_tiles()
+            if self.pixels_per_unit_calculated():
+                self.render_all()
+
+    #has the scale of the map been determined, objects cannot be drawn before this
+    def pixels_per_unit_calculated(self):
+        return self.pixels_per_unit is not None
+
+    #discard every tile, as the objects they show have changed
+    #tiles on the canvas are kept until their replacements have been drawn, as they are still in the right place
+    def invalidate_tiles(self):
+        self.tile_generation += 1
+        self.tile_cache.clear()
+        for future in self.tiles_pending.values():
+            future.cancel()
+        self.tiles_pending = {}
+        if len(self.raster_layers)==0:
+            self.map.delete(self.raster_tiles_tag)
+            self.tiles_displayed = {}
+
+    #get the tile level nearest to the current zoom
+    def get_tile_level(self):
+        return int(round(math.log2(self.view.zoom)*self.tile_levels_per_octave))
+
+    #get the zoom at which the tiles of a level are drawn
+    def get_tile_level_zoom(self,level):
+        return 2**(level/self.tile_levels_per_octave)
+
+    #get the key identifying a tile of the current tile level and generation
+    def get_tile_key(self,column,row):
+        return (self.tile_generation,self.get_tile_level(),column,row)
+
+    #show the tiles covering the screen, drawing those which are not cached
+    def render_raster_tiles(self):
+        if len(self.raster_layers)==0 or not self.pixels_per_unit_calculated():
+            return
+        wanted = self.get_wanted_tiles()
+        for key,future in list(self.tiles_pending.items()): #stop drawing tiles which are no longer needed
+            if key not in wanted:
+                if future.cancel():
+                    del self.tiles_pending[key]
+        for key in sorted(wanted):
+            displayed = self.tiles_displayed.get(key)
+            image = displayed[2] if displayed is not None else self.tile_cache.get(key)
+            if image is not None:
+                self.display_tile(key,image) #only moved if it is already on the canvas at the right size
+            elif key not in self.tiles_pending:
+                self.request_tile(key)
+        self.remove_replaced_tiles(wanted)
+        self.raster_tiles_rendered_view = self.view.copy()
+        self.schedule_tile_poll()
+
+    #get the keys of the tiles of the current level and generation covering the screen
+    #tiles are aligned so that tile (column,row) starts at pixel (column*size,row*size) of the map drawn at the zoom of its level
+    def get_wanted_tiles(self):
+        level = self.get_tile_level()
+        size = self.tile_size*self.view.zoom/self.get_tile_level_zoom(level) #side length of the tiles on the screen
+        column_start = math.floor(-self.view.offset_x/size)
+        column_end = math.floor((self.map_width-self.view.offset_x)/size)
+        row_start = math.floor(-self.view.offset_y/size)
+        row_end = math.floor((self.map_height-self.view.offset_y)/size)
+        return set((self.tile_generation,level,column,row) for column in range(column_start,column_end+1) for row in range(row_start,row_end+1))
+
+    #get the screen rectangle (left, top, width, height) of a tile in the current view, in whole pixels so that neighbouring tiles meet without gaps
+    def get_tile_rectangle(self,level,column,row):
+        size = self.tile_size*self.view.zoom/self.get_tile_level_zoom(level)
+        left,top = int(round(column*size+self.view.offset_x)),int(round(row*size+self.view.offset_y))
+        right,bottom = int(round((column+1)*size+self.view.offset_x)),int(round((row+1)*size+self.view.offset_y))
+        return left,top,max(right-left,1),max(bottom-top,1)
+
+    #remove the tiles on the canvas which are not wanted, once every wanted tile is on the canvas
+    #until then tiles of other levels and generations within two octaves of the current zoom stay in their place in the current view, under the wanted tiles
+    def remove_replaced_tiles(self,wanted):
+        complete = all(key in self.tiles_displayed for key in wanted)
+        level = self.get_tile_level()
+        kept = []
+        for key in list(self.tiles_displayed):
+            if key in wanted:
+                continue
+            if complete or key[:2]==(self.tile_generation,level) or abs(key[1]-level)>2*self.tile_levels_per_octave:
+                self.map.delete(self.tiles_displayed.pop(key)[0])
+            else:
+                self.display_tile(key,self.tiles_displayed[key][2]) #removed if it has left the screen
+                if key in self.tiles_displayed:
+                    kept.append(self.tiles_displayed[key][0])
+        if len(kept)>0: #the replaced tiles go under the wanted tiles, which stay above the basemap
+            for id in kept:
+                self.map.tag_lower(id)
+            self.map.tag_lower(self.basemap_tag)
+
+    #show a tile image on the canvas at its place in the current view, resized from the zoom of its level to the zoom in view
+    #tiles of other levels kept on the canvas can be scaled up a long way, so only the part of them on the screen is resized
+    def display_tile(self,key,image):
+        generation,level,column,row = key
+        left,top,width,height = self.get_tile_rectangle(level,column,row)
+        crop = None #part of the tile image shown, None for the whole tile
+        if level!=self.get_tile_level():
+            right,bottom = min(left+width,self.map_width),min(top+height,self.map_height)
+            if right<=max(left,0) or bottom<=max(top,0): #off the screen
+                if key in self.tiles_displayed:
+                    self.map.delete(self.tiles_displayed.pop(key)[0])
+                return
+            scale_x,scale_y = width/self.tile_size,height/self.tile_size #screen pixels per tile pixel
+            crop = (int((max(left,0)-left)/scale_x),int((max(top,0)-top)/scale_y),int(math.ceil((right-left)/scale_x)),int(math.ceil((bottom-top)/scale_y)))
+            left,top = left+int(round(crop[0]*scale_x)),top+int(round(crop[1]*scale_y))
+            width,height = max(int(round((crop[2]-crop[0])*scale_x)),1),max(int(round((crop[3]-crop[1])*scale_y)),1)
+        displayed = self.tiles_displayed.get(key)
+        if displayed is not None and displayed[3]==(crop,width,height): #the same photo fits, so it only needs moving
+            self.map.coords(displayed[0],left,top)
+            return
+        part = image if crop is None else image.crop(crop)
+        photo = self.make_tile_photo(part if part.size==(width,height) else part.resize((width,height),Image.BILINEAR))
+        if displayed is None:
+            id = self.map.create_image(left,top,image=photo,anchor='nw',tags=self.raster_tiles_tag)
+            self.map.tag_lower(id)
+        else:
+            id = displayed[0]
+            self.map.itemconfigure(id,image=photo)
+            self.map.coords(id,left,top)
+        self.tiles_displayed[key] = (id,photo,image,(crop,width,height)) #the photo must be kept referenced for tk to keep showing it
+
+    #convert a tile image to a tk image, must be called from the main thread
+    def make_tile_photo(self,image):
+        return ImageTk.PhotoImage(image)
+
+    #get the rgb colour of a tk colour, looked up through tk the first time it is used
+    def get_tile_colour(self,colour):
+        rgb = self.tile_colours.get(colour)
+        if rgb is None:
+            red,green,blue = self.map.winfo_rgb(colour) #16 bit channels
+            rgb = (red>>8,green>>8,blue>>8)
+            self.tile_colours[colour] = rgb
+        return rgb
+
+    #find the objects which overlap a tile and start drawing the tile in a worker thread
+    def request_tile(self,key):
+        generation,level,column,row = key
+        zoom = self.get_tile_level_zoom(level)
+        size = self.tile_size
+        def get_layer_objects(layer,index,num_objects,extra_margin,colours):
+            if layer not in self.raster_layers or num_objects==0:
+                return []
+            margin = extra_margin+1 #objects extend beyond their coordinates by up to their radius or width
+            west,north = self.convert_pixels_to_coords((column*size-margin)/zoom,(row*size-margin)/zoom)
+            east,south = self.convert_pixels_to_coords(((column+1)*size+margin)/zoom,((row+1)*size+margin)/zoom)
+            vector_objects = self.vector_objects[layer]
+            objects = [i for i in index.query(west,south,east,north) if i not in vector_objects]
+            for i in objects: #colours are looked up in the main thread, as only it may use tk
+                for colour in ([colours[i]] if isinstance(colours[i],str) else colours[i]):
+                    if colour not in self.tile_colours:
+                        self.get_tile_colour(colour)
+            return objects
+        layers = {
+            'lines':get_layer_objects('lines',self.lines_index,self.num_lines,self.lines_max_width,self.lines_colour),
+            'compound_lines':get_layer_objects('compound_lines',self.compound_lines_index,self.num_compound_lines,self.compound_lines_max_width,self.compound_lines_colour),
+            'nodes':get_layer_objects('nodes',self.nodes_index,self.num_nodes,self.nodes_max_radius,self.nodes_colours),
+            'pie_nodes':get_layer_objects('pie_nodes',self.pie_nodes_index,self.num_pie_nodes,self.pie_nodes_max_radius,self.pie_nodes_colours),
+        }
+        band = self.get_compound_lines_band(zoom) if len(layers['compound_lines'])>0 else None
+        if self.tile_pool is None:
+            self.tile_pool = ThreadPoolExecutor(max_workers=self.tile_workers)
+        self.tiles_pending[key] = self.tile_pool.submit(self.draw_tile,zoom,column*size,row*size,layers,band)
+
+    #draw the objects of the raster layers into a tile image, run in a worker thread so it must not use tk
+    #origin_x,origin_y is the zoomed pixel position of the upper left corner of the tile
+    #helpers are called through the class, bypassing any instrumentation wrappers which only the main thread may use
+    def draw_tile(self,zoom,origin_x,origin_y,layers,band):
+        image = Image.new('RGBA',(self.tile_size,self.tile_size),(0,0,0,0)) #transparent where there are no objects
+        draw = ImageDraw.Draw(image)
+        colours = self.tile_colours
+        def subset(values,indices):
+            return ZoomMap.get_storage_subset(self,values,indices)
+        lines = layers['lines']
+        if len(lines)>0:
+            start_x = subset(self.lines_start_x,lines)
+            start_y = subset(self.lines_start_y,lines)
+            end_x = subset(self.lines_end_x,lines)
+            end_y = subset(self.lines_end_y,lines)
+            widths = subset(self.lines_width,lines)
+            for j,i in enumerate(lines):
+                draw.line((start_x[j]*zoom-origin_x,start_y[j]*zoom-origin_y,end_x[j]*zoom-origin_x,end_y[j]*zoom-origin_y),fill=colours[self.lines_colour[i]],width=max(int(round(widths[j])),1))
+        for i in layers['compound_lines']:
+            points = ZoomMap.get_compound_line_band_points(self,i,band)
+            draw.line([value*zoom-origin_x if j%2==0 else value*zoom-origin_y for j,value in enumerate(points)],fill=colours[self.compound_lines_colour[i]],width=max(int(round(self.compound_lines_width[i])),1),joint='curve')
+        nodes = layers['nodes']
+        if len(nodes)>0:
+            nodes_x = subset(self.nodes_x,nodes)
+            nodes_y = subset(self.nodes_y,nodes)
+            radii = subset(self.nodes_radii,nodes)
+            for j,i in enumerate(nodes):
+                x = nodes_x[j]*zoom-origin_x
+                y = nodes_y[j]*zoom-origin_y
+                draw.ellipse((x-radii[j],y-radii[j],x+radii[j],y+radii[j]),fill=colours[self.nodes_colours[i]])
+        for i in layers['pie_nodes']:
+            x = self.pie_nodes_x[i]*zoom-origin_x
+            y = self.pie_nodes_y[i]*zoom-origin_y
+            radius = self.pie_nodes_radii[i]
+            for start,extent,colour in zip(self.pie_nodes_slice_starts[i],self.pie_nodes_slice_extents[i],self.pie_nodes_colours[i]):
+                if extent>0: #Pillow angles run clockwise, tk angles anticlockwise
+                    draw.pieslice((x-radius,y-radius,x+radius,y+radius),-(start+extent),-start,fill=colours[colour])
+        return image
+
+    #collect tiles which have finished drawing, cache them and show those still needed
+    def poll_tiles(self):
+        self.tiles_poll_scheduled = None
+        wanted = self.get_wanted_tiles()
+        displayed = False #have any tiles been put on the canvas
+        for key,future in list(self.tiles_pending.items()):
+            if not future.done():
+                continue
+            del self.tiles_pending[key]
+            if future.cancelled() or key[0]!=self.tile_generation: #the objects changed while the tile was drawn
+                continue
+            if future.exception() is not None:
+                self.warning_print("drawing raster tile " + str(key[2:]) + " failed : " + str(future.exception()))
+                continue
+            image = future.result()
+            self.tile_cache.put(key,image)
+            if key in wanted: #still needed at the level the tile was drawn for
+                self.display_tile(key,image)
+                displayed = True
+        if displayed: #tiles they replace can be removed once every wanted tile has arrived
+            self.remove_replaced_tiles(wanted)
+        self.schedule_tile_poll()
+
+    #check for finished tiles again shortly if any are still being drawn
+    def schedule_tile_poll(self):
+        if len(self.tiles_pending)>0 and self.tiles_poll_scheduled is None:
+            self.tiles_poll_scheduled = self.map.after(15,self.poll_tiles)
+
+    #public tools to draw the density of nodes as a heatmap, requires numpy and Pillow
+    #the nodes are binned into a grid of cells a few screen pixels across, which is blurred, coloured by density and shown as a single image item
+    #the weights are summed once into a pyramid of grids of every resolution, so zooming and panning only cut out and blur the part of a level
+    #in view rather than binning every node again. When zoomed in beyond the finest level, the nodes in view are binned directly
+
+    #show a heatmap of the density of the nodes, weights gives a value for each node, or each node counts as 1 if None
+    #nodes appended after the heatmap is set count as 1 and removed nodes count as 0
+    #cell_size is the side length of the cells in screen pixels (each cell covers between one and two times this), blur_radius is in cells,
+    #colours run from the lowest to the highest density, and opacity is that of the densest cells
+    def set_heatmap(self,weights=None,cell_size=4,blur_radius=2,colours=('blue','cyan','lime','yellow','red'),opacity=0.6,num_levels=11):
+        if np is None or Image is None:
+            self.warning_print("the heatmap requires numpy and Pillow, which are not both installed. Heatmap not shown")
+            return
+        if weights is not None and len(weights)!=self.num_nodes:
+            self.warning_print(str(len(weights)) + " heatmap weights given for " + str(self.num_nodes) + " nodes. Heatmap not shown")
+            return
+        self.heatmap = {'weights':None if weights is None else np.array(weights,dtype=np.float64),'cell_size':cell_size,'blur_radius':blur_radius,'colours':colours,'opacity':opacity,'num_levels':num_levels}
+        self.heatmap_pyramid = None
+        self.heatmap_palette = None
+        if self.pixels_per_unit_calculated():
+            self.render_heatmap()
+
+    #remove the heatmap
+    def clear_heatmap(self):
+        self.heatmap = None
+        self.heatmap_pyramid = None
+        self.map.delete(self.heatmap_tag)
+        self.heatmap_displayed = None
+        self.heatmap_rendered_view = None
+
+    #build the pyramid of the weights of the nodes, in unzoomed pixel coordinates
+    def build_heatmap_pyramid(self):
+        weights = self.get_heatmap_weights(np.arange(self.num_nodes))
+        weights[sorted(self.nodes_removed)] = 0
+        self.heatmap_pyramid = DensityPyramid(self.nodes_x,self.nodes_y,weights,self.heatmap['num_levels'])
+        self.heatmap_generation = self.nodes_pixels_generation
+
+    #get the heatmap weight of each of the nodes at the given indices, nodes beyond the given weights were appended later and count as 1
+    def get_heatmap_weights(self,indices):
+        indices = np.asarray(indices,dtype=np.intp)
+        weights = np.ones(len(indices))
+        given = self.heatmap['weights']
+        if given is not None:
+            inside = indices<len(given)
+            weights[inside] = given[indices[inside]]
+        return weights
+
+    #add the weights of the nodes at the given indices to the heatmap pyramid of every map drawing the nodes at their unzoomed pixel positions, or take them away if sign is -1
+    #moved, appended and removed nodes only change the cells they leave or enter, the pyramid is built again only when every node has new pixel coordinates
+    def update_heatmap_pyramids(self,indices,points_x,points_y,sign=1):
+        if len(indices)==0:
+            return
+        for view in self.model.views:
+            if view.heatmap_pyramid is not None and view.heatmap_generation==self.nodes_pixels_generation:
+                view.heatmap_pyramid.add_points(points_x,points_y,sign*view.get_heatmap_weights(indices))
+
+    #get the rgba colour of each of 256 densities, from transparent for the lowest to the last colour at full opacity for the highest
+    def get_heatmap_palette(self):
+        if self.heatmap_palette is None:
+            stops = np.array([self.get_tile_colour(colour) for colour in self.heatmap['colours']],dtype=np.float64)
+            positions = np.linspace(0,1,256)
+            stop_positions = np.linspace(0,1,len(stops))
+            palette = np.zeros((256,4),dtype=np.uint8)
+            for channel in range(3):
+                palette[:,channel] = np.round(np.interp(positions,stop_positions,stops[:,channel]))
+            palette[:,3] = np.round(np.minimum(positions*4,1)*self.heatmap['opacity']*255) #sparse areas fade out
+            palette[0,3] = 0 #empty cells are transparent
+            self.heatmap_palette = palette
+        return self.heatmap_palette
+
+    #draw the heatmap in the current view
+    def render_heatmap(self):
+        if self.heatmap is None or not self.pixels_per_unit_calculated():
+            return
+        if not self.pixel_coordinates_calculated(self.nodes_x,self.num_nodes): #no nodes to show
+            self.map.delete(self.heatmap_tag)
+            self.heatmap_displayed = None
+            return
+        if self.heatmap_pyramid is None or self.heatmap_generation!=self.nodes_pixels_generation:
+            self.build_heatmap_pyramid()
+        pyramid = self.heatmap_pyramid
+        cell_size = self.heatmap['cell_size']
+        radius = self.heatmap['blur_radius']
+        zoom = self.view.zoom
+        level = pyramid.get_level(cell_size/zoom)
+        finest = pyramid.num_levels-1
+        if level is None and pyramid.get_cell_size(finest)*zoom<=4*cell_size: #just beyond the finest level, coarser cells are quicker than binning the many nodes still in view
+            level = finest
+        if level is not None: #cut the cells in view out of a level of the pyramid
+            cell = pyramid.get_cell_size(level) #side length of the cells in unzoomed pixels
+            min_x,min_y = self.view.invert(0,0)
+            max_x,max_y = self.view.invert(self.map_width,self.map_height)
+            column_start = int(math.floor((min_x-pyramid.min_x)/cell))-radius
+            row_start = int(math.floor((min_y-pyramid.min_y)/cell))-radius
+            num_columns = int(math.floor((max_x-pyramid.min_x)/cell))+radius+1-column_start
+            num_rows = int(math.floor((max_y-pyramid.min_y)/cell))+radius+1-row_start
+            weights = pyramid.get_window(level,column_start,row_start,num_columns,num_rows)
+            left,top = self.view.apply(pyramid.min_x+column_start*cell,pyramid.min_y+row_start*cell)
+            reference = pyramid.levels_max[level] #density shown at full colour
+        else: #zoomed in beyond the finest level, so bin the nodes in view into cells aligned to the screen
+            cell = cell_size/zoom
+            column_start = row_start = -radius
+            num_columns = int(math.ceil(self.map_width/cell_size))+2*radius
+            num_rows = int(math.ceil(self.map_height/cell_size))+2*radius
+            visible = np.asarray(self.nodes_index.query(*self.get_visible_region(radius*cell_size)),dtype=np.intp)
+            screen_x,screen_y = self.view.apply(np.asarray(self.nodes_x)[visible],np.asarray(self.nodes_y)[visible])
+            columns = np.floor(screen_x/cell_size).astype(np.int64)-column_start
+            rows = np.floor(screen_y/cell_size).astype(np.int64)-row_start
+            inside = (columns>=0)&(columns<num_columns)&(rows>=0)&(rows<num_rows)
+            node_weights = None if self.heatmap['weights'] is None else self.get_heatmap_weights(visible)[inside]
+            weights = np.bincount(rows[inside]*num_columns+columns[inside],weights=node_weights,minlength=num_rows*num_columns).astype(np.float64).reshape(num_rows,num_columns)
+            left,top = -radius*cell_size,-radius*cell_size
+            reference = pyramid.levels_max[finest]*(cell/pyramid.get_cell_size(finest))**2 #the densest finest cell spread over cells of this size
+        weights = blur_grid(weights,radius)
+        if reference>0: #logarithmic scale, so sparse areas still show
+            densities = np.log1p(np.maximum(weights,0))/math.log1p(reference)
+        else:
+            densities = np.zeros(weights.shape)
+        indices = np.clip(np.round(densities*255),0,255).astype(np.uint8)
+        indices[(indices==0)&(weights>1e-9*max(reference,1))] = 1 #cells with any weight are not transparent
+        image = Image.fromarray(self.get_heatmap_palette()[indices],'RGBA')
+        screen_cell = cell*zoom #side length of the cells on the screen
+        image = image.resize((max(int(round(num_columns*screen_cell)),1),max(int(round(num_rows*screen_cell)),1)),Image.BILINEAR)
+        photo = self.make_tile_photo(image)
+        if self.heatmap_displayed is None:
+            id = self.map.create_image(left,top,image=photo,anchor='nw',tags=self.heatmap_tag)
+            self.heatmap_displayed = (id,photo)
+            self.restore_z_order()
+        else:
+            id = self.heatmap_displayed[0]
+            self.map.itemconfigure(id,image=photo)
+            self.map.coords(id,left,top)
+            self.heatmap_displayed = (id,photo) #the photo must be kept referenced for tk to keep showing it
+        self.heatmap_rendered_view = self.view.copy()
+
+    #public tools to show a basemap under the map objects
+    #the basemap is made of slippy map tiles, so global coordinates must be longitude (x) and latitude (y) in degrees
+    #each tile is placed on the screen by converting the coordinates of its corners, so it lines up with the scale from determine_scale
+
+    #show tiles read from a directory or MBTiles file under the map, or remove the basemap if path is None, requires Pillow
+    def set_basemap(self,path,tile_template='{z}/{x}/{y}.png',min_zoom=None,max_zoom=None,workers=4,memory_budget=64*1024*1024):
+        self.map.delete(self.basemap_tag)
+        self.basemap_displayed = {}
+        for future in self.basemap_pending.values():
+            future.cancel()
+        self.basemap_pending = {}
+        self.basemap_missing = set()
+        if self.basemap_pool is not None:
+            self.basemap_pool.shutdown(wait=False,cancel_futures=True)
+            self.basemap_pool = None
+        self.basemap = None
+        if path is None:
+            return
+        if Image is None:
+            self.warning_print("a basemap requires Pillow, which is not installed. No basemap will be shown")
+            return
+        if not os.path.exists(path):
+            self.warning_print("Basemap : " + str(path) + " does not exist. No basemap will be shown")
+            return
+        self.basemap = BasemapTiles(path,tile_template,min_zoom,max_zoom)
+        self.basemap_cache = TileCache(memory_budget)
+        self.basemap_pool = ThreadPoolExecutor(max_workers=workers)
+        if self.pixels_per_unit_calculated():
+            self.render_basemap()
+
+    #get the slippy map zoom level whose tiles are closest to their natural size on the screen
+    def get_basemap_zoom(self):
+        pixels_per_degree = self.pixels_per_unit*self.view.zoom
+        zoom = int(round(math.log2(max(pixels_per_degree*360/256,1e-9))))
+        return max(self.basemap.min_zoom,min(zoom,self.basemap.max_zoom))
+
+    #get the screen rectangle covered by a basemap tile, rounded to whole pixels
+    def get_basemap_tile_rectangle(self,zoom,x,y):
+        left,top = self.view.apply(*self.convert_coords_to_pixels(tile_x_to_longitude(x,zoom),tile_y_to_latitude(y,zoom)))
+        right,bottom = self.view.apply(*self.convert_coords_to_pixels(tile_x_to_longitude(x+1,zoom),tile_y_to_latitude(y+1,zoom)))
+        left = int(round(left))
+        top = int(round(top))
+        return left,top,max(int(round(right))-left,1),max(int(round(bottom))-top,1)
+
+    #show the basemap tiles covering the screen, loading those which are not cached
+    #until a tile has loaded, the part of the nearest cached lower zoom tile which covers it is shown enlarged
+    def render_basemap(self):
+        if self.basemap is None or not self.pixels_per_unit_calculated():
+            return
+        zoom = self.get_basemap_zoom()
+        west,south,east,north = self.get_visible_region(0)
+        x_start = int(math.floor(longitude_to_tile_x(west,zoom)))
+        x_end = int(math.floor(longitude_to_tile_x(east,zoom)))
+        y_start = int(math.floor(latitude_to_tile_y(north,zoom)))
+        y_end = int(math.floor(latitude_to_tile_y(south,zoom)))
+        num_tiles = 2**zoom
+        wanted = set((zoom,x,y) for x in range(max(x_start,0),min(x_end,num_tiles-1)+1) for y in range(max(y_start,0),min(y_end,num_tiles-1)+1))
+        for tile,displayed in list(self.basemap_displayed.items()): #remove tiles which are off the screen or from another zoom
+            if tile not in wanted:
+                self.map.delete(displayed[0])
+                del self.basemap_displayed[tile]
+        for tile,future in list(self.basemap_pending.items()): #stop loading tiles which are no longer needed
+            if tile not in wanted and future.cancel():
+                del self.basemap_pending[tile]
+        for tile in wanted:
+            if tile not in self.basemap_missing and self.basemap_cache.get(tile) is None and tile not in self.basemap_pending:
+                self.basemap_pending[tile] = self.basemap_pool.submit(self.basemap.load_tile,*tile)
+            self.display_basemap_tile(tile)
+        self.basemap_rendered_view = self.view.copy()
+        self.schedule_basemap_poll()
+
+    #show the best available image of a basemap tile, resized to its place on the screen
+    def display_basemap_tile(self,tile):
+        zoom,x,y = tile
+        left,top,width,height = self.get_basemap_tile_rectangle(zoom,x,y)
+        displayed = self.basemap_displayed.get(tile)
+        #find the tile itself, or the nearest lower zoom tile which covers it
+        source = None
+        for levels_up in range(0,zoom-self.basemap.min_zoom+1):
+            parent = (zoom-levels_up,x>>levels_up,y>>levels_up)
+            image = self.basemap_cache.get(parent)
+            if image is not None:
+                source = parent
+                break
+        if source is None:
+            return
+        if displayed is not None and displayed[2:]==(source,width,height): #the same image at the same size, so it only needs moving
+            self.map.coords(displayed[0],left,top)
+            return
+        if levels_up>0: #cut out the part of the lower zoom tile covering this tile
+            part_width = image.width/2**levels_up
+            part_height = image.height/2**levels_up
+            part_x = (x-(source[1]<<levels_up))*part_width
+            part_y = (y-(source[2]<<levels_up))*part_height
+            image = image.crop((int(part_x),int(part_y),max(int(part_x+part_width),int(part_x)+1),max(int(part_y+part_height),int(part_y)+1)))
+        photo = self.make_tile_photo(image.resize((width,height)))
+        if displayed is None:
+            id = self.map.create_image(left,top,image=photo,anchor='nw',tags=self.basemap_tag)
+            self.map.tag_lower(id)
+        else:
+            id = displayed[0]
+            self.map.itemconfigure(id,image=photo)
+            self.map.coords(id,left,top)
+        self.basemap_displayed[tile] = (id,photo,source,width,height) #the photo must be kept referenced for tk to keep showing it
+
+    #collect basemap tiles which have loaded, cache them and show those still needed
+    def poll_basemap(self):
+        self.basemap_poll_scheduled = None
+        for tile,future in list(self.basemap_pending.items()):
+            if not future.done():
+                continue
+            del self.basemap_pending[tile]
+            if future.cancelled():
+                continue
+            if future.exception() is not None:
+                self.warning_print("loading basemap tile " + str(tile) + " failed : " + str(future.exception()))
+                self.basemap_missing.add(tile)
+                continue
+            image = future.result()
+            if image is None:
+                self.basemap_missing.add(tile)
+                continue
+            self.basemap_cache.put(tile,image)
+            if tile in self.basemap_displayed or tile[0]==self.get_basemap_zoom(): #still needed
+                self.display_basemap_tile(tile)
+        self.schedule_basemap_poll()
+
+    #check for loaded basemap tiles again shortly if any are still loading
+    def schedule_basemap_poll(self):
+        if len(self.basemap_pending)>0 and self.basemap_poll_scheduled is None:
+            self.basemap_poll_scheduled = self.map.after(15,self.poll_basemap)
+
+    #public tools to stream updates from other threads
+    #tk may only be used from the main thread, so other threads push updates to a queue which the main loop applies at a fixed interval
+
+    #updates which can be pushed, each is applied through the update method of the same name
+    streamed_updates = ('nodes_colours','nodes_radii','nodes_positions','pie_nodes_slices','lines_colours','lines_widths','lines_positions','compound_lines_colours','compound_lines_widths')
+
+    #start applying updates pushed by other threads every interval milliseconds, must be called from the main thread
+    def start_update_stream(self,interval=50,max_pending=100000):
+        self.stop_update_stream()
+        self.update_queue = UpdateQueue(max_pending)
+        self.update_stream_interval = interval
+        self.update_stream_scheduled = self.map.after(self.update_stream_interval,self.drain_updates)
+
+    #stop applying pushed updates, any updates still queued are applied first
+    def stop_update_stream(self):
+        if self.update_queue is None:
+            return
+        self.map.after_cancel(self.update_stream_scheduled)
+        self.apply_queued_updates()
+        self.update_queue = None
+        self.update_stream_scheduled = None
+
+    #queue updates to a batch of objects, safe to call from any thread
+    #update is one of streamed_updates and values are the arguments of its update method after the indices, for example
+    #push_update('nodes_colours',indices,colours) or push_update('lines_positions',indices,start_x,start_y,end_x,end_y)
+    #returns False if the update stream is not running, or the queue stayed full for longer than timeout seconds
+    def push_update(self,update,indices,*values,block=True,timeout=None):
+        update_queue = self.update_queue
+        if update_queue is None:
+            self.warning_print("update pushed but the update stream is not running, call start_update_stream first")
+            return False
+        if update not in self.streamed_updates:
+            self.warning_print("Update : " + str(update) + " is not supported, valid updates are " + ", ".join(self.streamed_updates))
+            return False
+        for value in values:
+            if len(value)!=len(indices):
+                self.warning_print(str(len(indices)) + " indices given but " + str(len(value)) + " values, update ignored")
+                return False
+        return update_queue.push(update,indices,values,block,timeout)
+
+    #apply the queued updates, called by tk every update_stream_interval milliseconds
+    def drain_updates(self):
+        self.apply_queued_updates()
+        self.update_stream_scheduled = self.map.after(self.update_stream_interval,self.drain_updates)
+
+    #apply every queued update through the update methods, which mark the objects dirty so they are drawn on the next frame
+    def apply_queued_updates(self):
+        for update,updates in self.update_queue.take_all().items():
+            update_method = getattr(self,'update_'+update)
+            by_arity = {} #updates may be pushed with and without optional arguments, so apply each form separately
+            for i,values in updates.items():
+                indices,arguments = by_arity.setdefault(len(values),([],[[] for value in values]))
+                indices.append(i)
+                for argument,value in zip(arguments,values):
+                    argument.append(value)
+            for indices,arguments in by_arity.values():
+                update_method(indices,*arguments)
+
+    #tools to run the preprocessing of objects (spatial indices, clusters and simplification pyramids) in worker processes
+    #the objects are split into parts which are processed at the same time and merged in this process, reporting progress as each part finishes
+    #worker processes import this module, so on platforms which start them by spawning a new interpreter the script creating the map
+    #must guard its entry point with if __name__=='__main__'
+
+    #set the number of worker processes, 0 does all the preprocessing in this process, part_size is the number of objects in each part
+    def set_precompute_workers(self,workers,part_size=None):
+        if self.precompute_pool is not None:
+            self.precompute_pool.shutdown()
+            self.precompute_pool = None
+        self.precompute_workers = workers
+        if part_size is not None:
+            self.precompute_part_size = part_size
+
+    #set a function to be called as callback(stage,parts_done,num_parts) as each part of the preprocessing finishes, None removes the callback
+    #the callback runs in this process, so it can update a progress display with window.update_idletasks()
+    def set_progress_callback(self,callback):
+        self.progress_callback = callback
+
+    #tell the progress callback how far a stage of the preprocessing has got
+    def report_progress(self,stage,parts_done,num_parts):
+        if self.progress_callback is not None:
+            self.progress_callback(stage,parts_done,num_parts)
+
+    #run a preprocessing stage on consecutive parts of num_objects objects, returning the result of function(*get_arguments(start,end)) for each part in order
+    #a stage with a single part is run in this process, as starting the workers would take longer than the work
+    def run_precompute_stage(self,stage,function,num_objects,get_arguments):
+        part_size = max(int(self.precompute_part_size),1)
+        parts = [(start,min(start+part_size,num_objects)) for start in range(0,num_objects,part_size)]
+        results = [None]*len(parts)
+        self.report_progress(stage,0,len(parts))
+        if len(parts)<=1:
+            for part,(start,end) in enumerate(parts):
+                results[part] = function(*get_arguments(start,end))
+                self.report_progress(stage,part+1,len(parts))
+            return results
+        if self.precompute_pool is None:
+            self.precompute_pool = ProcessPoolExecutor(max_workers=self.precompute_workers)
+        futures = {self.precompute_pool.submit(function,*get_arguments(start,end)):part for part,(start,end) in enumerate(parts)}
+        for parts_done,future in enumerate(as_completed(futures)):
+            results[futures[future]] = future.result()
+            self.report_progress(stage,parts_done+1,len(parts))
+        return results
+
+    #build a spatial grid of bounding boxes, with the cells covered by each part of the boxes found by the workers
+    def build_spatial_grid(self,stage,boxes_min_x,boxes_min_y,boxes_max_x,boxes_max_y):
+        if self.precompute_workers==0:
+            return SpatialGrid(boxes_min_x,boxes_min_y,boxes_max_x,boxes_max_y)
+        grid = SpatialGrid(boxes_min_x,boxes_min_y,boxes_max_x,boxes_max_y,insert_items=False)
+        layout = grid.get_layout()
+        grid.set_cell_entries(self.run_precompute_stage(stage,grid_cell_entries,grid.num_items,
+                                                        lambda start,end:(layout,grid.boxes_min_x[start:end],grid.boxes_min_y[start:end],grid.boxes_max_x[start:end],grid.boxes_max_y[start:end],start)))
+        return grid
+
+    #build the clusters of a set of points, with each part of the points binned into the finest level by the workers
+    #removed points keep their place in points_x and points_y, and are taken out of the clusters once they are built
+    def build_node_clusters(self,stage,points_x,points_y,removed=()):
+        if self.precompute_workers==0:
+            clusters = NodeClusters(points_x,points_y)
+        else:
+            def bin_finest_level(min_x,min_y,size,cells_per_axis):
+                parts = self.run_precompute_stage(stage,bin_points_entries,len(points_x),lambda start,end:(points_x[start:end],points_y[start:end],start,min_x,min_y,size,cells_per_axis))
+                return merge_binned_points(parts,cells_per_axis)
+            clusters = NodeClusters(points_x,points_y,bin_finest_level=bin_finest_level)
+        for i in sorted(removed):
+            clusters.remove_point(i,points_x[i],points_y[i],points_x,points_y)
+        return clusters
+
+    #add objects appended after the last item of a spatial grid to it, given the bounding boxes of the appended objects
+    #once the grid has doubled in size since it was built it is built again from get_boxes(), which gives the bounding boxes of every object,
+    #so appending costs amortized O(1) per object. Removed objects are deleted from the rebuilt grid
+    def grow_spatial_grid(self,grid,stage,removed,new_boxes,get_boxes):
+        if grid is None or grid.needs_rebuild(grid.num_items+len(new_boxes[0])):
+            grid = self.build_spatial_grid(stage,*get_boxes())
+            for i in removed:
+                grid.delete_item(i)
+            return grid
+        for min_x,min_y,max_x,max_y in zip(*new_boxes):
+            grid.append_item(min_x,min_y,max_x,max_y)
+        return grid
+
+    #add appended points to the clusters of a type of node, the clusters are built again once the points have doubled since they were last built
+    def grow_node_clusters(self,clusters,stage,removed,points_x,points_y,first):
+        if clusters is None or clusters.needs_rebuild(len(points_x)-len(removed)):
+            return self.build_node_clusters(stage,points_x,points_y,removed)
+        for i in range(first,len(points_x)):
+            clusters.add_point(i,float(points_x[i]),float(points_y[i]),points_x,points_y)
+        return clusters
+
+    #tidy up after removing objects of a type: their canvas items and labels are deleted, and they leave their groups and the vector objects of raster layers
+    #their storage is kept, so the indices of the remaining objects do not change
+    def release_removed_objects(self,object_type,indices,canvas_ids,rendered):
+        object_groups = self.object_groups[object_type]
+        for i in indices:
+            if i in object_groups:
+                for group in [group for group,settings in self.groups.items() if i in settings['members'].get(object_type,())]:
+                    self.remove_from_group(group,object_type,[i])
+            if i<len(canvas_ids):
+                self.delete_canvas_item(canvas_ids[i])
+                canvas_ids[i] = 'blank'
+            rendered.discard(i)
+            label = self.label_canvas_ids.pop((object_type,i),None)
+            if label is not None:
+                self.map.delete(label)
+            self.vector_objects[object_type].discard(i)
+
+    #public tools to save the map to a snapshot file and load it again
+    #a snapshot holds the objects, the scale and everything calculated from them (projected and pixel coordinates, spatial indices, clusters and
+    #the simplification pyramid) as columns of a binary columnar file, so loading one skips straight to the first render
+    #in array storage mode the columns are memory mapped, so loading does not read the numeric data and viewers of the same file share its pages
+
+    #get the number of objects of a type
+    def get_num_objects(self,object_type):
+        return {'nodes':self.num_nodes,'pie_nodes':self.num_pie_nodes,'lines':self.num_lines,'compound_lines':self.num_compound_lines}[object_type]
+
+    #get the indices of the removed objects of a type
+    def get_removed_objects(self,object_type):
+        return {'nodes':self.nodes_removed,'pie_nodes':self.pie_nodes_removed,'lines':self.lines_removed,'compound_lines':self.compound_lines_removed}[object_type]
+
+    #add an attribute to the columns of a snapshot, ragged attributes are flattened and stored with the offset of each object's values
+    def pack_snapshot_column(self,columns,name,values,kind,num_objects):
+        if isinstance(values,(str,int,float)): #a single value stands for the value of every object
+            values = [values]*num_objects
+        if kind=='text':
+            columns[name] = [str(value) for value in values]
+        elif np is not None and isinstance(values,np.ndarray):
+            columns[name] = values
+        elif kind=='int':
+            columns[name] = array('q',[int(value) for value in values])
+        elif kind in ('float','float_list'):
+            columns[name] = array('d',values)
+        else:
+            offsets = [0]
+            flattened = []
+            for object_values in values:
+                flattened.extend(object_values)
+                offsets.append(len(flattened))
+            columns[name+'_offsets'] = array('q',offsets)
+            self.pack_snapshot_column(columns,name,flattened,kind[len('ragged_'):],len(flattened))
+
+    #get an attribute from the columns of a snapshot in the form the map stores it
+    def unpack_snapshot_column(self,columns,name,kind):
+        values = columns[name]
+        if kind=='text':
+            return list(values)
+        if kind in ('float','int'):
+            return values #already a list or an array, as the storage mode requires
+        if kind=='float_list':
+            return values if isinstance(values,list) else values.tolist()
+        offsets = columns[name+'_offsets']
+        offsets = offsets if isinstance(offsets,list) else offsets.tolist()
+        values = self.unpack_snapshot_column(columns,name,kind[len('ragged_'):])
+        return [values[offsets[i]:offsets[i+1]] for i in range(len(offsets)-1)] #array slices are views, so the values are not copied
+
+    #save every object, the scale and the structures derived from them to a snapshot file
+    def save_snapshot(self,path):
+        if not self.pixels_per_unit_calculated():
+            self.warning_print("The scale must be determined before saving a snapshot, call determine_scale first. Snapshot not saved")
+            return
+        columns = {'snapshot_version':[SNAPSHOT_VERSION],'projection':[getattr(self.projection,'name','custom')],'scale':[float(self.pixels_per_unit),float(self.start_x),float(self.start_y)],
+                   'compound_lines_extent':[float(self.compound_lines_extent)]}
+        indices = {'nodes':self.nodes_index,'pie_nodes':self.pie_nodes_index,'lines':self.lines_index,'compound_lines':self.compound_lines_index}
+        clusters = {'nodes':self.nodes_clusters,'pie_nodes':self.pie_nodes_clusters}
+        if len(self.nodes_lines_appended_ends)>0: #appended lines are saved in the compressed incidence of nodes and lines
+            self.merge_lines_incidence()
+        for object_type,attributes in self.snapshot_attributes.items():
+            num_objects = self.get_num_objects(object_type)
+            columns[object_type+'_count'] = [num_objects]
+            if num_objects==0:
+                continue
+            columns[object_type+'_removed'] = array('q',sorted(self.get_removed_objects(object_type))) #removed objects keep their storage, so the indices of the others are saved unchanged
+            for name,kind in attributes:
+                self.pack_snapshot_column(columns,name,getattr(self,name),kind,num_objects)
+            pixel_attributes = self.snapshot_pixel_attributes[object_type]
+            if self.pixel_coordinates_calculated(getattr(self,pixel_attributes[0][0]),num_objects):
+                for name,kind in pixel_attributes:
+                    self.pack_snapshot_column(columns,name,getattr(self,name),kind,num_objects)
+            if indices[object_type] is not None:
+                columns.update(indices[object_type].pack(object_type+'_index'))
+            if clusters.get(object_type) is not None and not clusters[object_type].first_moved: #otherwise the clusters are built again when loaded
+                columns.update(clusters[object_type].pack(object_type+'_clusters'))
+        write_columns(path,columns)
+
+    #replace every object with those of a snapshot file, which can then be rendered straight away
+    #memory_map only applies in array storage mode, in list storage mode the columns are read into lists
+    def load_snapshot(self,path,memory_map=True):
+        columns = read_columns(path,self.storage_mode=='array',memory_map)
+        if 'snapshot_version' not in columns or int(columns['snapshot_version'][0])!=SNAPSHOT_VERSION:
+            raise ValueError(path + " is not a zoom_map snapshot of version " + str(SNAPSHOT_VERSION))
+        #remove the existing objects along with their canvas items in every map drawing them
+        for view in self.model.views:
+            for object_type in self.snapshot_attributes:
+                view.clear_groups_of_type(object_type)
+            view.map.delete(view.nodes_tag,view.pie_nodes_tag,view.lines_tag,view.compound_lines_tag,view.labels_tag)
+            view.label_canvas_ids = {}
+            view.init_objects()
+        self.model.init_objects()
+        #the scale, in the projection the snapshot was saved with
+        projection = columns['projection'][0]
+        if projection in projections:
+            self.projection = projections[projection]()
+        else:
+            self.warning_print("Snapshot " + path + " was saved with a custom projection, the current projection must be the same one")
+        self.pixels_per_unit,self.start_x,self.start_y = [float(value) for value in columns['scale']]
+        self.projected_start_x,self.projected_start_y = self.projection.project(self.start_x,self.start_y)
+        pixels_missing = False #have any objects been saved without pixel coordinates
+        for object_type,attributes in self.snapshot_attributes.items():
+            num_objects = int(columns[object_type+'_count'][0])
+            if num_objects==0:
+                continue
+            self.get_removed_objects(object_type).update(int(i) for i in columns.get(object_type+'_removed',[]))
+            for name,kind in attributes:
+                setattr(self,name,self.unpack_snapshot_column(columns,name,kind))
+            pixel_attributes = self.snapshot_pixel_attributes[object_type]
+            if pixel_attributes[0][0] in columns:
+                for name,kind in pixel_attributes:
+                    setattr(self,name,self.unpack_snapshot_column(columns,name,kind))
+            else:
+                pixels_missing = True
+            self.load_snapshot_objects(object_type,num_objects,columns)
+            if object_type+'_index_shape' not in columns: #the index has been built again, including the removed objects
+                for i in self.get_removed_objects(object_type):
+                    getattr(self,object_type+'_index').delete_item(i)
+        self.compound_lines_extent = float(columns['compound_lines_extent'][0])
+        if pixels_missing:
+            self.calculate_pixel_coordinates()
+        else:
+            for view in self.model.views: #give every map canvas ids for the loaded objects
+                view.reset_canvas_objects()
+        self.objects_generation += 1
+        self.nodes_pixels_generation += 1
+
+    #set up the indices and clusters of objects loaded from a snapshot
+    def load_snapshot_objects(self,object_type,num_objects,columns):
+        index_prefix = object_type+'_index'
+        clusters_prefix = object_type+'_clusters'
+        if object_type=='nodes':
+            self.num_nodes = num_objects
+            self.nodes_index = SpatialGrid.from_packed(columns,index_prefix) if index_prefix+'_shape' in columns else self.build_spatial_grid('nodes_index',self.nodes_x_coords,self.nodes_y_coords,self.nodes_x_coords,self.nodes_y_coords)
+            self.nodes_max_radius = self.get_storage_max_min(self.nodes_radii)[0]
+            if self.level_of_detail:
+                self.nodes_clusters = NodeClusters.from_packed(columns,clusters_prefix) if clusters_prefix+'_shape' in columns else self.build_node_clusters('nodes_clusters',self.nodes_x_coords,self.nodes_y_coords,self.nodes_removed)
+            self.nodes_assigned_flag = True
+        elif object_type=='pie_nodes':
+            self.num_pie_nodes = num_objects
+            self.pie_nodes_index = SpatialGrid.from_packed(columns,index_prefix) if index_prefix+'_shape' in columns else self.build_spatial_grid('pie_nodes_index',self.pie_nodes_x_coords,self.pie_nodes_y_coords,self.pie_nodes_x_coords,self.pie_nodes_y_coords)
+            self.pie_nodes_max_radius = self.get_storage_max_min(self.pie_nodes_radii)[0]
+            if self.level_of_detail:
+                self.pie_nodes_clusters = NodeClusters.from_packed(columns,clusters_prefix) if clusters_prefix+'_shape' in columns else self.build_node_clusters('pie_nodes_clusters',self.pie_nodes_x_coords,self.pie_nodes_y_coords,self.pie_nodes_removed)
+            self.pie_nodes_assigned_flag = True
+        elif object_type=='lines':
+            self.num_lines = num_objects
+            if index_prefix+'_shape' in columns:
+                self.lines_index = SpatialGrid.from_packed(columns,index_prefix)
+                self.lines_max_width = self.get_storage_max_min(self.lines_width)[0]
+            else:
+                self.build_lines_index()
+            self.lines_assigned_flag = True
+        else:
+            self.num_compound_lines = num_objects
+            if index_prefix+'_shape' in columns:
+                self.compound_lines_index = SpatialGrid.from_packed(columns,index_prefix)
+                self.compound_lines_max_width = max(self.compound_lines_width)
+            else:
+                self.build_compound_lines_index()
+            self.compound_lines_assigned_flag = True
 
     #tools to control overall movement of the map
 
@@ -742,31 +4976,440 @@ class ZoomMap:
         mouse_x = self.map.canvasx(event.x) #mouse x position
         mouse_y = self.map.canvasy(event.y) #mouse y position
         zoom_delta = self.zoom_gain*event.delta
-        self.current_zoom = self.current_zoom*(1+zoom_delta) #update the accumulated zoom level
-        self.current_zoom_offset_x = self.current_zoom_offset_x*(1+zoom_delta) - mouse_x*zoom_delta#calculate the new offset for x
-        self.current_zoom_offset_y = self.current_zoom_offset_y*(1+zoom_delta) - mouse_y*zoom_delta#calculate the new offset for y
-        self.apply_zoom_all(zoom_delta,mouse_x,mouse_y) #perform the zoom on all objects in the map
-        
+        if self.smooth_zoom:
+            target = self.animation.end_view.copy() if self.animation is not None else self.view.copy() #further zooming continues from where the map is heading
+            target.zoom_about(zoom_delta,mouse_x,mouse_y)
+            self.animate_view(target,self.zoom_duration,easing='out')
+            return
+        self.view.zoom_about(zoom_delta,mouse_x,mouse_y) #update the accumulated zoom level and offsets, this does not depend on the number of objects
+        self.schedule_render() #redraw once the burst of input events has been handled
+
+    #arrange for the map to be redrawn in the current view, at most once per frame however many input events arrive
+    def schedule_render(self):
+        if self.render_scheduled is not None: #a redraw is already pending, and it will use the latest view
+            return
+        frame_time = 1/self.max_frame_rate #shortest time between redraws, seconds
+        wait = self.last_frame_time+frame_time-time.perf_counter() #time until the next redraw is allowed, seconds
+        if wait>0:
+            self.render_scheduled = self.map.after(int(wait*1000)+1,self.render_frame)
+        else:
+            self.render_scheduled = self.map.after_idle(self.render_frame) #redraw as soon as the queued input events are handled
+
+    #redraw the map in response to the view changing, called by tk after schedule_render
+    #the layers are redrawn in turn until the frame budget is used up, the rest are moved and scaled as they are and redrawn in the next frames
+    #budgeted=False redraws every layer whatever the time taken
+    def render_frame(self,budgeted=True):
+        self.render_scheduled = None
+        frame_start = time.perf_counter()
+        self.last_frame_time = frame_start
+        if self.animation is not None:
+            self.view = self.animation.get_view(frame_start)
+        if budgeted and self.frame_budget is not None:
+            frame_end = frame_start+self.frame_budget/self.max_frame_rate #time by which the redrawing should be finished
+        else:
+            frame_end = math.inf
+        num_layers = len(self.view_layers)
+        layers_behind = False #have any layers been left to a later frame
+        for position in range(self.next_view_layer,self.next_view_layer+num_layers):
+            layer = self.view_layers[position%num_layers]
+            if not layers_behind and (position==self.next_view_layer or time.perf_counter()+self.view_layer_times.get(layer[0],0)<=frame_end): #the first layer is always redrawn, so every layer is reached in turn
+                self.update_view_layer(layer)
+            else:
+                if not layers_behind:
+                    self.next_view_layer = position%num_layers
+                    layers_behind = True
+                self.preview_view_layer(layer)
+        if not layers_behind:
+            self.next_view_layer = 0
+        self.render_dirty_objects() #then draw any changes to the objects themselves
+        if self.animation is not None and self.animation.finished(frame_start):
+            callback = self.animation.callback
+            self.animation = None
+            if callback is not None:
+                callback()
+        if self.animation is not None or layers_behind:
+            self.schedule_render()
+        self.update_overviews()
+
+    #bring a layer (an entry of view_layers) up to date with the current view, recording how long it takes
+    def update_view_layer(self,layer):
+        name,tag_attribute,view_attribute,update_method,redraw_method = layer
+        start = time.perf_counter()
+        if name in self.distorted_layers:
+            self.distorted_layers.discard(name)
+            getattr(self,redraw_method)()
+        else:
+            getattr(self,update_method)()
+        self.view_layer_times[name] = time.perf_counter()-start
+
+    #move and scale the canvas items of a layer (an entry of view_layers) to follow the view without redrawing them, used when there is no time to redraw the layer
+    #objects coming into view are not drawn and nodes and labels change size until the layer is redrawn
+    def preview_view_layer(self,layer):
+        name,tag_attribute,view_attribute,update_method,redraw_method = layer
+        rendered_view = getattr(self,view_attribute)
+        if rendered_view is None: #nothing drawn yet
+            return
+        scale,shift_x,shift_y = self.get_view_change(rendered_view)
+        self.transform_canvas_items(getattr(self,tag_attribute),scale,shift_x,shift_y)
+        if scale!=1:
+            self.distorted_layers.add(name)
+        setattr(self,view_attribute,self.view.copy())
+
+    #immediately redraw the map if a redraw is pending, rather than waiting for tk to call render_frame
+    def flush_render(self):
+        if self.render_scheduled is not None:
+            self.map.after_cancel(self.render_scheduled)
+            self.render_frame(budgeted=False)
+
+    #bring existing objects to their correct positions in the current view, however much the view has changed since they were drawn
+    #we wish to render lines before nodes so nodes appear on top
+    def apply_zoom_all(self):
+        for layer in self.view_layers:
+            self.update_view_layer(layer)
+        self.next_view_layer = 0
 
-    #recreate existing objects in the correctly zoomed positions after a zoom
-    def apply_zoom_all(self,zoom_delta,mouse_x,mouse_y):
+    #render all objects at their exact positions in the current view
+    def render_all(self):
+        self.render_basemap() #background map tiles
+        self.render_raster_tiles() #static layers drawn as tiles
+        self.render_heatmap() #density of the nodes
         #we wish to render lines before nodes so nodes appear on top
-        self.apply_zoom_lines(zoom_delta,mouse_x,mouse_y) #zoom the lines
-        self.apply_zoom_compound_lines(zoom_delta,mouse_x,mouse_y) #zoom the compound lines
-        self.apply_zoom_nodes(zoom_delta,mouse_x,mouse_y) #zoom the nodes
-        self.apply_zoom_pie_nodes(zoom_delta,mouse_x,mouse_y) #zoom the pie nodes
-        
+        self.render_lines()
+        self.render_compound_lines()
+        self.render_nodes()
+        self.render_pie_nodes()
+        self.render_labels()
+        self.render_dirty_objects() #existing canvas items of changed objects still need restyling
+        self.distorted_layers = set() #every layer has been redrawn exactly
+        self.next_view_layer = 0
+        self.update_overviews()
+
+    #public tools to show an overview of the whole map, with a rectangle marking the part of the map in view
+    #overviews read the objects of the map rather than copying them, see OverviewMap
+
+    #add an overview and return it, the overview is placed in window, or over a corner ('nw', 'ne', 'sw' or 'se') of the map if window is None
+    #options are passed on to OverviewMap
+    def add_overview(self,width=160,height=120,window=None,corner='se',**options):
+        overview = OverviewMap(self,width,height,self.window if window is None else window,**options)
+        if window is None:
+            if corner not in ('nw','ne','sw','se'):
+                self.warning_print("Overview corner : " + str(corner) + " not supported, valid corners are 'nw', 'ne', 'sw' and 'se'. Defaulting to 'se'")
+                corner = 'se'
+            overview.map.place(in_=self.map,relx=1 if 'e' in corner else 0,rely=1 if 's' in corner else 0,anchor=corner)
+        else:
+            overview.map.pack()
+        self.overviews.append(overview)
+        overview.update()
+        return overview
+
+    #remove an overview returned by add_overview, along with its canvas
+    def remove_overview(self,overview):
+        if overview not in self.overviews:
+            self.warning_print("Overview not found, remove ignored")
+            return
+        self.overviews.remove(overview)
+        if overview.summary_scheduled is not None:
+            overview.map.after_cancel(overview.summary_scheduled)
+        overview.map.destroy()
+
+    #bring the overviews up to date with the view and the objects
+    def update_overviews(self):
+        for overview in self.overviews:
+            overview.update()
+
+    #return to the unzoomed view in which the whole map fits on the screen
+    def reset_view(self):
+        self.stop_animation()
+        self.flush_render() #any pending redraw would be superseded by this one
+        self.view.reset()
+        self.render_all()
+
+    #return a copy of the current view, which can later be passed to restore_view
+    def save_view(self):
+        return self.view.copy()
+
+    #return to a view previously returned by save_view
+    def restore_view(self,view):
+        self.stop_animation()
+        self.flush_render() #any pending redraw would be superseded by this one
+        self.view = view.copy()
+        self.render_all()
+
+    #smoothly change the view to one previously returned by save_view (or get_region_view) over duration seconds
+    #callback() is called once the view is reached, an animation replaced by another before it finishes does not call its callback
+    def animate_view(self,view,duration=0.5,easing='in_out',callback=None):
+        if self.animation is not None: #start from wherever the current animation has got to
+            self.view = self.animation.get_view(time.perf_counter())
+        self.animation = ViewAnimation(self.view,view,duration,easing,callback)
+        self.schedule_render()
+
+    #stop any animation of the view where it is, the map is then redrawn exactly in that view
+    def stop_animation(self):
+        if self.animation is None:
+            return
+        self.view = self.animation.get_view(time.perf_counter())
+        self.animation = None
+        self.schedule_render()
+
+    #get the view in which a region in global coordinates fills the screen, less a border on each side given as a fraction of the screen size
+    def get_region_view(self,west,south,east,north,border_fraction=0.1):
+        left,top = self.convert_coords_to_pixels(west,north)
+        right,bottom = self.convert_coords_to_pixels(east,south)
+        zoom_x = self.map_width*(1-2*border_fraction)/max(right-left,1e-9)
+        zoom_y = self.map_height*(1-2*border_fraction)/max(bottom-top,1e-9)
+        zoom = min(zoom_x,zoom_y) #fit the whole region, the other axis shows more than asked for
+        return ViewTransform(zoom,self.map_width/2-(left+right)/2*zoom,self.map_height/2-(top+bottom)/2*zoom)
+
+    #smoothly move and zoom the map to show a region in global coordinates, see get_region_view and animate_view
+    def fly_to(self,west,south,east,north,duration=1,border_fraction=0.1,callback=None):
+        if not self.pixels_per_unit_calculated():
+            self.warning_print("The scale must be determined before flying to a region, call determine_scale first")
+            return
+        self.animate_view(self.get_region_view(west,south,east,north,border_fraction),duration,'in_out',callback)
 
     #start dragging the map
     def drag_start(self,event):
-        self.map.scan_mark(event.x,event.y) #record the position at the start of the movement
+        self.stop_animation() #the user takes over from any animation
+        #record the position at the start of the movement
+        self.drag_last_x = event.x
+        self.drag_last_y = event.y
+        self.drag_start_x = event.x
+        self.drag_start_y = event.y
 
     #stop dragging the map
     def drag_end(self,event):
-        self.map.scan_dragto(event.x,event.y,gain=self.scroll_gain) #move the "camera" in accordance with the users drag
+        #move the "camera" in accordance with the users drag
+        delta_x = (event.x-self.drag_last_x)*self.scroll_gain
+        delta_y = (event.y-self.drag_last_y)*self.scroll_gain
+        self.drag_last_x = event.x
+        self.drag_last_y = event.y
+        self.view.pan(delta_x,delta_y) #panning is part of the view, so screen positions stay consistent with zooming
+        self.schedule_render() #redraw once the burst of input events has been handled
+
+#the objects of a map are kept in its model, which maps sharing it read and change through attributes of the same names on the map
+def model_attribute(name):
+    return property(lambda self:getattr(self.model,name),lambda self,value:setattr(self.model,name,value))
+
+for name in vars(MapModel()):
+    if name!='views': #each map keeps its own canvas items, only the objects are shared
+        setattr(ZoomMap,name,model_attribute(name))
+
+
+
+
+
 
 
 
 
+#binary columnar files store each column as one contiguous block so it can be read without parsing
+#layout: magic, number of columns, then per column its name, type code ('d' float, 'q' integer, 's' text), number of values, size in bytes and the data
+#from version 2 each column's data is padded to start at a multiple of 8 bytes, so numeric columns can be used in place from a memory map
+COLUMNS_FILE_MAGIC = b'ZMCOLS02'
+COLUMNS_FILE_VERSIONS = {b'ZMCOLS01':1,b'ZMCOLS02':2} #magic of every readable version
+SNAPSHOT_VERSION = 1 #version of the columns saved in map snapshots, increased whenever they change
+
+#write a dictionary of equal length columns to a binary columnar file
+def write_columns(path,columns):
+    with open(path,'wb') as file:
+        file.write(COLUMNS_FILE_MAGIC)
+        file.write(struct.pack('<I',len(columns)))
+        for name,values in columns.items():
+            if len(values)>0 and isinstance(values[0],str): #text is stored as utf-8 separated by null characters
+                type_code = b's'
+                data = '\0'.join(values).encode('utf-8')
+            elif np is not None and isinstance(values,np.ndarray): #arrays are written in one block
+                type_code = b'd' if values.dtype.kind=='f' else b'q'
+                data = values.astype('<f8' if type_code==b'd' else '<i8').tobytes()
+            else:
+                type_code = b'd' if any(isinstance(value,float) for value in values) else b'q'
+                values_array = array(type_code.decode(),values)
+                if sys.byteorder=='big': #files are always little endian
+                    values_array.byteswap()
+                data = values_array.tobytes()
+            encoded_name = name.encode('utf-8')
+            file.write(struct.pack('<H',len(encoded_name)))
+            file.write(encoded_name)
+            file.write(type_code)
+            file.write(struct.pack('<QQ',len(values),len(data)))
+            file.write(b'\0'*(-file.tell()%8)) #align the data
+            file.write(data)
+
+#read a binary columnar file written by write_columns, numeric columns are returned as numpy arrays if use_arrays is set, otherwise as lists
+#if memory_map is also set the arrays are copy on write views of the memory mapped file, so they are not read until used and
+#processes mapping the same file share its pages, changing an array only changes this process's copy
+def read_columns(path,use_arrays=False,memory_map=False):
+    with open(path,'rb') as file:
+        if use_arrays and memory_map:
+            buffer = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_COPY)
+        else:
+            buffer = bytearray(file.read()) #writable, so arrays viewing it can be changed
+    version = COLUMNS_FILE_VERSIONS.get(bytes(buffer[:len(COLUMNS_FILE_MAGIC)]))
+    if version is None:
+        raise ValueError(path + " is not a zoom_map columnar file")
+    position = len(COLUMNS_FILE_MAGIC)
+    num_columns, = struct.unpack_from('<I',buffer,position)
+    position += 4
+    columns = {}
+    for _ in range(num_columns):
+        name_length, = struct.unpack_from('<H',buffer,position)
+        position += 2
+        name = buffer[position:position+name_length].decode('utf-8')
+        position += name_length
+        type_code = buffer[position:position+1].decode()
+        position += 1
+        num_values,num_bytes = struct.unpack_from('<QQ',buffer,position)
+        position += 16
+        if version>=2:
+            position += -position%8 #skip the alignment padding
+        if use_arrays and type_code!='s': #the whole column becomes an array in one step, without copying the data
+            columns[name] = np.frombuffer(buffer,dtype='<f8' if type_code=='d' else '<i8',count=num_values,offset=position)
+            position += num_bytes
+            continue
+        data = buffer[position:position+num_bytes]
+        position += num_bytes
+        if type_code=='s':
+            columns[name] = data.decode('utf-8').split('\0') if num_values>0 else []
+        else:
+            values_array = array(type_code)
+            values_array.frombytes(data)
+            if sys.byteorder=='big':
+                values_array.byteswap()
+            columns[name] = values_array.tolist()
+    return columns
+
+#convert location strings in the format provided by google maps ("latitude, longitude") to lists of latitudes and longitudes
+def parse_location_strings(locations,use_arrays=False):
+    values = ','.join(locations).split(',') if len(locations)>0 else [] #every location holds exactly one comma, so the values alternate latitude/longitude
+    if len(values)!=2*len(locations):
+        raise ValueError("locations must each be in the format 'latitude, longitude'")
+    if use_arrays: #convert all the values at once
+        values = np.array(values,dtype=np.float64)
+        return values[0::2],values[1::2]
+    values = [float(value) for value in values]
+    return values[0::2],values[1::2]
+
+#load node and line tables in bulk and pass them to a ZoomMap
+#lines refer to nodes by name, names are resolved through a hashed name->index map instead of searching the list of nodes
+class MapDataLoader:
+    def __init__(self,print_warnings=True,storage_mode='list'):
+        self.print_warnings = print_warnings #do we print warnings to the console
+        if storage_mode=='array' and np is None:
+            self.warning_print("storage_mode 'array' requires numpy, which is not installed. Using 'list' storage")
+            storage_mode = 'list'
+        self.use_arrays = storage_mode=='array' #numeric columns are loaded as numpy arrays
+        self.init_nodes()
+        self.init_lines()
+
+    #print warnings if allowed
+    def warning_print(self,message):
+        if self.print_warnings==True:
+            print("WARNING: ",message)
+
+    #remove any loaded nodes
+    def init_nodes(self):
+        self.num_nodes = 0
+        self.nodes_names = []
+        self.nodes_x_coords = [] #longitude
+        self.nodes_y_coords = [] #latitude
+        self.nodes_name_index = {} #name of each node -> its index
+
+    #remove any loaded lines
+    def init_lines(self):
+        self.num_lines = 0
+        self.lines_start_node_index = []
+        self.lines_end_node_index = []
+
+    #read the named columns of a csv file
+    def read_csv_columns(self,path,column_names):
+        with open(path,newline='',encoding='utf-8') as file:
+            reader = csv.reader(file)
+            header = next(reader)
+            rows = list(reader)
+        for column_name in column_names:
+            if column_name not in header:
+                raise ValueError(path + " has no column " + column_name)
+        columns = list(zip(*rows)) if len(rows)>0 else [()]*len(header) #transpose the rows into columns
+        return [list(columns[header.index(column_name)]) for column_name in column_names]
+
+    #set the loaded nodes and build the name->index map
+    def assign_nodes(self,nodes_names,nodes_x_coords,nodes_y_coords):
+        self.num_nodes = len(nodes_names)
+        self.nodes_names = list(nodes_names)
+        self.nodes_x_coords = nodes_x_coords
+        self.nodes_y_coords = nodes_y_coords
+        self.nodes_name_index = {}
+        for i,name in enumerate(self.nodes_names):
+            self.nodes_name_index.setdefault(name,i) #the first node with a name is used, as with list.index
+        if len(self.nodes_name_index)!=self.num_nodes:
+            message = str(self.num_nodes-len(self.nodes_name_index)) + " node names are duplicated, lines will use the first node with each name"
+            self.warning_print(message)
+
+    #set the loaded lines from the names of their start and end nodes, lines with an unknown node are skipped
+    def assign_lines_from_names(self,start_names,end_names):
+        name_index = self.nodes_name_index
+        start_index = [name_index.get(name,-1) for name in start_names]
+        end_index = [name_index.get(name,-1) for name in end_names]
+        if -1 in start_index or -1 in end_index:
+            keep = [i for i in range(len(start_index)) if start_index[i]!=-1 and end_index[i]!=-1]
+            message = str(len(start_index)-len(keep)) + " lines refer to nodes which do not exist, these lines have been skipped"
+            self.warning_print(message)
+            start_index = [start_index[i] for i in keep]
+            end_index = [end_index[i] for i in keep]
+        self.assign_lines(start_index,end_index)
+
+    #set the loaded lines from the indices of their start and end nodes
+    def assign_lines(self,start_index,end_index):
+        self.num_lines = len(start_index)
+        if self.use_arrays:
+            self.lines_start_node_index = np.asarray(start_index,dtype=np.intp)
+            self.lines_end_node_index = np.asarray(end_index,dtype=np.intp)
+        else:
+            self.lines_start_node_index = list(start_index)
+            self.lines_end_node_index = list(end_index)
+
+    #lookup a node name and return its index, -1 if there is no such node
+    def get_node_index(self,node_name):
+        node_index = self.nodes_name_index.get(node_name,-1)
+        if node_index==-1:
+            self.warning_print("Node " + str(node_name) + " does not exist")
+        return node_index
+
+    #read nodes from a csv file with a name column and a location column in the format "latitude, longitude"
+    def read_nodes_csv(self,path,name_column="Name",location_column="Location"):
+        nodes_names,locations = self.read_csv_columns(path,[name_column,location_column])
+        latitudes,longitudes = parse_location_strings(locations,self.use_arrays)
+        self.assign_nodes(nodes_names,longitudes,latitudes)
+
+    #read lines from a csv file with columns naming their start and end nodes, nodes must be loaded first
+    def read_lines_csv(self,path,start_column="Start",end_column="End"):
+        start_names,end_names = self.read_csv_columns(path,[start_column,end_column])
+        self.assign_lines_from_names(start_names,end_names)
+
+    #save the loaded nodes to a binary columnar file
+    def write_nodes_binary(self,path):
+        write_columns(path,{'name':self.nodes_names,'x':self.nodes_x_coords,'y':self.nodes_y_coords})
+
+    #save the loaded lines to a binary columnar file, endpoints are stored as node indices so they need no resolving when read
+    def write_lines_binary(self,path):
+        write_columns(path,{'start':self.lines_start_node_index,'end':self.lines_end_node_index})
+
+    #read nodes from a binary columnar file with 'name', 'x' and 'y' columns
+    def read_nodes_binary(self,path):
+        columns = read_columns(path,self.use_arrays)
+        self.assign_nodes(columns['name'],columns['x'],columns['y'])
+
+    #read lines from a binary columnar file with 'start' and 'end' columns holding either node indices or node names
+    def read_lines_binary(self,path):
+        columns = read_columns(path,self.use_arrays)
+        start,end = columns['start'],columns['end']
+        if len(start)>0 and isinstance(start[0],str):
+            self.assign_lines_from_names(start,end)
+        else:
+            self.assign_lines(start,end)
 
-    
\ No newline at end of file
+    #create the loaded nodes and lines on a map, lines are attached to their nodes
+    def create_map_objects(self,zoom_map,nodes_radius=5,nodes_colour='black',lines_width=3,lines_colour='grey'):
+        zoom_map.create_nodes(self.nodes_x_coords,self.nodes_y_coords,[nodes_radius]*self.num_nodes,[nodes_colour]*self.num_nodes,self.nodes_names)
+        if self.num_lines>0:
+            zoom_map.create_lines([lines_width]*self.num_lines,[lines_colour]*self.num_lines,['']*self.num_lines,'none','none',[],lines_start_node_type=['node']*self.num_lines,lines_end_node_type=['node']*self.num_lines,lines_start_node_index=self.lines_start_node_index,lines_end_node_index=self.lines_end_node_index)